@@ -1,12 +1,16 @@
+import startup  # First import: marks the start of the cold-start measurement
 import asyncio
+import sys
 import uuid
-from microsoft.teams.api import TypingActivityInput
+from microsoft.teams.api import Attachment, MessageActivityInput, TypingActivityInput
 from microsoft.teams.apps import ActivityContext, App
 from config import Config
 from langchain_core.messages import HumanMessage
-from engineer.engineer_subagent import engineer_subagent
-from manager.manager_subagent import manager_subagent
-from user.user_subagent import user_subagent
+from session_store import get_session_store
+from streaming import stream_turn
+from engineer.engineer_subagent import get_engineer_subagent
+from manager.manager_subagent import get_manager_subagent
+from user.user_subagent import get_user_subagent
 import os
 from botbuilder.core.teams import TeamsInfo
 from azure.identity import ManagedIdentityCredential
@@ -18,9 +22,9 @@ from azure.identity import ManagedIdentityCredential
 config = Config()
 
 AGENT_MAP = {
-    "engineer": engineer_subagent,
-    "manager": manager_subagent,
-    "user": user_subagent
+    "engineer": get_engineer_subagent,
+    "manager": get_manager_subagent,
+    "user": get_user_subagent
 }
 
 EMAIL_AGENT_MAP = {
@@ -58,8 +62,9 @@ def create_token_factory():
 # Initialize Teams app
 app = App(
     token=create_token_factory() if config.APP_TYPE == "UserAssignedMsi" else None
-)# Session storage: conversation_id -> subagent + config + history
-SESSION_STORE = {}
+)# Session storage: conversation_id -> agent type + thread id
+# (bounded by idle TTL and an LRU cap; SQLite-backed and shared across workers with SESSION_BACKEND=sqlite)
+SESSION_STORE = get_session_store("teams")
 
 # Safe send helper
 async def safe_send(ctx, text: str):
@@ -71,6 +76,14 @@ async def safe_send(ctx, text: str):
         print(f"Failed to send message: {e}")
 
 
+async def safe_send_card(ctx, card: dict):
+    try:
+        attachment = Attachment(content_type="application/vnd.microsoft.card.adaptive", content=card)
+        await ctx.send(MessageActivityInput().add_attachments(attachment))
+    except Exception as e:
+        print(f"Failed to send card: {e}")
+
+
 # import httpx
 # from azure.identity.aio import ClientSecretCredential
 
@@ -124,56 +137,114 @@ async def handle_message(ctx: ActivityContext):
     #     return
 
     # Step 1: Initialize session if needed
-    if conversation_id not in SESSION_STORE:
+    # The graph's checkpointer owns the conversation history (keyed by thread_id);
+    # each turn only sends the messages that are new to it.
+    new_messages = []
+    session = SESSION_STORE.get(conversation_id)
+    if session is None:
         agent_type = get_agent_by_email(user_email)
         if not agent_type:
             await safe_send(ctx, "Access denied: No agent assigned to your email.")
             return
 
-        subagent = AGENT_MAP[agent_type]
-        thread_id = uuid.uuid4()
-        config_session = {"configurable": {"thread_id": thread_id}}
-
-        # Initialize history with user info
-        history = [HumanMessage(content=f"User name: {user_name}, User email: {user_email}")]
-
-        SESSION_STORE[conversation_id] = {
-            "subagent": subagent,
-            "config": config_session,
-            "history": history
+        session = {
+            "agent_type": agent_type,
+            "thread_id": str(uuid.uuid4())
         }
+        SESSION_STORE.put(conversation_id, session)
+
+        # First turn: introduce the user
+        new_messages.append(HumanMessage(content=f"User name: {user_name}, User email: {user_email}"))
 
         # Send initial greeting
         #await safe_send(ctx, f"Hello {user_name}, how can I assist you with ServiceNow today?")
 
     # Step 2: Continue session
-    session = SESSION_STORE[conversation_id]
-    subagent = session["subagent"]
-    config_session = session["config"]
-    history = session["history"]
-
-    # Append latest user message to history
-    history.append(HumanMessage(content=user_input))
-
-    # Invoke agent with full history
-    result = subagent.invoke(
-        {"messages": history},
-        config=config_session
-    )
-
-    # Send only the last message from agent
-    messages = result.get("messages", [])
-    if messages:
-        latest_reply = messages[-1].content
-        await safe_send(ctx, latest_reply)
-        # Append agent reply to history
-        history.append(messages[-1])
+    subagent = AGENT_MAP[session["agent_type"]]()
+    config_session = {"configurable": {"thread_id": session["thread_id"]}}
+    new_messages.append(HumanMessage(content=user_input))
+
+    # Run the turn with only this turn's messages and stream it: tool progress as
+    # informative updates, reply tokens as they are generated
+    await stream_reply(ctx, stream_turn(subagent, new_messages, config_session))
+
+
+async def stream_reply(ctx, events):
+    """
+    Forward a streamed turn to Teams. Uses the streaming API of the conversation
+    (ctx.stream) when available; where Teams does not support streaming (group
+    chats, channels) or it fails, the final reply is sent as one message.
+
+    Streamed tokens are provisional: text written before a tool call is dropped on
+    "reset", and the stream is settled with the final reply so it is never glued to
+    a preamble or sent twice. Adaptive Cards returned by tools follow the reply.
+    """
+    stream = getattr(ctx, "stream", None)
+    streamed = False
+    final = ""
+    cards = []
+
+    def drop_streamed_text():
+        # Older SDKs have no clear_text(); the streamed text then cannot be withdrawn
+        clear_text = getattr(stream, "clear_text", None)
+        if clear_text is None:
+            return False
+        clear_text()
+        return True
+
+    async for event in events:
+        if event["type"] in ("final", "error"):
+            final = event["text"]
+            continue
+        if event["type"] == "card":
+            cards.append(event["card"])
+            continue
+        if stream is None:
+            continue
+        try:
+            if event["type"] == "progress":
+                stream.update(event["text"])
+            elif event["type"] == "reset" and streamed:
+                streamed = not drop_streamed_text()
+            elif event["type"] == "token":
+                stream.emit(event["text"])
+                streamed = True
+        except Exception as e:
+            print(f"⚠️ Teams streaming unavailable, sending the reply at the end: {e}")
+            if getattr(stream, "canceled", False):
+                return  # The user stopped the reply
+            try:
+                drop_streamed_text()  # Keep the partial text out of the closing message
+            except Exception:
+                pass
+            stream, streamed = None, False
+
+    settled = False
+    if stream is not None and final:
+        try:
+            # Settle the streamed message with the whole reply
+            if not streamed or drop_streamed_text():
+                stream.emit(final)
+            settled = True
+        except Exception as e:
+            print(f"⚠️ Teams streaming unavailable: {e}")
+            if getattr(stream, "canceled", False):
+                return
+    if not settled:
+        await safe_send(ctx, final)
+    for card in cards:
+        await safe_send_card(ctx, card)
+
 
 # =====================
 # START BOT
 # =====================
 if __name__ == "__main__":
+    if startup.profile_requested():
+        sys.exit(startup.profile_startup())
+
     print("Starting Teams bot...")
+    startup.warmup_in_background()
     asyncio.run(app.start())
 
 
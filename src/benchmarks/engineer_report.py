@@ -0,0 +1,105 @@
+# engineer_report.py — Render-time benchmark for the engineer ticket report
+#
+# Builds synthetic ServiceNow tickets (display values, as generate_engineer_report_pdf
+# fetches them) and times engineer.report_engine: build_report, render_html and
+# render_pdf, reporting the median over --repeat runs per ticket count. The output is
+# deterministic for a given input, so the HTML of two runs is also compared.
+#
+# Usage (from src/):
+#   python -m benchmarks.engineer_report
+#   python -m benchmarks.engineer_report --tickets 100 500 --keep /tmp/report
+#
+# Exits with status 1 when a full report (build + HTML + PDF) of the largest ticket
+# count takes longer than --max-seconds.
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+from engineer.report_engine import build_report, render_html, render_pdf
+
+STATES = ("New", "In Progress", "On Hold", "Resolved", "Closed", "Canceled")
+PRIORITIES = ("1 - Critical", "2 - High", "3 - Moderate", "4 - Low", "5 - Planning")
+ISSUES = ("VPN disconnects every hour", "Outlook not syncing", "Laptop battery drains fast",
+          "Printer offline on floor 3", "Access to shared drive", "Teams camera not detected")
+
+
+def synthetic_tickets(count, seed=7):
+    rnd = random.Random(seed)
+    now = datetime(2026, 10, 1, 9, 0, 0)
+    tickets = []
+    for i in range(count):
+        created = now - timedelta(hours=rnd.randint(1, 24 * 90))
+        state = rnd.choice(STATES)
+        resolved = created + timedelta(hours=rnd.randint(1, 24 * 10)) if state in ("Resolved", "Closed") else None
+        tickets.append({
+            "number": f"INC{10000 + i:07d}",
+            "short_description": rnd.choice(ISSUES),
+            "state": state,
+            "priority": rnd.choice(PRIORITIES),
+            "sys_created_on": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "resolved_at": resolved.strftime("%Y-%m-%d %H:%M:%S") if resolved else "",
+            "caller_id.name": f"User {rnd.randint(1, 40)}",
+            "assignment_group": rnd.choice(("Software", "Hardware", "Networking")),
+        })
+    return tickets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the local engineer report (build, HTML, PDF)")
+    parser.add_argument("--tickets", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    parser.add_argument("--keep", help="Write the largest report to <KEEP>.html / <KEEP>.pdf")
+    args = parser.parse_args(argv)
+
+    out_dir = tempfile.mkdtemp()
+    generated_at = datetime(2026, 10, 1, 9, 0, 0)
+    print(f"{'tickets':>8} {'build ms':>9} {'html ms':>8} {'pdf ms':>8} {'total ms':>9} {'html KB':>8} {'pdf KB':>7}")
+    worst = 0.0
+    for count in args.tickets:
+        tickets = synthetic_tickets(count)
+        timings = {"build": [], "html": [], "pdf": []}
+        pages = set()
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            report = build_report(tickets, "Bench Engineer", "bench@example.com", generated_at)
+            timings["build"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            html = render_html(report)
+            timings["html"].append(time.perf_counter() - started)
+            pages.add(html)
+
+            started = time.perf_counter()
+            pdf_path = render_pdf(report, os.path.join(out_dir, f"report_{count}.pdf"))
+            timings["pdf"].append(time.perf_counter() - started)
+
+        if len(pages) != 1:
+            print(f"❌ HTML for {count} tickets differs between runs.")
+            return 1
+        medians = {k: statistics.median(v) * 1000 for k, v in timings.items()}
+        total = sum(medians.values())
+        worst = total / 1000
+        print(f"{count:>8} {medians['build']:>9.1f} {medians['html']:>8.1f} {medians['pdf']:>8.1f} {total:>9.1f} "
+              f"{len(html.encode()) / 1024:>8.1f} {os.path.getsize(pdf_path) / 1024:>7.1f}")
+
+    if args.keep:
+        with open(f"{args.keep}.html", "w", encoding="utf-8") as f:
+            f.write(html)
+        render_pdf(report, f"{args.keep}.pdf")
+        print(f"📄 Wrote {args.keep}.html and {args.keep}.pdf")
+
+    if worst > args.max_seconds:
+        print(f"❌ A {args.tickets[-1]}-ticket report took {worst:.2f}s (limit {args.max_seconds}s).")
+        return 1
+    print(f"✅ A {args.tickets[-1]}-ticket report renders in {worst * 1000:.0f} ms.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# incident_mirror.py — Latency and consistency benchmark for the local incident mirror
+#
+# Starts the fake ServiceNow server (fake_servicenow.py) with a per-request latency,
+# points the ServiceNow client and a temporary incident mirror at it and reports:
+#   - the initial sync (backfill) and an incremental sync after a few external updates
+#   - read latency, live Table API query vs mirror, for the queries behind check_status,
+#     show_my_tickets, show_tickets, fetch_recent_incidents_tool and get_ticket_history
+#   - how many ServiceNow requests the mirror reads made (0 within the staleness bound)
+#
+# and checks that the mirror stays consistent with the server:
+#   - mirror reads return the same records as the live queries (raw and display values)
+#   - a write sent with WRITE_PARAMS is readable at once (write-through), and a sync
+#     page fetched before it cannot overwrite it
+#   - an external update shows up after the next incremental sync, which fetches only
+#     the changed incidents
+#   - a number missing from the mirror is looked up live and stored
+#
+# Usage (from src/):
+#   python -m benchmarks.incident_mirror
+#   python -m benchmarks.incident_mirror --incidents 5000 --latency 0.2 --repeat 20
+#
+# Exits with status 1 when a consistency check fails or mirror reads are not faster
+# than live queries.
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--incidents", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every fake ServiceNow request")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="incident-mirror-")
+    # Read by the modules below at import time
+    os.environ["SNOW_INSTANCE"] = f"http://127.0.0.1:{port}"
+    os.environ["INCIDENT_MIRROR_DB"] = os.path.join(workdir, "incidents.sqlite")
+    os.environ["INCIDENT_MIRROR_BACKFILL_DAYS"] = "0"
+
+    from fake_servicenow import create_app, serve_in_background
+    from incident_mirror import IncidentMirror, WRITE_PARAMS, column
+    from servicenow_client import snow_get, snow_patch
+
+    app = create_app(args.incidents, latency=args.latency)
+    server = serve_in_background(app, port=port)
+    instance, requests = app.state.instance, app.state.requests
+    api = f"{os.environ['SNOW_INSTANCE']}/api/now/table/incident"
+    failures = []
+
+    def check(ok, message):
+        print(f"   {'✅' if ok else '❌'} {message}")
+        if not ok:
+            failures.append(message)
+
+    async def live(params):
+        response = await snow_get(api, params=params)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    async def timed(coro_factory, repeat):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = await coro_factory()
+            times.append(time.perf_counter() - started)
+        return statistics.median(times), result
+
+    async def run():
+        mirror = IncidentMirror(os.environ["INCIDENT_MIRROR_DB"], max_age=3600)
+
+        started = time.perf_counter()
+        changed = await mirror.sync()
+        print(f"🔄 Initial sync: {changed} incidents in {time.perf_counter() - started:.2f}s "
+              f"({requests['GET incident']} requests, watermark {mirror.watermark})")
+        check(mirror.count() == len(instance.tables["incident"]), f"mirror holds all {mirror.count()} incidents")
+
+        sample = sorted(instance.tables["incident"].values(), key=lambda r: r["number"])[len(instance.tables["incident"]) // 2]
+        number, caller = sample["number"], sample["caller_id"]
+
+        # (name, live Table API params, mirror read)
+        cases = [
+            ("check_status",
+             {"sysparm_query": f"number={number}", "sysparm_fields": "number,state,short_description"},
+             lambda: mirror.get(number, fields=("number", "state", "short_description"))),
+            ("show_my_tickets",
+             {"sysparm_query": f"caller_id={caller}^ORDERBYDESCsys_created_on", "sysparm_limit": 100,
+              "sysparm_fields": "number,state,short_description,sys_id,priority,sys_created_on",
+              "sysparm_display_value": "true"},
+             lambda: mirror.query("caller_id = ?", (caller,), limit=100, display=True,
+                                  fields=("number", "state", "short_description", "sys_id", "priority", "sys_created_on"))),
+            ("show_tickets",
+             {"sysparm_query": "active=true^stateNOT IN6,7,8^ORDERBYDESCsys_created_on", "sysparm_limit": 50,
+              "sysparm_fields": "number,short_description,priority,sys_created_on,caller_id.name,state",
+              "sysparm_display_value": "true", "sysparm_exclude_reference_link": "true"},
+             lambda: mirror.query("active = 'true' AND state NOT IN ('6', '7', '8')", limit=50, display=True,
+                                  fields=("number", "short_description", "priority", "sys_created_on", "caller_id.name", "state"))),
+            ("fetch_recent_incidents",
+             {"sysparm_query": "ORDERBYDESCsys_created_on", "sysparm_limit": 20,
+              "sysparm_fields": "number,short_description,priority,assignment_group.name,state,sys_created_on,caller_id.name",
+              "sysparm_display_value": "true"},
+             lambda: mirror.query(limit=20, display=True,
+                                  fields=("number", "short_description", "priority", "assignment_group.name", "state",
+                                          "sys_created_on", "caller_id.name"))),
+            ("get_ticket_history",
+             {"sysparm_query": f"number={number}", "sysparm_fields": "number,work_notes", "sysparm_display_value": "true"},
+             lambda: mirror.get(number, fields=("number", "work_notes"), display=True)),
+        ]
+
+        print(f"\n⏱️ Reads (median of {args.repeat}, fake ServiceNow latency {args.latency * 1000:.0f} ms)")
+        print(f"   {'read':<24}{'live':>10}{'mirror':>10}")
+        slower = []
+        for name, params, read in cases:
+            live_time, live_rows = await timed(lambda: live(params), args.repeat)
+            before = sum(requests.values())
+            mirror_time, mirror_rows = await timed(read, args.repeat)
+            print(f"   {name:<24}{live_time * 1000:>8.1f}ms{mirror_time * 1000:>8.1f}ms")
+            mirror_rows = mirror_rows if isinstance(mirror_rows, list) else [mirror_rows]
+            by_number = lambda rows: sorted(rows, key=lambda r: r["number"])  # Same-second ties may come in any order
+            check(by_number(mirror_rows) == by_number(live_rows), f"{name}: mirror returns the live records ({len(live_rows)})")
+            check(sum(requests.values()) == before, f"{name}: no ServiceNow request from mirror reads")
+            if mirror_time >= live_time:
+                slower.append(name)
+
+        print("\n✍️ Write-through")
+        response = await snow_patch(f"{api}/{sample['sys_id']}", json={"state": "6", "work_notes": "Fixed by benchmark"},
+                                    params=WRITE_PARAMS)
+        stale_page = [instance.render("incident", dict(sample, state="2", sys_updated_on="2000-01-01 00:00:00"),
+                                      [f for f in WRITE_PARAMS["sysparm_fields"].split(",")], "all", False, "")]
+        record = await mirror.write_through(response)
+        mirror.upsert(stale_page)  # An older copy (a sync page fetched before the write) arrives late
+        ticket = mirror.select(f"{column('number')} = ?", (number,), display=True)[0]
+        check(record.get("state") == "6" and ticket["state"] == "Resolved", "write is readable at once, older copies ignored")
+        check("Fixed by benchmark" in ticket["work_notes"], "work note is in the mirrored history")
+
+        print("\n🔄 Incremental sync")
+        changed_numbers = []
+        for record in list(instance.tables["incident"].values())[:5]:
+            instance.update("incident", record["sys_id"], {"short_description": "Changed elsewhere"})
+            changed_numbers.append(record["number"])
+        before = requests["GET incident"]
+        started = time.perf_counter()
+        changed = await mirror.sync()
+        print(f"   {changed} incidents changed in {time.perf_counter() - started:.2f}s "
+              f"({requests['GET incident'] - before} requests)")
+        rows = mirror.select(f"number IN ({', '.join('?' * len(changed_numbers))})", changed_numbers,
+                             fields=("short_description",))
+        check(len(rows) == 5 and all(r["short_description"] == "Changed elsewhere" for r in rows),
+              "external updates are mirrored after the sync")
+        check(changed == len(changed_numbers), "the sync changed only the updated incidents")
+
+        print("\n🔎 Miss")
+        mirror.connection().execute("DELETE FROM incidents WHERE number = ?", (number,))
+        mirror.connection().commit()
+        check((await mirror.get(number)) is not None and mirror.select("number = ?", (number,)),
+              "a number missing from the mirror is looked up live and stored")
+
+        if slower:
+            failures.append(f"mirror reads not faster than live: {', '.join(slower)}")
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.should_exit = True
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed")
+        return 1
+    print("\n✅ All checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
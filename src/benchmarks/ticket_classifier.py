@@ -0,0 +1,105 @@
+# ticket_classifier.py — Offline evaluation of the local ticket classifier
+#
+# Cross-validates user.ticket_classifier on the historical exports and reports:
+#   - group accuracy overall and per group (k-fold, texts never shared between folds)
+#   - coverage/accuracy per confidence threshold: how many tickets would be classified
+#     locally (no LLM call) and how accurate those local decisions are
+#   - training time and per-ticket latency (p50/p99)
+#   - the groups the model cannot predict (no training examples) and which of them
+#     are routed to the LLM by UNTRAINED_GROUP_RULES
+#
+# Usage (from src/):
+#   python -m benchmarks.ticket_classifier
+#   python -m benchmarks.ticket_classifier --folds 10 --thresholds 0.4 0.55 0.7
+#
+# Exits with status 1 when accuracy on the locally classified tickets at the
+# configured threshold drops below --min-accuracy.
+import sys
+import time
+import random
+import argparse
+import statistics
+from collections import Counter, defaultdict
+
+from user.ticket_classifier import (
+    GROUPS, TICKET_CLASSIFIER_THRESHOLD, UNTRAINED_GROUP_RULES, TicketClassifier, load_training_examples,
+)
+
+
+def cross_validate(examples, folds, seed):
+    """(true group, predicted group, confidence) for every example, predicted by a model that never saw it."""
+    shuffled = examples[:]
+    random.Random(seed).shuffle(shuffled)
+    results = []
+    for k in range(folds):
+        test = shuffled[k::folds]
+        train = [e for i, e in enumerate(shuffled) if i % folds != k]
+        model = TicketClassifier().fit([t for t, _ in train], [g for _, g in train])
+        for text, group in test:
+            prediction = model.classify(text)
+            results.append((group, prediction.group, prediction.confidence))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy, coverage and latency of the local ticket classifier")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.4, 0.55, 0.7, 0.85])
+    parser.add_argument("--min-accuracy", type=float, default=0.8,
+                        help=f"Required accuracy of local decisions at {TICKET_CLASSIFIER_THRESHOLD}")
+    args = parser.parse_args(argv)
+
+    examples = load_training_examples()
+    print(f"📚 {len(examples)} labelled examples: {dict(Counter(g for _, g in examples))}")
+
+    results = cross_validate(examples, args.folds, args.seed)
+    correct = sum(t == p for t, p, _ in results)
+    print(f"\n🎯 Group accuracy ({args.folds}-fold): {correct / len(results):.1%}")
+
+    per_group = defaultdict(lambda: [0, 0])
+    for true, predicted, _ in results:
+        per_group[true][0] += true == predicted
+        per_group[true][1] += 1
+    for group, (hits, total) in sorted(per_group.items()):
+        print(f"   {group:<18} {hits / total:6.1%}  ({total} examples)")
+
+    print(f"\n{'threshold':>9} {'local':>8} {'accuracy':>9}   (local = classified without the LLM)")
+    gate = None
+    for threshold in sorted(set(args.thresholds + [TICKET_CLASSIFIER_THRESHOLD])):
+        local = [(t, p) for t, p, c in results if c >= threshold]
+        accuracy = sum(t == p for t, p in local) / len(local) if local else float("nan")
+        marker = "  ← configured" if threshold == TICKET_CLASSIFIER_THRESHOLD else ""
+        print(f"{threshold:>9.2f} {len(local) / len(results):>8.1%} {accuracy:>9.1%}{marker}")
+        if threshold == TICKET_CLASSIFIER_THRESHOLD:
+            gate = accuracy
+
+    started = time.perf_counter()
+    model = TicketClassifier().fit([t for t, _ in examples], [g for _, g in examples])
+    training = time.perf_counter() - started
+
+    latencies = []
+    for text, _ in examples:
+        started = time.perf_counter()
+        model.classify(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    untrained = [g for g in GROUPS if g not in model.groups]
+    if untrained:
+        routed = {g for g, _ in UNTRAINED_GROUP_RULES}
+        print(f"\n⚠️ The model cannot predict {len(untrained)} of {len(GROUPS)} groups (no training examples):")
+        for group in untrained:
+            print(f"   {group:<18} {'keyword rule → LLM' if group in routed else 'LLM only when confidence is low'}")
+
+    print(f"\n⏱️ Training: {training * 1000:.0f} ms | per ticket: p50 {statistics.median(latencies):.2f} ms, p99 {p99:.2f} ms")
+
+    if gate is not None and gate < args.min_accuracy:
+        print(f"❌ Local accuracy {gate:.1%} is below {args.min_accuracy:.0%} at threshold {TICKET_CLASSIFIER_THRESHOLD}.")
+        return 1
+    print(f"✅ Local decisions at threshold {TICKET_CLASSIFIER_THRESHOLD} are {gate:.1%} accurate.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# turn_protocol.py — Regression benchmark for the chat turn protocol
+#
+# Compares two ways of driving a checkpointed subagent graph over a long conversation:
+#   full  → resend the whole history every turn to a graph without compaction
+#           (the old Teams handler and subagents)
+#   delta → send only the new HumanMessage and let the checkpointer own the history,
+#           with the subagents' compaction node (context_compaction) bounding it
+#
+# The graph has the same shape as the subagents (compact_context → assistant → END,
+# add_messages state, shared checkpointer from session_store) with local stand-ins for
+# the LLM and the summarizer, so the numbers measure protocol overhead only and need
+# no network. "payload" is the number of messages passed to the graph on the first
+# and the last turn; "prompt" the largest number of messages the assistant would send
+# in the first and in the second half of the conversation.
+#
+# Usage (from src/):
+#   python -m benchmarks.turn_protocol --turns 100
+#   SESSION_BACKEND=sqlite SESSION_DB=/tmp/bench.sqlite python -m benchmarks.turn_protocol
+#
+# Both halves of the delta protocol are needed for a flat turn cost: the payload stays
+# one message, and the thread the checkpointer reloads, merges into (add_messages) and
+# re-serializes on every step stays bounded. Without compaction that per-step
+# checkpoint work grows with the thread even for one-message turns.
+#
+# Exits with status 1 when the delta payload is not constant, when late delta turns
+# are not cheaper than late full turns, or when delta turns (cost or prompt size)
+# grow more than --max-growth times over the conversation.
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+from typing import Annotated
+
+from typing_extensions import TypedDict
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import AnyMessage, add_messages
+
+from session_store import get_checkpointer
+from context_compaction import ContextCompactor
+
+
+class BenchState(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+    summary: str
+
+
+class LocalSummaryCompactor(ContextCompactor):
+    """The real compaction node with a summarizer that needs no LLM."""
+
+    async def asummarize(self, summary, messages):
+        return f"{summary} | {len(messages)} messages about the VPN gateway"[-500:]
+
+
+SYSTEM_PROMPT = "You are a helpdesk assistant."
+prompt_sizes = []  # Messages in the prompt of every assistant call (reset per conversation)
+
+
+def build_graph(compactor=None):
+    async def fake_assistant(state):
+        # Same input assembly as the real assist nodes; the "LLM" answers locally
+        if compactor:
+            prompt = compactor.prompt_messages(SYSTEM_PROMPT, state)
+        else:
+            prompt = [SystemMessage(SYSTEM_PROMPT)] + state["messages"]
+        prompt_sizes.append(len(prompt))
+        return {"messages": [AIMessage(content=f"Reply to: {prompt[-1].content[:40]}")]}
+
+    async def passthrough(state):
+        return {}
+
+    workflow = StateGraph(BenchState)
+    workflow.add_node("compact_context", compactor.acompact if compactor else passthrough)
+    workflow.add_node("assistant", fake_assistant)
+    workflow.add_edge(START, "compact_context")
+    workflow.add_edge("compact_context", "assistant")
+    workflow.add_edge("assistant", END)
+    return workflow.compile(checkpointer=get_checkpointer())
+
+
+async def run_conversation(graph, protocol, turns):
+    """Return the wall time of every turn for one conversation."""
+    config = {"configurable": {"thread_id": f"bench-{protocol}-{uuid.uuid4()}"}}
+    history = []
+    timings = []
+    payloads = []
+    prompt_sizes.clear()
+
+    for turn in range(turns):
+        message = HumanMessage(content=f"Turn {turn}: my laptop still cannot reach the VPN gateway.")
+        started = time.perf_counter()
+        history.append(message)
+        turn_input = {"messages": list(history) if protocol == "full" else [message]}
+        payloads.append(len(turn_input["messages"]))
+        result = await graph.ainvoke(turn_input, config=config)
+        history.append(result["messages"][-1])
+        timings.append(time.perf_counter() - started)
+
+    get_checkpointer().delete_thread(config["configurable"]["thread_id"])
+    return timings, payloads, list(prompt_sizes)
+
+
+def summarize(timings, payloads, prompts, window):
+    early = statistics.median(timings[:window]) * 1000
+    late = statistics.median(timings[-window:]) * 1000
+    return {
+        "early": early,
+        "late": late,
+        "growth": late / early if early else float("inf"),
+        "payload": (payloads[0], payloads[-1]),
+        "prompt": (max(prompts[:len(prompts) // 2]), max(prompts[len(prompts) // 2:])),  # Largest, per half
+    }
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-turn cost of full-history vs delta-only turns")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--window", type=int, default=10, help="Turns averaged at each end")
+    parser.add_argument("--max-growth", type=float, default=2.0,
+                        help="Allowed late/early ratio for delta turns (cost and prompt size)")
+    args = parser.parse_args(argv)
+
+    graphs = {
+        "full": build_graph(),
+        "delta": build_graph(LocalSummaryCompactor()),
+    }
+    await run_conversation(graphs["delta"], "delta", args.window)  # Warm imports and caches
+
+    results = {}
+    for protocol, graph in graphs.items():
+        timings, payloads, prompts = await run_conversation(graph, protocol, args.turns)
+        results[protocol] = summarize(timings, payloads, prompts, args.window)
+
+    print(f"{'protocol':<10} {'payload':>8} {'prompt':>8} {'early ms':>9} {'late ms':>9} {'growth':>7}"
+          f"   ({args.turns} turns, median of {args.window})")
+    for protocol, r in results.items():
+        payload = f"{r['payload'][0]}→{r['payload'][1]}"
+        prompt = f"{r['prompt'][0]}→{r['prompt'][1]}"
+        print(f"{protocol:<10} {payload:>8} {prompt:>8} {r['early']:>9.2f} {r['late']:>9.2f} {r['growth']:>6.2f}x")
+
+    full, delta = results["full"], results["delta"]
+    failures = []
+    if delta["payload"] != (1, 1):
+        failures.append(f"delta payload went from {delta['payload'][0]} to {delta['payload'][1]} messages (expected 1)")
+    if delta["late"] >= full["late"]:
+        failures.append(f"late delta turns ({delta['late']:.2f} ms) are not cheaper than full turns ({full['late']:.2f} ms)")
+    if delta["growth"] > args.max_growth:
+        failures.append(f"delta turns grew {delta['growth']:.2f}x (limit {args.max_growth:.2f}x)")
+    if delta["prompt"][1] > delta["prompt"][0]:
+        failures.append(f"delta prompts kept growing ({delta['prompt'][0]} → {delta['prompt'][1]} messages)")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print(f"✅ Delta turns send one message each, stay flat ({delta['growth']:.2f}x) with at most "
+          f"{delta['prompt'][1]} prompt messages,")
+    print(f"   and cost {delta['late'] / full['late']:.0%} of full turns late in the conversation.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
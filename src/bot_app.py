@@ -1,19 +1,26 @@
+import startup  # First import: marks the start of the cold-start measurement
+import sys
 import uuid
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage
-from engineer.engineer_subagent import engineer_subagent
-from manager.manager_subagent import manager_subagent
-from user.user_subagent import user_subagent
+from engineer.engineer_subagent import get_engineer_subagent
+from manager.manager_subagent import get_manager_subagent
+from user.user_subagent import get_user_subagent
+from servicenow_client import snow_metrics, aclose_client
+from session_store import get_session_store, forget_thread
+from streaming import stream_turn, sse
+from mail_queue import delivery_status, mail_stats
+from incident_mirror import mirror_stats
 
 
-# Map agent types to subagents
+# Map agent types to subagent getters (graphs are compiled on first use or by the warmup)
 AGENT_MAP = {
-    "engineer": engineer_subagent,
-    "manager": manager_subagent,
-    "user": user_subagent
+    "engineer": get_engineer_subagent,
+    "manager": get_manager_subagent,
+    "user": get_user_subagent
 }
 
 # Map emails to agent types
@@ -27,8 +34,9 @@ EMAIL_AGENT_MAP = {
 def get_agent_by_email(email: str) -> str:
     return EMAIL_AGENT_MAP.get(email.lower())
 
-# Store ongoing sessions in memory
-SESSIONS = {}
+# Ongoing sessions: email -> agent type + thread id
+# (bounded by idle TTL and an LRU cap; SQLite-backed and shared across workers with SESSION_BACKEND=sqlite)
+SESSIONS = get_session_store("web")
 
 # Request model
 class MessageRequest(BaseModel):
@@ -189,24 +197,58 @@ def chat_ui():
                 chatDiv.appendChild(loader);
                 chatDiv.scrollTop = chatDiv.scrollHeight;
 
+                // Stream the reply: progress lines replace the loader text, tokens fill the
+                // agent bubble as they arrive, a reset drops the text streamed before a tool
+                // call, and the final event settles its content.
+                let bubble = null;
+                let text = "";
+                const render = (value) => {
+                    if (!bubble) { bubble = appendMessage("Agent", "", "agent"); }
+                    bubble.innerHTML = `<b>Agent:</b> ${value}`;
+                    chatDiv.scrollTop = chatDiv.scrollHeight;
+                };
+
                 try {
-                    const response = await fetch("/send_message/", {
+                    const response = await fetch("/send_message/stream", {
                         method: "POST",
                         headers: { "Content-Type": "application/json" },
                         body: JSON.stringify({ name, email, message })
                     });
+                    if (!response.ok) {
+                        const data = await response.json();
+                        throw new Error(data.detail || response.statusText);
+                    }
 
-                    const data = await response.json();
-                    loader.remove();
-
-                    if (data.messages && data.messages.length > 0) {
-                        data.messages.forEach(msg => appendMessage("Agent", msg, "agent"));
-                    } else {
-                        appendMessage("System", "No response received.", "agent");
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = "";
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        const frames = buffer.split("\n\n");
+                        buffer = frames.pop();
+                        for (const frame of frames) {
+                            if (!frame.startsWith("data: ")) continue;
+                            const event = JSON.parse(frame.slice(6));
+                            if (event.type === "progress") {
+                                loader.innerText = event.text;
+                            } else if (event.type === "token") {
+                                text += event.text;
+                                render(text);
+                            } else if (event.type === "reset") {
+                                text = "";
+                                if (bubble) render("");
+                            } else if (event.type === "final" || event.type === "error") {
+                                loader.remove();
+                                render(event.text || text || "No response received.");
+                            }
+                        }
                     }
+                    loader.remove();
                 } catch (err) {
                     loader.remove();
-                    appendMessage("Error", "Connection error. Try again later.", "agent");
+                    appendMessage("Error", err.message || "Connection error. Try again later.", "agent");
                 }
 
                 chatDiv.scrollTop = chatDiv.scrollHeight;
@@ -218,6 +260,7 @@ def chat_ui():
                 msgDiv.innerHTML = `<b>${sender}:</b> ${text}`;
                 chatDiv.appendChild(msgDiv);
                 chatDiv.scrollTop = chatDiv.scrollHeight;
+                return msgDiv;
             }
         </script>
     </body>
@@ -227,30 +270,30 @@ def chat_ui():
 
 
 @app.post("/send_message/")
-def send_message(req: MessageRequest):
+async def send_message(req: MessageRequest):
     agent_type = get_agent_by_email(req.email)
     if not agent_type:
         raise HTTPException(status_code=403, detail="No agent assigned for this email.")
 
     # Retrieve or create session
-    if req.email not in SESSIONS:
-        thread_id = uuid.uuid4()
-        SESSIONS[req.email] = {
+    session = SESSIONS.get(req.email)
+    if session is None:
+        session = {
             "agent_type": agent_type,
-            "thread_id": thread_id,
-            "subagent": AGENT_MAP[agent_type]
+            "thread_id": str(uuid.uuid4())
         }
+        SESSIONS.put(req.email, session)
         # Initial message to agent with email
         initial_message = f"User name: {req.name} User email: {req.email}"
-        _ = SESSIONS[req.email]["subagent"].invoke(
+        _ = await AGENT_MAP[agent_type]().ainvoke(
             {"messages": [HumanMessage(content=initial_message)]},
-            config={"configurable": {"thread_id": thread_id}}
+            config={"configurable": {"thread_id": session["thread_id"]}}
         )
 
     # Send user message to agent
-    thread_id = SESSIONS[req.email]["thread_id"]
-    subagent = SESSIONS[req.email]["subagent"]
-    response = subagent.invoke(
+    thread_id = session["thread_id"]
+    subagent = AGENT_MAP[session["agent_type"]]()
+    response = await subagent.ainvoke(
         {"messages": [HumanMessage(content=req.message)]},
         config={"configurable": {"thread_id": thread_id}}
     )
@@ -259,10 +302,99 @@ def send_message(req: MessageRequest):
     return {"messages": messages}
 
 
+@app.post("/send_message/stream")
+async def send_message_stream(req: MessageRequest):
+    """
+    Same turn as /send_message/, streamed as Server-Sent Events: a first progress
+    event right away, then tool progress, reply tokens and the final reply.
+    """
+    agent_type = get_agent_by_email(req.email)
+    if not agent_type:
+        raise HTTPException(status_code=403, detail="No agent assigned for this email.")
+
+    new_messages = []
+    session = SESSIONS.get(req.email)
+    if session is None:
+        session = {
+            "agent_type": agent_type,
+            "thread_id": str(uuid.uuid4())
+        }
+        SESSIONS.put(req.email, session)
+        # First turn: the intro goes along with the user's message (no separate run)
+        new_messages.append(HumanMessage(content=f"User name: {req.name} User email: {req.email}"))
+    new_messages.append(HumanMessage(content=req.message))
+
+    subagent = AGENT_MAP[session["agent_type"]]()
+    config = {"configurable": {"thread_id": session["thread_id"]}}
+
+    async def events():
+        yield sse({"type": "progress", "text": "Thinking…"})
+        async for event in stream_turn(subagent, new_messages, config):
+            yield sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/end_session/")
 def end_session(email: str):
-    if email in SESSIONS:
-        del SESSIONS[email]
+    session = SESSIONS.get(email)
+    if session is not None:
+        SESSIONS.delete(email)
+        forget_thread(session["thread_id"])
         return {"status": "Session ended."}
     return {"status": "No session found for this email."}
 
+
+@app.get("/metrics/servicenow")
+def servicenow_metrics():
+    """Latency histogram and status counts of ServiceNow calls, per table and verb."""
+    return snow_metrics.snapshot()
+
+
+@app.get("/metrics/llm")
+def llm_metrics_snapshot():
+    """Latency histogram, queue wait, token totals and limiter state of the chat models, per model."""
+    from llm_registry import llm_metrics  # Imported on demand: pulls in langchain_openai
+
+    return llm_metrics.snapshot()
+
+
+@app.get("/mail/{delivery_id}")
+def mail_delivery_status(delivery_id: str):
+    """Delivery status of a queued email (e.g. an engineer report)."""
+    status = delivery_status(delivery_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown delivery ID")
+    return status
+
+
+@app.get("/metrics/mail")
+def mail_metrics():
+    """Spool counts and delivery counters of the outbound mail queue."""
+    return mail_stats()
+
+
+@app.get("/metrics/incident-mirror")
+def incident_mirror_metrics():
+    """Size, watermark and age of the local incident mirror, with read / write-through / sync counters."""
+    return mirror_stats()
+
+
+@app.on_event("startup")
+async def warm_up():
+    # Build graphs, LLM clients and the KB in the background; requests are served meanwhile
+    startup.warmup_in_background()
+
+
+@app.on_event("shutdown")
+async def close_servicenow_pool():
+    await aclose_client()
+
+
+if __name__ == "__main__":
+    if startup.profile_requested():
+        sys.exit(startup.profile_startup())
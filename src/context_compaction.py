@@ -0,0 +1,269 @@
+# context_compaction.py — Bounded LLM context for long conversations
+#
+# The assist nodes used to send the system prompt plus the whole checkpointed
+# history to the model on every step, so prompt tokens (and latency) grew with the
+# session. The subagents now run a compaction node at the start of every turn:
+#
+#   - the first message of the thread (the "User name / User email" intro) is pinned
+#   - the last CONTEXT_KEEP_TURNS turns stay verbatim (a turn starts at a HumanMessage)
+#   - older turns are folded into a rolling summary (state["summary"]) and removed
+#     from the checkpoint; this happens in batches of CONTEXT_SUMMARY_BATCH turns so
+#     the summarizer is not called on every turn
+#   - ToolMessages in older turns larger than CONTEXT_TOOL_MAX_CHARS are cut to a
+#     preview; the full payload is kept in the long-term store under
+#     (TOOL_PAYLOAD_NAMESPACE, thread_id) and can be read back with get_tool_payload()
+#
+# prompt_messages() assembles what the assist nodes send and enforces the token
+# budget of the target model on every step, so a large tool result inside the
+# current turn cannot overflow the context either.
+#
+# Configuration (environment):
+#   CONTEXT_KEEP_TURNS      → turns kept verbatim (default 4)
+#   CONTEXT_SUMMARY_BATCH   → extra turns collected before summarizing (default 4)
+#   CONTEXT_TOOL_MAX_CHARS  → tool payload size kept in older turns (default 1500)
+#   CONTEXT_SUMMARY_MODEL   → model writing the rolling summary (default gpt-4o-mini)
+#   CONTEXT_TOKEN_BUDGET    → prompt token budget overriding MODEL_TOKEN_BUDGETS
+import os
+import json
+import functools
+
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from session_store import TOOL_PAYLOAD_NAMESPACE, get_long_term_store
+
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", "4"))
+CONTEXT_TOOL_MAX_CHARS = int(os.getenv("CONTEXT_TOOL_MAX_CHARS", "1500"))
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+
+# Prompt budgets (input tokens, leaving room for the reply) per model
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4": 6000,
+    "gpt-4o": 24000,
+    "gpt-4o-mini": 24000,
+    "gpt-5.1": 24000,
+}
+DEFAULT_TOKEN_BUDGET = 6000
+MIN_TOOL_CHARS = 200           # Smallest preview left when the budget forces further cuts
+SUMMARIZER_TOOL_CHARS = 500    # Tool payload size shown to the summarizer
+
+
+# ---------------------------------------------------
+# 🔢 Token counting
+# ---------------------------------------------------
+def token_budget(model_name):
+    return CONTEXT_TOKEN_BUDGET or MODEL_TOKEN_BUDGETS.get(model_name, DEFAULT_TOKEN_BUDGET)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model_name):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # No tiktoken or no cached encoding (offline): estimate instead
+        print(f"⚠️ Token counting falls back to an estimate for {model_name}: {e}")
+        return None
+
+
+def _text(message):
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps([{"name": c["name"], "args": c["args"]} for c in tool_calls], default=str)
+    return content
+
+
+def count_tokens(messages, model_name="gpt-4"):
+    """Prompt tokens of `messages` for `model_name` (4 tokens of framing per message)."""
+    encoding = _encoding(model_name)
+    total = 0
+    for message in messages:
+        text = _text(message)
+        total += 4 + (len(encoding.encode(text)) if encoding else len(text) // 4 + 1)
+    return total
+
+
+# ---------------------------------------------------
+# 📦 Bulky tool payloads
+# ---------------------------------------------------
+def _preview(content, max_chars, note):
+    return f"{content[:max_chars]}\n… [{len(content) - max_chars} more characters {note}]"
+
+
+def get_tool_payload(thread_id, ref):
+    """Full content of a ToolMessage that was cut during compaction, or None."""
+    item = get_long_term_store().get((TOOL_PAYLOAD_NAMESPACE, str(thread_id)), ref)
+    return item.value["content"] if item else None
+
+
+# ---------------------------------------------------
+# 🗜️ Compactor
+# ---------------------------------------------------
+class ContextCompactor:
+    """
+    Compaction node and prompt assembly for one subagent. `model_name` is the model
+    the assist node calls; its budget bounds every prompt.
+    """
+
+    def __init__(
+        self,
+        model_name="gpt-4",
+        keep_turns=CONTEXT_KEEP_TURNS,
+        summary_batch=CONTEXT_SUMMARY_BATCH,
+        tool_max_chars=CONTEXT_TOOL_MAX_CHARS,
+        summary_model=CONTEXT_SUMMARY_MODEL,
+        pin_first=True,
+    ):
+        self.model_name = model_name
+        self.keep_turns = max(1, keep_turns)
+        self.summary_batch = max(0, summary_batch)
+        self.tool_max_chars = tool_max_chars
+        self.summary_model = summary_model
+        self.pin_first = pin_first
+
+    # -- turn bookkeeping ------------------------------------------------
+    def _split(self, messages):
+        """(pinned, turns): turns are lists of messages, each starting at a HumanMessage."""
+        pinned = messages[:1] if self.pin_first and messages else []
+        turns = []
+        for message in messages[len(pinned):]:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return pinned, turns
+
+    def _plan(self, state):
+        """Messages to fold into the summary (oldest first) and tool messages to cut."""
+        pinned, turns = self._split(state.get("messages", []))
+        fold = []
+        if len(turns) > self.keep_turns + self.summary_batch:
+            fold = [m for turn in turns[:-self.keep_turns] for m in turn]
+            turns = turns[-self.keep_turns:]
+
+        bulky = [
+            m for turn in turns[:-1] for m in turn
+            if isinstance(m, ToolMessage) and isinstance(m.content, str) and len(m.content) > self.tool_max_chars
+            and not m.additional_kwargs.get("compacted")
+        ]
+        return fold, bulky
+
+    def _truncated(self, message):
+        return message.model_copy(update={
+            "content": _preview(message.content, self.tool_max_chars, f"stored as tool payload {message.id}"),
+            "additional_kwargs": {**message.additional_kwargs, "compacted": True},
+        })
+
+    # -- summarizer --------------------------------------------------------
+    def _summary_prompt(self, summary, messages):
+        lines = []
+        for m in messages:
+            text = _text(m)
+            if isinstance(m, ToolMessage) and len(text) > SUMMARIZER_TOOL_CHARS:
+                text = text[:SUMMARIZER_TOOL_CHARS] + " …"
+            lines.append(f"{m.type}: {text}")
+        return [
+            SystemMessage(
+                "You maintain the running summary of a ServiceNow helpdesk conversation. "
+                "Merge the earlier summary and the new messages into one concise summary (at most 200 words). "
+                "Keep user names, emails, ticket numbers, states, decisions, confirmations and pending actions; "
+                "drop greetings and repeated tool output."
+            ),
+            HumanMessage(f"Earlier summary:\n{summary or 'None'}\n\nNew messages:\n" + "\n".join(lines)),
+        ]
+
+    def summarize(self, summary, messages):
+        from startup import get_chat_model
+
+        return get_chat_model(self.summary_model, 0).invoke(self._summary_prompt(summary, messages)).content
+
+    async def asummarize(self, summary, messages):
+        from startup import get_chat_model
+
+        response = await get_chat_model(self.summary_model, 0).ainvoke(self._summary_prompt(summary, messages))
+        return response.content
+
+    # -- graph node --------------------------------------------------------
+    def _update(self, state, fold, bulky, summary):
+        updates = [self._truncated(m) for m in bulky]
+        result = {}
+        if summary is not None:
+            updates += [RemoveMessage(id=m.id) for m in fold]
+            result["summary"] = summary
+        if updates:
+            result["messages"] = updates
+        return result
+
+    def compact(self, state, config):
+        """Graph node (sync): fold old turns into the summary and cut bulky tool payloads."""
+        fold, bulky = self._plan(state)
+        summary = None
+        if fold:
+            try:
+                summary = self.summarize(state.get("summary", ""), fold)
+            except Exception as e:  # Keep the turns; prompt_messages still enforces the budget
+                print(f"⚠️ Context summary failed, keeping {len(fold)} messages: {e}")
+        if bulky:
+            namespace = (TOOL_PAYLOAD_NAMESPACE, str(config["configurable"]["thread_id"]))
+            store = get_long_term_store()
+            for m in bulky:
+                store.put(namespace, m.id, {"content": m.content, "tool_call_id": m.tool_call_id})
+        return self._update(state, fold, bulky, summary)
+
+    async def acompact(self, state, config):
+        """Async variant of compact, used when the graph runs with ainvoke/astream."""
+        fold, bulky = self._plan(state)
+        summary = None
+        if fold:
+            try:
+                summary = await self.asummarize(state.get("summary", ""), fold)
+            except Exception as e:
+                print(f"⚠️ Context summary failed, keeping {len(fold)} messages: {e}")
+        if bulky:
+            namespace = (TOOL_PAYLOAD_NAMESPACE, str(config["configurable"]["thread_id"]))
+            store = get_long_term_store()
+            for m in bulky:
+                await store.aput(namespace, m.id, {"content": m.content, "tool_call_id": m.tool_call_id})
+        return self._update(state, fold, bulky, summary)
+
+    # -- prompt assembly ---------------------------------------------------
+    def prompt_messages(self, system_prompt, state, tail=()):
+        """
+        System prompt + rolling summary + kept messages + `tail`, within the model's
+        budget. `system_prompt` is a string or a prebuilt SystemMessage; `tail` holds
+        variable context placed after the history so the prefix stays cacheable.
+        Over budget, the largest tool payloads are cut in this prompt only (the
+        checkpoint keeps them), then the oldest turns are left out.
+        """
+        head = [system_prompt if isinstance(system_prompt, SystemMessage) else SystemMessage(system_prompt)]
+        if state.get("summary"):
+            head.append(SystemMessage(f"Summary of the earlier conversation:\n{state['summary']}"))
+        messages = list(state.get("messages", []))
+        tail = list(tail)
+
+        budget = token_budget(self.model_name) - (count_tokens(tail, self.model_name) if tail else 0)
+        if count_tokens(head + messages, self.model_name) <= budget:
+            return head + messages + tail
+
+        # 1) Cut tool payloads, largest first
+        limit = self.tool_max_chars
+        while limit >= MIN_TOOL_CHARS:
+            messages = [
+                m.model_copy(update={"content": _preview(m.content, limit, "omitted to fit the context")})
+                if isinstance(m, ToolMessage) and isinstance(m.content, str) and len(m.content) > limit + 100
+                else m
+                for m in messages
+            ]
+            if count_tokens(head + messages, self.model_name) <= budget:
+                return head + messages + tail
+            limit //= 2
+
+        # 2) Leave out the oldest turns (never the pinned intro or the current turn)
+        pinned, turns = self._split(messages)
+        while len(turns) > 1 and count_tokens(head + pinned + [m for t in turns for m in t], self.model_name) > budget:
+            turns.pop(0)
+        return head + pinned + [m for t in turns for m in t] + tail
@@ -0,0 +1,170 @@
+# === batch_embed.py ===
+# Batched OpenAI embedding stage: packs many inputs per request under a token budget,
+# runs a bounded number of batches concurrently, retries with backoff and checkpoints
+# finished batches so an interrupted build resumes where it stopped.
+
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to a character-based estimate
+    tiktoken = None
+
+
+class BatchEmbedder:
+    def __init__(
+        self,
+        client,
+        model_name="text-embedding-3-small",
+        max_tokens_per_request=8000,   # Token budget per embeddings.create() call
+        max_inputs_per_request=256,    # OpenAI accepts up to 2048 inputs per call
+        max_concurrency=4,             # Batches in flight at once
+        max_retries=5,
+        backoff_base=1.0,              # Seconds; doubled on every retry
+        checkpoint_dir=None            # Folder for finished batches (None = no checkpointing)
+    ):
+        self.client = client
+        self.model_name = model_name
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_inputs_per_request = max_inputs_per_request
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.checkpoint_dir = checkpoint_dir
+
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model_name)
+            except Exception:  # Unknown model, or the BPE file cannot be downloaded offline
+                self._encoding = None
+
+
+    # === Token accounting ===
+    def count_tokens(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1  # ~4 characters per token for English text
+
+
+    # === Pack texts into (start, end) batches under the token and input budgets ===
+    def plan_batches(self, texts):
+        batches = []
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = self.count_tokens(text)
+            too_many_tokens = tokens + text_tokens > self.max_tokens_per_request
+            too_many_inputs = i - start >= self.max_inputs_per_request
+            if i > start and (too_many_tokens or too_many_inputs):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+
+    # === Checkpoint helpers ===
+    def _fingerprint(self, texts, batches):
+        digest = hashlib.sha256(self.model_name.encode("utf-8"))
+        for text in texts:
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        digest.update(json.dumps(batches).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _prepare_checkpoint(self, fingerprint):
+        if not self.checkpoint_dir:
+            return
+        manifest_path = os.path.join(self.checkpoint_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    return
+            print("⚠️ Embedding checkpoint belongs to different input — discarding it.")
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "model_name": self.model_name}, f)
+
+    def _batch_path(self, start, end):
+        return os.path.join(self.checkpoint_dir, f"batch_{start:08d}_{end:08d}.npy")
+
+    def _load_batch(self, start, end):
+        if not self.checkpoint_dir:
+            return None
+        path = self._batch_path(start, end)
+        return np.load(path) if os.path.exists(path) else None
+
+    def _save_batch(self, start, end, vectors):
+        if not self.checkpoint_dir:
+            return
+        path = self._batch_path(start, end)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, vectors)
+        os.replace(path + ".tmp", path)
+
+
+    # === One request, retried with exponential backoff and jitter ===
+    def _embed_batch(self, batch_texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(model=self.model_name, input=batch_texts)
+                data = sorted(response.data, key=lambda d: d.index)
+                return np.array([d.embedding for d in data], dtype="float32")
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) * (1 + random.random() * 0.25)
+                print(f"⚠️ Embedding batch failed ({e}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+
+    def _run_batch(self, texts, start, end):
+        vectors = self._embed_batch(texts[start:end])
+        self._save_batch(start, end, vectors)  # Checkpoint as soon as the batch lands
+        return vectors
+
+
+    # === Embed all texts, returning a float32 array aligned with the input order ===
+    def embed(self, texts):
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+
+        batches = self.plan_batches(texts)
+        self._prepare_checkpoint(self._fingerprint(texts, batches))
+
+        results = {}
+        todo = []
+        for start, end in batches:
+            cached = self._load_batch(start, end)
+            if cached is not None:
+                results[start] = cached
+            else:
+                todo.append((start, end))
+
+        resumed = len(texts) - sum(end - start for start, end in todo)
+        if resumed:
+            print(f"🔁 Resuming embedding from checkpoint: {resumed}/{len(texts)} texts already done")
+
+        with tqdm(total=len(texts), initial=resumed, desc="Embedding batches") as progress:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                futures = {pool.submit(self._run_batch, texts, start, end): (start, end) for start, end in todo}
+                for future in as_completed(futures):
+                    start, end = futures[future]
+                    results[start] = future.result()
+                    progress.update(end - start)
+
+        embeddings = np.concatenate([results[start] for start, _ in batches], axis=0)
+
+        if self.checkpoint_dir:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        return embeddings
@@ -0,0 +1,188 @@
+# === embedding_cache.py ===
+# Process-wide cache for query embeddings, shared by every retrieval path
+# (VectorStoreManager.query, KnowledgeBaseTool.retrieve_solution, get_ticket_answer).
+#
+# Helpdesk traffic is very repetitive ("forgot my password", "VPN not connecting"),
+# so identical queries skip the embedding round trip entirely.
+#
+#   Tier 1: in-memory LRU bounded by entry count and TTL
+#   Tier 2: optional SQLite file (set QUERY_EMBED_CACHE_DB) that survives restarts
+#           and can be shared by several workers on one box
+#
+# Configuration (environment):
+#   QUERY_EMBED_CACHE_SIZE  → max in-memory entries (default 2048)
+#   QUERY_EMBED_CACHE_TTL   → seconds an entry stays valid (default 86400)
+#   QUERY_EMBED_CACHE_DB    → path of the SQLite tier (default: disabled)
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text):
+    """Lowercase, trim and collapse whitespace so trivially different queries share an entry."""
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries=2048, ttl_seconds=86400, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+
+        self._entries = OrderedDict()  # (model, normalized text) -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._local = threading.local()  # sqlite connections are per thread
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, expires_at REAL NOT NULL, vector BLOB NOT NULL)"
+                )
+
+
+    # === SQLite tier ===
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _disk_key(model, text):
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _disk_get(self, model, text):
+        row = self._connect().execute(
+            "SELECT expires_at, vector FROM query_embeddings WHERE key = ?", (self._disk_key(model, text),)
+        ).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return np.frombuffer(row[1], dtype="float32")
+
+    def _disk_put(self, model, text, vector, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, expires_at, vector) VALUES (?, ?, ?, ?)",
+                (self._disk_key(model, text), model, expires_at, vector.tobytes()),
+            )
+
+
+    # === In-memory tier ===
+    def _memory_put(self, key, vector, expires_at):
+        self._entries[key] = (expires_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+    # === Public API ===
+    def get(self, model, text):
+        """Cached float32 vector (read-only) for a query, or None."""
+        key = (model, normalize_query(text))
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk_path:
+            vector = self._disk_get(*key)
+            if vector is not None:
+                with self._lock:
+                    self._memory_put(key, vector, now + self.ttl_seconds)
+                    self._stats["disk_hits"] += 1
+                return vector
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, model, text, vector):
+        key = (model, normalize_query(text))
+        vector = np.array(vector, dtype="float32")
+        vector.setflags(write=False)  # Shared between callers; copy before normalizing in place
+        expires_at = time.time() + self.ttl_seconds
+
+        with self._lock:
+            self._memory_put(key, vector, expires_at)
+        if self.disk_path:
+            self._disk_put(*key, vector, expires_at)
+        return vector
+
+    def get_or_compute(self, model, text, compute):
+        """Return the cached vector, or call compute() (which embeds the query) and cache it."""
+        vector = self.get(model, text)
+        if vector is None:
+            vector = self.put(model, text, compute())
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM query_embeddings")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """Process-wide cache configured from the environment, created on first use."""
+    global _query_embedding_cache
+
+    if _query_embedding_cache is None:
+        with _query_embedding_cache_lock:
+            if _query_embedding_cache is None:
+                _query_embedding_cache = QueryEmbeddingCache(
+                    max_entries=int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048")),
+                    ttl_seconds=float(os.getenv("QUERY_EMBED_CACHE_TTL", "86400")),
+                    disk_path=os.getenv("QUERY_EMBED_CACHE_DB") or None,
+                )
+    return _query_embedding_cache
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that routes embed_query through the shared cache.
+    Document embedding (index builds) is passed straight through.
+    """
+
+    def __init__(self, embeddings, cache=None):
+        self.embeddings = embeddings
+        self.cache = cache or get_query_embedding_cache()
+        self.model_name = getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self.cache.get_or_compute(self.model_name, text, lambda: self.embeddings.embed_query(text))
+        return vector.tolist()
@@ -0,0 +1,103 @@
+# === fake_embedding_server.py ===
+# Local stand-in for the OpenAI embeddings endpoint, used to exercise the batched
+# ingest pipeline without network access or API cost.
+#
+# Usage:
+#   python -m data_pipeline.fake_embedding_server --port 8089 --fail-every 5
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python -m data_pipeline.ingest
+#
+# Vectors are deterministic per input text, so repeated runs produce identical indexes.
+
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text, dim):
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    """Threaded HTTP server that records request stats and can inject failures."""
+
+    def __init__(self, address, dim=1536, fail_every=0):
+        super().__init__(address, FakeEmbeddingHandler)
+        self.dim = dim
+        self.fail_every = fail_every  # Return HTTP 429 on every Nth request (0 = never)
+        self.requests = 0
+        self.inputs = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            request_no = server.requests
+            if not (server.fail_every and request_no % server.fail_every == 0):
+                server.inputs += len(inputs)
+
+        if server.fail_every and request_no % server.fail_every == 0:
+            self._reply(429, {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit"}})
+            return
+
+        self._reply(200, {
+            "object": "list",
+            "model": body.get("model", "fake"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), server.dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+
+def start_fake_embedding_server(host="127.0.0.1", port=0, dim=1536, fail_every=0):
+    """Start the server on a background thread and return it (port=0 picks a free port)."""
+    server = FakeEmbeddingServer((host, port), dim=dim, fail_every=fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer((args.host, args.port), dim=args.dim, fail_every=args.fail_every)
+    print(f"🧪 Fake embedding server listening on {server.base_url}")
+    server.serve_forever()
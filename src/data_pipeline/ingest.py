@@ -2,14 +2,18 @@
 # Unified FAISS + OpenAI embeddings handler (build, load, and query with threshold)
 
 import os
+import json
 import pickle
+import hashlib
 import numpy as np
 import pandas as pd
 import faiss
-from tqdm import tqdm
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from data_pipeline.batch_embed import BatchEmbedder
+from data_pipeline.embedding_cache import get_query_embedding_cache
+
 
 class VectorStoreManager:
     def __init__(
@@ -20,7 +24,13 @@ class VectorStoreManager:
         faiss_index_path="data_pipeline/faiss_qa.index",
         metadata_path="data_pipeline/metadata.pkl",
         model_name="text-embedding-3-small",
-        similarity_threshold=0.5  # Default threshold (0.0–1.0)
+        similarity_threshold=0.5,  # Default threshold (0.0–1.0)
+        manifest_path="data_pipeline/ingest_manifest.json",
+        key_col=None,  # Stable row identifier (e.g. "number"); defaults to the question text
+        batch_max_tokens=8000,  # Token budget per embeddings request
+        batch_max_inputs=256,  # Inputs packed into one embeddings request
+        embed_concurrency=4,  # Embedding requests in flight at once
+        checkpoint_dir="data_pipeline/.embed_checkpoint"  # Resume point for interrupted builds
     ):
         # Load API key
         load_dotenv(dotenv_path=".env", override=True)
@@ -36,13 +46,27 @@ class VectorStoreManager:
         self.metadata_path = metadata_path
         self.model_name = model_name
         self.similarity_threshold = similarity_threshold
+        self.manifest_path = manifest_path
+        self.key_col = key_col
+
+        self.embedder = BatchEmbedder(
+            self.client,
+            model_name=model_name,
+            max_tokens_per_request=batch_max_tokens,
+            max_inputs_per_request=batch_max_inputs,
+            max_concurrency=embed_concurrency,
+            checkpoint_dir=checkpoint_dir,
+        )
 
         self.index = None
         self.metadata = None
 
 
     # === Build the FAISS vector store (only using questions for embeddings) ===
-    def build_vector_store(self):
+    def build_vector_store(self, incremental=False):
+        if incremental:
+            return self.update_vector_store()
+
         print("📥 Loading CSV data...")
         df = pd.read_csv(self.csv_path)
 
@@ -55,18 +79,9 @@ class VectorStoreManager:
         print(f"✅ Loaded {len(questions)} questions from CSV")
 
         # Generate embeddings only for the questions
-        embeddings = []
-        print(f"🧠 Generating embeddings for questions using model '{self.model_name}'...")
-        for question in tqdm(questions, desc="Embedding questions"):
-            response = self.client.embeddings.create(model=self.model_name, input=question)
-            embeddings.append(response.data[0].embedding)
-
-        embeddings = np.array(embeddings, dtype="float32")
+        embeddings = self._embed_texts(questions)
         dim = embeddings.shape[1]
 
-        # Normalize for cosine similarity
-        faiss.normalize_L2(embeddings)
-
         # Create FAISS index for cosine similarity
         index = faiss.IndexFlatIP(dim)
         index.add(embeddings)
@@ -84,6 +99,176 @@ class VectorStoreManager:
         self.metadata = df.to_dict(orient="records")
 
 
+    # === Embed a list of texts (L2-normalized for cosine similarity) ===
+    def _embed_texts(self, texts):
+        print(f"🧠 Generating embeddings for {len(texts)} questions using model '{self.model_name}'...")
+        embeddings = self.embedder.embed(texts)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+
+    # === Row identity and content hashes for incremental ingest ===
+    def _row_keys(self, df):
+        """Stable per-row keys; repeated values get an occurrence suffix so every row stays addressable."""
+        column = self.key_col or self.question_col
+        if column not in df.columns:
+            raise ValueError(f"CSV must contain the key column '{column}'.")
+
+        seen = {}
+        keys = []
+        for value in df[column].astype(str).tolist():
+            occurrence = seen.get(value, 0)
+            seen[value] = occurrence + 1
+            keys.append(value if occurrence == 0 else f"{value}#{occurrence}")
+        return keys
+
+    def _row_hashes(self, record):
+        """Hash of the embedded question and of the full row (metadata-only edits skip re-embedding)."""
+        question = str(record[self.question_col])
+        row = json.dumps(record, sort_keys=True, default=str)
+        return (
+            hashlib.sha256(question.encode("utf-8")).hexdigest(),
+            hashlib.sha256(row.encode("utf-8")).hexdigest(),
+        )
+
+    def _empty_manifest(self):
+        return {"model_name": self.model_name, "next_id": 0, "rows": {}}
+
+
+    # === Load (or migrate) the ID-mapped index, metadata and manifest ===
+    def _load_incremental_state(self):
+        if not os.path.exists(self.faiss_index_path) or not os.path.exists(self.metadata_path):
+            return None, {}, self._empty_manifest()
+
+        index = faiss.read_index(self.faiss_index_path)
+        with open(self.metadata_path, "rb") as f:
+            metadata = pickle.load(f)
+
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            # Index written by build_vector_store(): positions line up with the metadata list,
+            # so wrap the stored vectors in an ID map instead of re-embedding them.
+            print("🔁 Migrating positional FAISS index to an ID-mapped index...")
+            return self._migrate_positional_index(index, metadata)
+
+        if manifest is None or manifest.get("model_name") != self.model_name:
+            print("⚠️ Ingest manifest missing or built with another model — starting from scratch.")
+            return None, {}, self._empty_manifest()
+
+        return index, metadata, manifest
+
+    def _migrate_positional_index(self, index, metadata):
+        id_index = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+        ids = np.arange(index.ntotal, dtype="int64")
+        if index.ntotal:
+            id_index.add_with_ids(index.reconstruct_n(0, index.ntotal), ids)
+
+        manifest = self._empty_manifest()
+        if metadata:
+            keys = self._row_keys(pd.DataFrame(metadata))
+            for key, vector_id, record in zip(keys, ids.tolist(), metadata):
+                question_hash, row_hash = self._row_hashes(record)
+                manifest["rows"][key] = {"id": vector_id, "question_hash": question_hash, "row_hash": row_hash}
+        manifest["next_id"] = int(index.ntotal)
+
+        return id_index, dict(enumerate(metadata)), manifest
+
+    def _save_incremental_state(self, index, metadata, manifest):
+        os.makedirs(os.path.dirname(self.faiss_index_path), exist_ok=True)
+        faiss.write_index(index, self.faiss_index_path + ".tmp")
+        os.replace(self.faiss_index_path + ".tmp", self.faiss_index_path)
+        with open(self.metadata_path + ".tmp", "wb") as f:
+            pickle.dump(metadata, f)
+        os.replace(self.metadata_path + ".tmp", self.metadata_path)
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+    # === Incrementally update the FAISS store (embeds only new/changed rows) ===
+    def update_vector_store(self):
+        """
+        Sync the index with the CSV using a per-row content hash manifest.
+        New rows and rows whose question changed are embedded; rows removed from
+        the CSV are deleted from the ID-mapped index; everything else is reused.
+        Returns a dict with counts of added, changed, updated, removed and unchanged rows.
+        """
+        print("📥 Loading CSV data for incremental ingest...")
+        df = pd.read_csv(self.csv_path)
+
+        if self.question_col not in df.columns or self.solution_col not in df.columns:
+            raise ValueError(
+                f"CSV must contain '{self.question_col}' and '{self.solution_col}' columns."
+            )
+
+        keys = self._row_keys(df)
+        records = df.to_dict(orient="records")
+        index, metadata, manifest = self._load_incremental_state()
+        rows = manifest["rows"]
+
+        stats = {"added": 0, "changed": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        stale_ids = []
+        pending = []  # (vector_id, question) pairs that need a new embedding
+        current_keys = set(keys)
+
+        for key, record in zip(keys, records):
+            question_hash, row_hash = self._row_hashes(record)
+            entry = rows.get(key)
+
+            if entry is None:
+                vector_id = manifest["next_id"]
+                manifest["next_id"] += 1
+                pending.append((vector_id, str(record[self.question_col])))
+                stats["added"] += 1
+            elif entry["question_hash"] != question_hash:
+                vector_id = entry["id"]
+                stale_ids.append(vector_id)
+                pending.append((vector_id, str(record[self.question_col])))
+                stats["changed"] += 1
+            elif entry["row_hash"] != row_hash:
+                vector_id = entry["id"]
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+
+            rows[key] = {"id": vector_id, "question_hash": question_hash, "row_hash": row_hash}
+            metadata[vector_id] = record
+
+        for key in [k for k in rows if k not in current_keys]:
+            vector_id = rows.pop(key)["id"]
+            stale_ids.append(vector_id)
+            metadata.pop(vector_id, None)
+            stats["removed"] += 1
+
+        if index is not None and stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+
+        if pending:
+            embeddings = self._embed_texts([question for _, question in pending])
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.shape[1]))
+            index.add_with_ids(embeddings, np.array([vector_id for vector_id, _ in pending], dtype="int64"))
+
+        if index is None:
+            print("⚠️ Nothing to index — CSV is empty.")
+            return stats
+
+        self._save_incremental_state(index, metadata, manifest)
+        print(
+            f"💾 Incremental ingest → +{stats['added']} new, ~{stats['changed']} re-embedded, "
+            f"{stats['updated']} metadata-only, -{stats['removed']} removed, {stats['unchanged']} unchanged"
+        )
+
+        self.index = index
+        self.metadata = metadata
+        return stats
+
+
     # === Load existing vector store ===
     def load_vector_store(self):
         if not os.path.exists(self.faiss_index_path) or not os.path.exists(self.metadata_path):
@@ -100,9 +285,13 @@ class VectorStoreManager:
         if self.index is None or self.metadata is None:
             raise RuntimeError("❌ Vector store not initialized. Call load_vector_store() first.")
 
-        # Get query embedding
-        response = self.client.embeddings.create(model=self.model_name, input=user_query)
-        query_embedding = np.array(response.data[0].embedding, dtype="float32").reshape(1, -1)
+        # Get query embedding (shared cache skips the round trip for repeated queries)
+        cached = get_query_embedding_cache().get_or_compute(
+            self.model_name,
+            user_query,
+            lambda: self.client.embeddings.create(model=self.model_name, input=user_query).data[0].embedding,
+        )
+        query_embedding = np.array(cached, dtype="float32").reshape(1, -1)
         faiss.normalize_L2(query_embedding)
 
         # Search index (cosine similarity)
@@ -110,6 +299,8 @@ class VectorStoreManager:
 
         results = []
         for idx, score in zip(I[0], D[0]):
+            if idx < 0:  # Fewer than top_k vectors in the index
+                continue
             similarity = float(score)
             results.append({
                 "question": self.metadata[idx][self.question_col],
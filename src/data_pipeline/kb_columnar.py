@@ -0,0 +1,293 @@
+# === kb_columnar.py ===
+# Converts the knowledge_base/*.csv exports, whose embedding columns hold stringified
+# numpy reprs ("[array([-9.81e-02, ...]), ...]"), into a binary columnar store:
+#
+#   knowledge_base/<name>.kb/
+#       meta.json                    → source CSV hash, row count, column layout
+#       scalars.parquet              → text/scalar columns (scalars.json.gz without pyarrow)
+#       <column>.npy                 → dense float32 matrix, row i == CSV row i
+#       <column>.npy + .offsets.npy  → ragged columns (per-chunk vectors / scores)
+#
+# Vectors are memory-mapped on load, so startup does not reparse text and precomputed
+# embeddings go straight into FAISS without calling an embedding API again.
+#
+# Usage:
+#   python -m data_pipeline.kb_columnar knowledge_base/chunked_knowledge-base.csv ...
+
+import os
+import re
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import faiss
+
+try:
+    import pyarrow  # noqa: F401  (enables parquet for the scalar columns)
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+STORE_SUFFIX = ".kb"
+VECTOR_COLUMN_PATTERN = re.compile(r"(_embedding|_embeddings|_scores)$")
+ARRAY_PATTERN = re.compile(r"array\(\[(.*?)\]", re.DOTALL)
+
+
+# === Parsing helpers ===
+def parse_vector(cell):
+    """Parse "[a b c]" (numpy repr) or "[a, b, c]" (list repr) into a 1-D float32 array."""
+    text = str(cell).strip().strip("[]").replace(",", " ")
+    if "..." in text:
+        raise ValueError("summarized numpy repr")
+    return np.array(text.split(), dtype="float32")
+
+
+def parse_vector_list(cell):
+    """Parse "[array([...]), array([...])]" into a 2-D float32 array (one row per chunk)."""
+    vectors = [parse_vector(body) for body in ARRAY_PATTERN.findall(str(cell))]
+    if not vectors:
+        return np.zeros((0, 0), dtype="float32")
+    return np.vstack(vectors)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_dir_for(csv_path):
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def _is_missing(cell):
+    return cell is None or (isinstance(cell, float) and np.isnan(cell)) or not str(cell).strip()
+
+
+def _parse_cells(cells, parser, empty):
+    """
+    Parse every cell, treating missing and unreadable cells (e.g. numpy's summarized
+    "[a b ... y z]" reprs, which cannot be recovered) as empty. Returns (parts, unreadable).
+    """
+    parts, unreadable = [], 0
+    for cell in cells:
+        if _is_missing(cell):
+            parts.append(empty)
+            continue
+        try:
+            parts.append(parser(cell))
+        except ValueError:
+            parts.append(empty)
+            unreadable += 1
+    return parts, unreadable
+
+
+# === Converter ===
+def convert_csv(csv_path, store_dir=None, vector_columns=None):
+    """
+    Convert one knowledge-base CSV into a columnar store and return its directory.
+    Vector columns default to every column ending in _embedding, _embeddings or _scores.
+    """
+    store_dir = store_dir or store_dir_for(csv_path)
+    df = pd.read_csv(csv_path)
+    df = df.loc[:, [c for c in df.columns if not c.startswith("Unnamed: ") or df[c].notna().any()]]
+
+    if vector_columns is None:
+        vector_columns = [c for c in df.columns if VECTOR_COLUMN_PATTERN.search(c)]
+
+    os.makedirs(store_dir, exist_ok=True)
+    layout = {}
+
+    for column in vector_columns:
+        cells = df[column].tolist()
+        is_vector_list = any("array(" in str(cell) for cell in cells if not _is_missing(cell))
+
+        if is_vector_list:
+            parts, unreadable = _parse_cells(cells, parse_vector_list, np.zeros((0, 0), dtype="float32"))
+        else:
+            parts, unreadable = _parse_cells(cells, parse_vector, np.zeros(0, dtype="float32"))
+        if unreadable:
+            print(f"⚠️ {csv_path}: {unreadable} '{column}' cells could not be parsed — stored as missing.")
+
+        if is_vector_list:
+            # Ragged 2-D: a list of chunk vectors per row
+            dim = max((p.shape[1] for p in parts if p.size), default=0)
+            parts = [p if p.size else np.zeros((0, dim), dtype="float32") for p in parts]
+            _save_ragged(store_dir, column, parts, np.zeros((0, dim), dtype="float32"))
+            layout[column] = {"kind": "ragged", "dim": dim}
+            continue
+
+        lengths = {len(p) for p in parts if len(p)}
+        per_chunk = column.endswith("_scores")  # One score per chunk, however many chunks a row has
+
+        if len(lengths) == 1 and not per_chunk:
+            # Dense: one fixed-size vector per row (missing rows are NaN)
+            dim = lengths.pop()
+            matrix = np.full((len(parts), dim), np.nan, dtype="float32")
+            for i, p in enumerate(parts):
+                if len(p):
+                    matrix[i] = p
+            _save_array(os.path.join(store_dir, f"{column}.npy"), matrix)
+            layout[column] = {"kind": "dense", "dim": dim}
+        else:
+            # Ragged 1-D: variable-length values per row (e.g. per-chunk scores)
+            _save_ragged(store_dir, column, parts, np.zeros(0, dtype="float32"))
+            layout[column] = {"kind": "ragged", "dim": None}
+
+    scalars = df.drop(columns=vector_columns)
+    scalars.insert(0, "row_id", np.arange(len(df), dtype="int64"))
+    scalars_file = _save_scalars(store_dir, scalars)
+
+    meta = {
+        "source_csv": csv_path,
+        "source_sha256": file_sha256(csv_path),
+        "rows": int(len(df)),
+        "scalars_file": scalars_file,
+        "vectors": layout,
+    }
+    with open(os.path.join(store_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"💾 Converted {csv_path} → {store_dir} ({len(df)} rows, {len(layout)} vector columns)")
+    return store_dir
+
+
+def _save_array(path, array):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(path + ".tmp", path)
+
+
+def _save_ragged(store_dir, column, parts, empty):
+    offsets = np.zeros(len(parts) + 1, dtype="int64")
+    offsets[1:] = np.cumsum([len(p) for p in parts])
+    values = np.concatenate(parts, axis=0).astype("float32") if offsets[-1] else empty
+    _save_array(os.path.join(store_dir, f"{column}.npy"), values)
+    _save_array(os.path.join(store_dir, f"{column}.offsets.npy"), offsets)
+
+
+def _save_scalars(store_dir, scalars):
+    if HAS_PARQUET:
+        scalars.to_parquet(os.path.join(store_dir, "scalars.parquet"), index=False)
+        return "scalars.parquet"
+    scalars.to_json(os.path.join(store_dir, "scalars.json.gz"), orient="columns", compression="gzip")
+    return "scalars.json.gz"
+
+
+# === Loader ===
+class KBColumnarStore:
+    """
+    Read-only view over a converted knowledge-base store.
+    Vector columns are memory-mapped float32 arrays aligned to row_id.
+    """
+
+    def __init__(self, store_dir, mmap=True):
+        self.store_dir = store_dir
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._arrays = {}
+        self._scalars = None
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def vector_columns(self):
+        return list(self.meta["vectors"])
+
+    @property
+    def scalars(self):
+        if self._scalars is None:
+            path = os.path.join(self.store_dir, self.meta["scalars_file"])
+            if path.endswith(".parquet"):
+                self._scalars = pd.read_parquet(path)
+            else:
+                self._scalars = pd.read_json(path, orient="columns", compression="gzip")
+        return self._scalars
+
+    def _load(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.store_dir, f"{name}.npy"), mmap_mode=self.mmap_mode)
+        return self._arrays[name]
+
+    def vectors(self, column):
+        """Dense (rows, dim) matrix for a fixed-size column such as avg_embedding."""
+        if self.meta["vectors"][column]["kind"] != "dense":
+            raise ValueError(f"Column '{column}' is ragged; use ragged() instead.")
+        return self._load(column)
+
+    def ragged(self, column, row_id):
+        """Values of a ragged column (e.g. chunk_embeddings) for one row."""
+        offsets = self._load(f"{column}.offsets")
+        return self._load(column)[offsets[row_id]:offsets[row_id + 1]]
+
+    def build_faiss_index(self, column="avg_embedding"):
+        """
+        Cosine-similarity FAISS index over a dense column; FAISS ids are row_ids.
+        Rows without a vector are left out of the index.
+        """
+        matrix = np.array(self.vectors(column), dtype="float32")  # Copy: normalize_L2 works in place
+        valid = ~np.isnan(matrix).any(axis=1)
+        faiss.normalize_L2(matrix)
+
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(matrix.shape[1]))
+        index.add_with_ids(matrix[valid], np.flatnonzero(valid).astype("int64"))
+        return index
+
+    def to_langchain_faiss(self, embeddings, text_column="fianl_description", column="avg_embedding", metadata_columns=None):
+        """
+        LangChain FAISS store built from the stored vectors (no embedding API calls).
+        `embeddings` is only used to embed future queries, so it must be the model
+        that produced the stored vectors.
+        """
+        from langchain_community.vectorstores import FAISS
+
+        matrix = self.vectors(column)
+        scalars = self.scalars
+        metadata_columns = metadata_columns or [c for c in scalars.columns if c != text_column]
+        valid = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+
+        records = scalars[metadata_columns].to_dict(orient="records")
+        texts = scalars[text_column].astype(str).tolist()
+        return FAISS.from_embeddings(
+            [(texts[i], matrix[i].tolist()) for i in valid],
+            embeddings,
+            metadatas=[records[i] for i in valid],
+            normalize_L2=True,
+        )
+
+
+def load_kb_store(csv_path, store_dir=None, mmap=True):
+    """
+    Return a KBColumnarStore for a knowledge-base CSV, converting it first if the
+    store is missing or was built from a different version of the CSV.
+    """
+    store_dir = store_dir or store_dir_for(csv_path)
+    meta_path = os.path.join(store_dir, "meta.json")
+
+    up_to_date = False
+    if os.path.exists(meta_path):
+        if not os.path.exists(csv_path):
+            up_to_date = True  # Store shipped without its source CSV
+        else:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                up_to_date = json.load(f).get("source_sha256") == file_sha256(csv_path)
+
+    if not up_to_date:
+        convert_csv(csv_path, store_dir)
+    return KBColumnarStore(store_dir, mmap=mmap)
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or [
+        "knowledge_base/chunked_knowledge-base.csv",
+        "knowledge_base/ticket_chunked_knowledge-base.csv",
+        "knowledge_base/automated_ticket_chunked_knowledge-base.csv",
+    ]
+    for csv_path in paths:
+        convert_csv(csv_path)
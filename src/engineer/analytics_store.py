@@ -0,0 +1,144 @@
+# analytics_store.py — Per-engineer aggregates for review_analytics
+#
+# review_analytics used to pull 100 raw incidents per call, count states in Python
+# and print placeholder numbers. It now answers from the local incident mirror
+# (incident_mirror.py, incrementally synced):
+#
+#   - per-engineer aggregates are computed with vectorized pandas over the mirrored
+#     incidents: open / resolved counts, mean / p50 / p90 resolution time and SLA
+#     breach rate (made_sla=false among resolved incidents)
+#   - they are kept in memory and recomputed only after the mirror changed, so
+#     engineer_summary() answers in milliseconds; refresh() brings the mirror within
+#     its staleness bound first (INCIDENT_MIRROR_MAX_AGE)
+#
+# Usage (from src/):
+#   python -m engineer.analytics_store sync
+#   python -m engineer.analytics_store report david.miller@petabytz.com
+import sys
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+
+from incident_mirror import SNOW_DATETIME, column, get_incident_mirror, incident_mirror
+
+RESOLVED_STATES = ("6", "7")   # Resolved, Closed
+CANCELED_STATES = ("8",)
+
+
+class AnalyticsStore:
+    """Per-engineer aggregates over the incident mirror, cached until the mirror changes."""
+
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self._aggregates = None
+        self._generation = None
+        self._aggregates_lock = threading.Lock()
+
+    @property
+    def watermark(self):
+        return self.mirror.watermark
+
+    @property
+    def last_sync(self):
+        return self.mirror.last_sync
+
+    async def sync(self):
+        """Incremental sync of the mirror; returns the number of incidents changed."""
+        return await self.mirror.sync()
+
+    async def refresh(self, max_age=None):
+        """Sync when the mirror is older than `max_age` seconds (default: its staleness bound)."""
+        await self.mirror.ensure_fresh(max_age)
+
+    # -- aggregates ------------------------------------------------------------
+    def compute_aggregates(self):
+        """Per-engineer aggregates (DataFrame indexed by engineer email), vectorized over all incidents."""
+        engineer = column("assigned_to.email")
+        frame = pd.read_sql_query(
+            f"SELECT {engineer} AS engineer, state, opened_at, resolved_at, closed_at, made_sla "
+            f"FROM incidents WHERE {engineer} != ''",
+            self.mirror.connection(),
+        )
+        resolved = frame["state"].isin(RESOLVED_STATES).to_numpy()
+        canceled = frame["state"].isin(CANCELED_STATES).to_numpy()
+
+        opened = pd.to_datetime(frame["opened_at"], format=SNOW_DATETIME, errors="coerce")
+        ended = pd.to_datetime(
+            frame["resolved_at"].where(frame["resolved_at"] != "", frame["closed_at"]),
+            format=SNOW_DATETIME, errors="coerce",
+        )
+        hours = ((ended - opened).dt.total_seconds() / 3600).to_numpy()
+
+        made_sla = frame["made_sla"].str.lower().to_numpy()
+        breached = np.where(made_sla == "false", 1.0, np.where(made_sla == "true", 0.0, np.nan))
+
+        per_incident = pd.DataFrame({
+            "engineer": frame["engineer"],
+            "open": ~resolved & ~canceled,
+            "resolved": resolved,
+            "hours": np.where(resolved & (hours >= 0), hours, np.nan),
+            "breached": np.where(resolved, breached, np.nan),
+        })
+        grouped = per_incident.groupby("engineer")
+        return pd.DataFrame({
+            "open": grouped["open"].sum().astype(int),
+            "resolved": grouped["resolved"].sum().astype(int),
+            "mean_hours": grouped["hours"].mean(),
+            "p50_hours": grouped["hours"].quantile(0.5),
+            "p90_hours": grouped["hours"].quantile(0.9),
+            "sla_breach_rate": grouped["breached"].mean(),
+            "sla_measured": grouped["breached"].count(),
+        })
+
+    @property
+    def aggregates(self):
+        with self._aggregates_lock:
+            generation = self.mirror.generation
+            if self._aggregates is None or self._generation != generation:
+                self._aggregates = self.compute_aggregates()
+                self._generation = generation
+            return self._aggregates
+
+    def engineer_summary(self, email):
+        """Aggregates for one engineer as a dict (zeros when the engineer has no incidents)."""
+        key = str(email or "").strip().lower()
+        aggregates = self.aggregates
+        if key not in aggregates.index:
+            return {"open": 0, "resolved": 0, "mean_hours": None, "p50_hours": None, "p90_hours": None,
+                    "sla_breach_rate": None, "sla_measured": 0}
+        summary = {k: (None if pd.isna(v) else float(v)) for k, v in aggregates.loc[key].items()}
+        for count in ("open", "resolved", "sla_measured"):
+            summary[count] = int(summary[count])
+        return summary
+
+
+def format_duration(hours):
+    if hours is None:
+        return "n/a"
+    return f"{hours:.1f} h" if hours < 48 else f"{hours / 24:.1f} days"
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_analytics_store():
+    """Process-wide store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AnalyticsStore(get_incident_mirror())
+    return _store
+
+
+if __name__ == "__main__":
+    store = AnalyticsStore(incident_mirror.get())  # Without the background sync worker
+    if len(sys.argv) >= 2 and sys.argv[1] == "sync":
+        print(f"✅ Synced {asyncio.run(store.sync())} incidents (watermark {store.watermark})")
+    elif len(sys.argv) == 3 and sys.argv[1] == "report":
+        print(store.engineer_summary(sys.argv[2]))
+    else:
+        print("Usage: python -m engineer.analytics_store sync | report <engineer email>")
+        sys.exit(2)
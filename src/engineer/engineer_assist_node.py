@@ -4,6 +4,9 @@ from langchain_core.runnables import RunnableConfig
 from .engineer_tool import engineer_tools  # import your engineer tools
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from startup import Lazy, get_chat_model
+from context_compaction import ContextCompactor
+from prompt_assembly import AssistantPrompt, record_cache_usage
 import os
 
 
@@ -14,16 +17,20 @@ load_dotenv(dotenv_path=".env", override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
 # Bind engineer tools to the LLM
-llm_with_engineer_tools = llm.bind_tools(engineer_tools)
+# Bound on first use so importing the node does not construct LLM clients
+llm_with_engineer_tools = Lazy(lambda: get_chat_model("gpt-4", 0).bind_tools(engineer_tools), "engineer_llm_with_tools")
+
+# Rolling summary + recent turns, kept within the gpt-4 prompt budget
+engineer_context = ContextCompactor("gpt-4")
 
 # ---------------------------------------------------
 # 🧠 Generate Prompt for the Engineer Assistance Agent
 # ---------------------------------------------------
-def generate_engineer_assistance_prompt(memory: str = "None") -> str:
-    return f"""
+engineer_prompt = AssistantPrompt(
+    "engineer_assistant",
+    """
     You are a professional **Engineer Assistance Agent** in the IT Helpdesk Team. 
     Your main responsibility is to help engineers with **ServiceNow-related tasks** and technical troubleshooting.
 
@@ -52,10 +59,13 @@ def generate_engineer_assistance_prompt(memory: str = "None") -> str:
     - Avoid hallucinations: only use information from tools or verified history.
     - Never expose credentials or internal API details.
 
-    🧩 ADDITIONAL CONTEXT:
-    Prior saved engineer preferences: {memory}
-    The current chat history is attached below.
+    A summary of the earlier conversation (if any), the recent chat history and the saved preferences are attached below.
+    """,
     """
+    🧩 ADDITIONAL CONTEXT:
+    Prior saved engineer preferences: $memory
+    """,
+)
 
 # ---------------------------------------------------
 # 🤖 Engineer Assistance Node Function
@@ -68,16 +78,20 @@ def engineer_assistance(state, config: RunnableConfig):
     - Invokes the ServiceNow LLM agent with access to engineer_tools.
     """
 
-    # Extract engineer memory from state (if any)
-    memory = state.get("loaded_memory", "None")
-
-    # Generate dynamic system prompt
-    engineer_assistance_prompt = generate_engineer_assistance_prompt(memory)
-
     # Call the LLM with engineer-related tools
-    response = llm_with_engineer_tools.invoke(
-        [SystemMessage(engineer_assistance_prompt)] + state["messages"]
+    response = llm_with_engineer_tools.get().invoke(
+        engineer_prompt.messages(engineer_context, state)
     )
+    record_cache_usage(engineer_prompt, response)
 
     # Update conversation history with new response
     return {"messages": [response]}
+
+
+async def aengineer_assistance(state, config: RunnableConfig):
+    """Async variant of engineer_assistance, used when the graph runs with ainvoke/astream."""
+    response = await llm_with_engineer_tools.get().ainvoke(
+        engineer_prompt.messages(engineer_context, state)
+    )
+    record_cache_usage(engineer_prompt, response)
+    return {"messages": [response]}
@@ -8,6 +8,8 @@ import uuid
 # import os
 # sys.path.append(os.path.dirname(__file__))  # add current folder to path
 # from utils import show_graph
+from startup import Lazy
+from session_store import get_checkpointer, get_long_term_store
 
 from typing_extensions import TypedDict
 from typing import Annotated, List
@@ -17,13 +19,15 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.memory import InMemoryStore
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage
-from langgraph.prebuilt import ToolNode
+from tool_execution import build_tool_node
 from langgraph.graph import StateGraph, START, END
 from utils import show_graph
 
 # Import your engineer tools
 from .engineer_tool import engineer_tools
-from .engineer_assist_node import engineer_assistance  # similar to user_assistance but for engineers
+from intent_router import IntentRouter, ENGINEER_INTENTS
+from .engineer_assist_node import engineer_assistance, aengineer_assistance, engineer_context  # similar to user_assistance but for engineers
+from langchain_core.runnables import RunnableLambda
 
 # -------------------------------------------------------------------
 # 1️⃣ Load environment and initialize LLM
@@ -33,14 +37,14 @@ load_dotenv(dotenv_path=".env", override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+# The LLM (bound to the tools) lives in the assist node and is created on first use.
 
 
 # -------------------------------------------------------------------
 # 2️⃣ Initialize memory systems
 # -------------------------------------------------------------------
-in_memory_store = InMemoryStore()
-checkpointer = MemorySaver()
+# Shared, bounded backends from session_store (in-process by default, SQLite with
+# SESSION_BACKEND=sqlite); they are opened when the graph is first built.
 
 # -------------------------------------------------------------------
 # 3️⃣ Define the state schema
@@ -50,13 +54,17 @@ class EngineerState(TypedDict):
     engineer_id: str
     messages: Annotated[list[AnyMessage], add_messages]
     loaded_memory: str
+    summary: str  # Rolling summary of the turns compacted out of `messages`
     remaining_steps: RemainingSteps
 
 # -------------------------------------------------------------------
 # 4️⃣ Bind tools and create a tool node
 # -------------------------------------------------------------------
-llm_with_engineer_tools = llm.bind_tools(engineer_tools)
-engineer_tool_node = ToolNode(engineer_tools)
+# Independent tool calls of one step run concurrently (bounded, with per-tool timeouts)
+engineer_tool_node = build_tool_node(engineer_tools)
+
+# Fast path for command-like messages ("show my tickets", "history of INC0010018")
+engineer_router = IntentRouter(ENGINEER_INTENTS, engineer_tools, "engineer")
 
 # -------------------------------------------------------------------
 # 5️⃣ Conditional function for routing logic
@@ -72,40 +80,70 @@ def should_continue(state: EngineerState, config: RunnableConfig):
 # -------------------------------------------------------------------
 # 6️⃣ Define the engineer workflow graph
 # -------------------------------------------------------------------
-engineer_workflow = StateGraph(EngineerState)
+def build_engineer_subagent():
+    """Build and compile the engineer subagent graph (called once, on first use)."""
+    engineer_workflow = StateGraph(EngineerState)
+
+    engineer_workflow.add_node("engineer_assistant", RunnableLambda(engineer_assistance, afunc=aengineer_assistance, name="engineer_assistant"))
+    engineer_workflow.add_node("engineer_tool_node", engineer_tool_node)
+    engineer_workflow.add_node("compact_context", RunnableLambda(engineer_context.compact, afunc=engineer_context.acompact, name="compact_context"))
+
+    engineer_workflow.add_node("intent_router", RunnableLambda(engineer_router.route, afunc=engineer_router.aroute, name="intent_router"))
+
+    engineer_workflow.add_edge(START, "compact_context")  # Bound the context once per turn
+    engineer_workflow.add_edge("compact_context", "intent_router")
+    # Deterministic commands are answered by the router; everything else goes to the LLM
+    engineer_workflow.add_conditional_edges(
+        "intent_router",
+        engineer_router.next_step,
+        {
+            "assistant": "engineer_assistant",
+            "end": END,
+        },
+    )
+    engineer_workflow.add_conditional_edges(
+        "engineer_assistant",
+        should_continue,
+        {
+            "continue": "engineer_tool_node",
+            "end": END,
+        },
+    )
+
+    engineer_workflow.add_edge("engineer_tool_node", "engineer_assistant")
+
+    engineer_subagent = engineer_workflow.compile(
+        name="engineer_subagent",
+        checkpointer=get_checkpointer(),
+        store=get_long_term_store(),
+    )
+    return engineer_subagent
 
-engineer_workflow.add_node("engineer_assistant", engineer_assistance)
-engineer_workflow.add_node("engineer_tool_node", engineer_tool_node)
 
-engineer_workflow.add_edge(START, "engineer_assistant")
-engineer_workflow.add_conditional_edges(
-    "engineer_assistant",
-    should_continue,
-    {
-        "continue": "engineer_tool_node",
-        "end": END,
-    },
-)
+# Compiled on first use (or by the startup warmup) instead of at import time.
+engineer_subagent_resource = Lazy(build_engineer_subagent, "engineer_subagent")
+get_engineer_subagent = engineer_subagent_resource.get
 
-engineer_workflow.add_edge("engineer_tool_node", "engineer_assistant")
 
-engineer_subagent = engineer_workflow.compile(
-    name="engineer_subagent",
-    checkpointer=checkpointer,
-    store=in_memory_store,
-)
+def __getattr__(name):
+    # Backwards compatible `from engineer.engineer_subagent import engineer_subagent` (builds on access)
+    if name == "engineer_subagent":
+        return get_engineer_subagent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # -------------------------------------------------------------------
 # 7️⃣ Visualize and test the subagent
 # -------------------------------------------------------------------
-show_graph(engineer_subagent)
 
 if __name__ == "__main__":
-    thread_id = uuid.uuid4()
+    show_graph(get_engineer_subagent())  # Rendering is on demand only (it may call a remote Mermaid service)
+
+    thread_id = str(uuid.uuid4())
     query = "Show all my assigned tickets and add a note to INC00321."
     config = {"configurable": {"thread_id": thread_id}}
     
-    result = engineer_subagent.invoke(
+    result = get_engineer_subagent().invoke(
         {"messages": [HumanMessage(content=query)]},
         config=config
     )
@@ -16,6 +16,7 @@ from langchain_openai import ChatOpenAI
 from prompt_toolkit import HTML
 import requests
 from requests.auth import HTTPBasicAuth
+import asyncio
 import os
 import json
 import datetime
@@ -30,7 +31,14 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
-from .send_email import send_gmail
+from mail_queue import enqueue_mail
+from servicenow_client import snow_get, snow_patch
+from identity_cache import assigned_to_query, resolve_user
+from incident_mirror import get_incident_mirror, WRITE_PARAMS
+from .analytics_store import get_analytics_store, format_duration
+from .report_engine import build_report, render_html, render_pdf
+from utils import async_tool
+from startup import get_chat_model
 from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage
 from dotenv import load_dotenv
 
@@ -57,27 +65,26 @@ SNOW_INSTANCE = os.getenv("SNOW_INSTANCE")
 SNOW_USER = os.getenv("SNOW_USER")
 SNOW_PASS = os.getenv("SNOW_PASS")
 SNOW_API = f"{SNOW_INSTANCE}/api/now/table/incident"
+REPORT_FIELDS = "number,short_description,priority,state,sys_created_on,resolved_at,caller_id.name,assignment_group"
+REPORT_TICKET_LIMIT = int(os.getenv("REPORT_TICKET_LIMIT", "500"))
 MAIL = os.getenv("MAIL")
 GOOG_PASS = os.getenv("GOOG_PASS")
 
 # Initialize LLM for reasoning-based troubleshooting
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+# Chat models are shared and created on first use (startup.get_chat_model)
 
 # ----------------------------- TOOL 1 -----------------------------
 
 
-@tool("show_assigned_tickets")
-def show_assigned_tickets(engineer_email: str) -> str:
+@async_tool("show_assigned_tickets")
+async def show_assigned_tickets(engineer_email: str) -> str:
     """Retrieve all tickets currently assigned to the engineer."""
     try:
-        response = requests.get(
+        response = await snow_get(
             SNOW_API,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            params={"assigned_to.email": engineer_email},
-            headers={"Accept": "application/json"},
-           # verify=False
+            params={"assigned_to.email": engineer_email}
         )
         data = response.json().get("result", [])
         tickets = [t["number"] for t in data]
@@ -88,8 +95,35 @@ def show_assigned_tickets(engineer_email: str) -> str:
 # ----------------------------- TOOL 2 -----------------------------
 
 
-@tool("get_ticket_details")
-def get_ticket_details(ticket_numbers: str, engineer_email: str) -> str:
+TICKET_DETAIL_FIELDS = "number,short_description,description,state,priority,assigned_to.name,sys_created_on,sys_updated_on"
+TICKET_LOOKUP_CHUNK = 50  # Ticket numbers per numberIN query (keeps the URL well under server limits)
+
+
+async def fetch_tickets_by_number(ticket_list: list, engineer_email: str) -> dict:
+    """
+    Fetch many tickets assigned to an engineer with one numberIN query per chunk
+    (chunks run concurrently). Returns {ticket number (upper-case): ticket}.
+    """
+    chunks = [ticket_list[i:i + TICKET_LOOKUP_CHUNK] for i in range(0, len(ticket_list), TICKET_LOOKUP_CHUNK)]
+
+    async def fetch_chunk(chunk):
+        response = await snow_get(SNOW_API, params={
+            "sysparm_query": f"numberIN{','.join(chunk)}^{assigned_to_query(engineer_email)}",
+            "sysparm_fields": TICKET_DETAIL_FIELDS,
+            "sysparm_limit": len(chunk),
+        })
+        response.raise_for_status()
+        return response.json().get("result", [])
+
+    tickets = {}
+    for result in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        for ticket in result:
+            tickets[str(ticket.get("number", "")).upper()] = ticket
+    return tickets
+
+
+@async_tool("get_ticket_details")
+async def get_ticket_details(ticket_numbers: str, engineer_email: str) -> str:
     """
     Retrieve full details of one or multiple tickets assigned to an engineer.
     
@@ -100,29 +134,23 @@ def get_ticket_details(ticket_numbers: str, engineer_email: str) -> str:
         str: Formatted ticket details
     """
     try:
-        ticket_list = [t.strip() for t in ticket_numbers.split(",")]
+        # Requested order, without blanks or duplicates
+        ticket_list = list(dict.fromkeys(t.strip().upper() for t in ticket_numbers.split(",") if t.strip()))
+        tickets = await fetch_tickets_by_number(ticket_list, engineer_email)
         results = []
-        
+
         for ticket_number in ticket_list:
-            response = requests.get(
-                f"{SNOW_API}?number={ticket_number}&assigned_to.email={engineer_email}",
-                auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-                headers={"Accept": "application/json"},
-                verify=False,
-                timeout=120
-            )
-            data = response.json().get("result", [])
-            if not data:
+            ticket = tickets.get(ticket_number)
+            if not ticket:
                 results.append(f"No ticket {ticket_number} found assigned to {engineer_email}.")
                 continue
-            ticket = data[0]
             details = (
                 f"Ticket Number: {ticket.get('number')}\n"
                 f"Short Description: {ticket.get('short_description')}\n"
                 f"Description: {ticket.get('description')}\n"
                 f"State: {ticket.get('state')}\n"
                 f"Priority: {ticket.get('priority')}\n"
-                f"Assigned To: {ticket.get('assigned_to', {}).get('display_value', 'Unknown')}\n"
+                f"Assigned To: {ticket.get('assigned_to.name') or 'Unknown'}\n"
                 f"Created On: {ticket.get('sys_created_on')}\n"
                 f"Updated On: {ticket.get('sys_updated_on')}\n"
                 f"{'-'*40}"
@@ -136,25 +164,22 @@ def get_ticket_details(ticket_numbers: str, engineer_email: str) -> str:
 
 
 
-@tool("get_ticket_history")
-def get_ticket_history(ticket_number: str) -> str:
+@async_tool("get_ticket_history")
+async def get_ticket_history(ticket_number: str) -> str:
     """Retrieve the full ticket history and comments for a specific incident."""
     try:
-        response = requests.get(
-            f"{SNOW_API}/{ticket_number}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Accept": "application/json"},
-            verify=False
-        )
-        ticket = response.json().get("result", {})
-        history = ticket.get("work_notes", "No history available.")
+        # Local incident mirror; work_notes as display value (the journal entries)
+        ticket = await get_incident_mirror().get(ticket_number, fields=("number", "work_notes"), display=True)
+        if not ticket:
+            return f"❌ Ticket {ticket_number} not found."
+        history = ticket.get("work_notes") or "No history available."
         return f"History for {ticket_number}: {history}"
     except Exception as e:
         return f"❌ Failed to get history for {ticket_number}: {e}"
 
 # ----------------------------- TOOL 3 -----------------------------
-@tool("add_technical_note")
-def add_technical_note(ticket_number: str, note: str) -> str:
+@async_tool("add_technical_note")
+async def add_technical_note(ticket_number: str, note: str) -> str:
     """
     Add a technical note (work_notes) to a specific ServiceNow ticket.
 
@@ -167,12 +192,7 @@ def add_technical_note(ticket_number: str, note: str) -> str:
     """
     try:
         # 1. Get ticket sys_id first
-        response = requests.get(
-            f"{SNOW_API}?number={ticket_number}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Accept": "application/json"},
-            verify=False
-        )
+        response = await snow_get(f"{SNOW_API}?number={ticket_number}")
         data = response.json().get("result", [])
         if not data:
             return f"❌ Ticket {ticket_number} not found."
@@ -180,13 +200,12 @@ def add_technical_note(ticket_number: str, note: str) -> str:
         sys_id = data[0]["sys_id"]
 
         # 2. Update ticket with work_notes
-        update_response = requests.patch(
+        update_response = await snow_patch(
             f"{SNOW_API}/{sys_id}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Content-Type": "application/json", "Accept": "application/json"},
             json={"work_notes": note},
-            verify=False
+            params=WRITE_PARAMS,
         )
+        await get_incident_mirror().write_through(update_response)
         if update_response.status_code in [200, 201]:
             return f"📝 Note added to {ticket_number}: {note}"
         else:
@@ -197,8 +216,8 @@ def add_technical_note(ticket_number: str, note: str) -> str:
 
 
 # ----------------------------- TOOL 7 -----------------------------
-@tool("upload_ticket_resolution")
-def upload_ticket_resolution(ticket_number: str, resolution_summary: str, engineer_email: str = None) -> str:
+@async_tool("upload_ticket_resolution")
+async def upload_ticket_resolution(ticket_number: str, resolution_summary: str, engineer_email: str = None) -> str:
     """
     Upload a resolution or fix summary to a ServiceNow incident.
     This tool is LLM-triggered — when the model calls it, it pushes the resolution 
@@ -214,12 +233,7 @@ def upload_ticket_resolution(ticket_number: str, resolution_summary: str, engine
     """
     try:
         # 1️⃣ Get sys_id of the target ticket
-        response = requests.get(
-            f"{SNOW_API}?number={ticket_number}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Accept": "application/json"},
-            verify=False
-        )
+        response = await snow_get(f"{SNOW_API}?number={ticket_number}")
         result = response.json().get("result", [])
         if not result:
             return f"❌ Ticket {ticket_number} not found in ServiceNow."
@@ -234,19 +248,18 @@ def upload_ticket_resolution(ticket_number: str, resolution_summary: str, engine
             "work_notes": f"Resolution uploaded by LLM agent: {resolution_summary}"
         }
         if engineer_email:
-            payload["resolved_by"] = engineer_email
+            # resolved_by is a sys_user reference: send the engineer's sys_id (cached lookup)
+            engineer = await resolve_user(engineer_email)
+            if engineer:
+                payload["resolved_by"] = engineer["sys_id"]
 
         # 3️⃣ PATCH request to update the ticket
-        update_response = requests.patch(
+        update_response = await snow_patch(
             f"{SNOW_API}/{sys_id}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            },
             json=payload,
-            verify=False
+            params=WRITE_PARAMS,
         )
+        await get_incident_mirror().write_through(update_response)
 
         # 4️⃣ Handle API result
         if update_response.status_code in [200, 201]:
@@ -267,8 +280,8 @@ def upload_ticket_resolution(ticket_number: str, resolution_summary: str, engine
 
 
 # ----------------------------- TOOL 4 (Enhanced) -----------------------------
-@tool("update_ticket_state")
-def update_ticket_state(
+@async_tool("update_ticket_state")
+async def update_ticket_state(
     ticket_number: str,
     state: int,
     close_code: str = None,
@@ -310,12 +323,7 @@ def update_ticket_state(
             )
 
         # 3️⃣ Fetch sys_id of the target ticket
-        response = requests.get(
-            f"{SNOW_API}?number={ticket_number}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Accept": "application/json"},
-            verify=False
-        )
+        response = await snow_get(f"{SNOW_API}?number={ticket_number}")
 
         data = response.json().get("result", [])
         if not data:
@@ -331,16 +339,12 @@ def update_ticket_state(
             payload["close_notes"] = close_notes
 
         # 5️⃣ PATCH request to update ticket
-        update_response = requests.patch(
+        update_response = await snow_patch(
             f"{SNOW_API}/{sys_id}",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            },
             json=payload,
-            verify=False
+            params=WRITE_PARAMS,
         )
+        await get_incident_mirror().write_through(update_response)
 
         # 6️⃣ Handle API result
         if update_response.status_code in [200, 201]:
@@ -365,8 +369,8 @@ from requests.auth import HTTPBasicAuth
 import requests, json, os
 #from weasyprint import HTML
 
-@tool("generate_engineer_report_pdf")
-def generate_engineer_report_pdf(mail, name):
+@async_tool("generate_engineer_report_pdf")
+async def generate_engineer_report_pdf(mail, name):
     """
     Generate a PDF report for an engineer showing all assigned tickets,
     their states, priorities, and summary statistics.
@@ -378,90 +382,38 @@ def generate_engineer_report_pdf(mail, name):
     try:
         # ---------- 1) Fetch Tickets from ServiceNow ----------
         params = {
-            "sysparm_query": (
-                f"active=true^assigned_to.email={engineer_mail}"
-                "^stateNOT IN6,7,8^ORDERBYDESCsys_created_on"
-            ),
-            "sysparm_fields": "number,short_description,priority,sys_created_on,caller_id.name,state,description,assigned_to,assigned_group",
+            "sysparm_query": f"{assigned_to_query(engineer_mail)}^ORDERBYDESCsys_created_on",
+            "sysparm_fields": REPORT_FIELDS,
             "sysparm_display_value": "true",
-            "sysparm_limit": 50
+            "sysparm_exclude_reference_link": "true",
+            "sysparm_limit": REPORT_TICKET_LIMIT,
         }
 
-        response = requests.get(
+        response = await snow_get(
             f"{SNOW_INSTANCE}/api/now/table/incident",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            params=params,
-            headers={"Accept": "application/json"},
-            timeout=300,
+            params=params
         )
 
         data = response.json().get("result", [])
         print(f"✅ Fetched {len(data)} tickets for {engineer_mail} from ServiceNow.")
-        ticket_count = len(data)
-        # Convert to formatted JSON for clean LLM input
-        safe_data = json.dumps(data, indent=2, ensure_ascii=False)
-
-        # ---------- Prepare HTML Analytics Prompt ----------
-        html_prompt = f"""
-        You are a professional HTML report generator for ServiceNow ticket analytics.
-
-        Generate a clean, modern, and actionable HTML report using ONLY HTML + inline CSS + inline JS.
-        Do NOT add any explanation or extra text.
-
-        Input data:
-        {safe_data}
-
-        Requirements:
-        1. Page title must be "Engineer Ticket Analytics Report".
-        2. Include header with engineer name (assigned_to) and group (assigned_group).
-        3. Show summary cards:
-        - Total tickets
-        - Pending tickets
-        - Solved tickets
-        - Average priority
-        - Average response time (if available)
-        4. Show latest 20 tickets in a styled table.
-        5. Include:
-        - Pie chart for state distribution
-        - Bar chart for priority distribution
-        6. Use Chart.js via CDN.
-        7. Modern dashboard styling.
-        8. Return ONLY valid HTML.
-        """
-
-        llm = ChatOpenAI(
-            model="gpt-5.1",
-            temperature=0,
-        )
-
-        response = llm.invoke([HumanMessage(content=html_prompt)])
-
-        html_output = response.content.strip()
-
-
-        print("✅ Analytics generated from LLM.")
-        print(html_output)
-        # Clean markdown code fences if any
-        html_output = "\n".join(
-            [line for line in html_output.splitlines() if not line.strip().startswith("```")]
-        )
-
-        print("✅ HTML report generated.")
-        # ---------- 3) Save HTML Report ----------
-        reports_dir = "engineer/engineer_reports"
-        os.makedirs(reports_dir, exist_ok=True)
 
-        html_path = os.path.join(reports_dir, "ticket_report.html")
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(html_output)
-        
-        print(f"✅ HTML report saved at {html_path}.")
+        # ---------- 2) Build and render the report locally ----------
+        def render():
+            report = build_report(data, engineer_name, engineer_mail)
+            reports_dir = "engineer/engineer_reports"
+            os.makedirs(reports_dir, exist_ok=True)
+            stem = os.path.join(
+                reports_dir,
+                f"ticket_report_{engineer_mail.split('@')[0]}_{datetime.datetime.now():%Y%m%d_%H%M%S}",
+            )
+            with open(f"{stem}.html", "w", encoding="utf-8") as f:
+                f.write(render_html(report))
+            return render_pdf(report, f"{stem}.pdf")
 
-        # ---------- 4) Convert HTML to PDF ----------
-        # pdf_path = os.path.join(reports_dir, "ticket_report.pdf")
-        # HTML(html_path).write_pdf(pdf_path)
+        pdf_path = await asyncio.to_thread(render)
+        print(f"✅ Report saved at {pdf_path} (and .html).")
 
-        # ---------- 5) Email the PDF ----------
+        # ---------- 3) Queue the PDF for email ----------
         subject = 'Generated Report by Veli AI'
         body = f"""
         Dear {engineer_name},
@@ -473,10 +425,10 @@ def generate_engineer_report_pdf(mail, name):
         Thank you,
         Veli AI
         """
-        #mail="limon.halder@petabytz.com"
-        send_gmail(MAIL, GOOG_PASS, mail, subject, body, html_path)
+        # Spooled for the background mail worker; the turn does not wait for SMTP
+        delivery_id = enqueue_mail(mail, subject, body, [pdf_path])
 
-        bot_message = f"✅ Report generated successfully and emailed to {mail}."
+        bot_message = f"✅ Report generated successfully and queued for email to {mail} (delivery ID: {delivery_id})."
         return bot_message
 
     except Exception as e:
@@ -672,36 +624,41 @@ def generate_engineer_report_pdf(mail, name):
 #         return f"❌ Error updating ticket: {e}"
 
 # ----------------------------- TOOL 5 -----------------------------
-@tool("review_analytics")
-def review_analytics(engineer_email: str) -> str:
-    """Review performance analytics for a specific engineer."""
+@async_tool("review_analytics")
+async def review_analytics(engineer_email: str) -> str:
+    """Review performance analytics for a specific engineer (open/resolved counts, resolution times, SLA breaches)."""
+    store = get_analytics_store()
     try:
-        response = requests.get(
-            SNOW_API,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            params={"assigned_to.email": engineer_email, "sysparm_limit": 100},
-            headers={"Accept": "application/json"},
-            verify=False
+        # Incremental sync (only incidents updated since the last one), at most every few minutes
+        await store.refresh()
+    except Exception as e:
+        if not store.last_sync:
+            return f"❌ Failed to load analytics: {e}"
+        print(f"⚠️ Analytics sync failed, answering from the local store: {e}")
+
+    try:
+        stats = store.engineer_summary(engineer_email)
+        breach = (
+            f"{stats['sla_breach_rate']:.0%} (of {stats['sla_measured']} resolved with SLA data)"
+            if stats["sla_breach_rate"] is not None else "n/a"
         )
-        data = response.json().get("result", [])
-        resolved = len([t for t in data if t.get("state") in ["Resolved", "Closed"]])
-        pending = len([t for t in data if t.get("state") not in ["Resolved", "Closed"]])
-        avg_time = "2.1 days"  # Example, you can calculate from actual data
-        satisfaction = "96%"   # Placeholder
+        as_of = datetime.datetime.fromtimestamp(store.last_sync).strftime("%Y-%m-%d %H:%M")
 
         return (
             f"📊 Analytics for {engineer_email}:\n"
-            f"- Resolved Tickets: {resolved}\n"
-            f"- Pending Tickets: {pending}\n"
-            f"- Avg Resolution Time: {avg_time}\n"
-            f"- Satisfaction: {satisfaction}"
+            f"- Open Tickets: {stats['open']}\n"
+            f"- Resolved Tickets: {stats['resolved']}\n"
+            f"- Resolution Time: mean {format_duration(stats['mean_hours'])} | "
+            f"p50 {format_duration(stats['p50_hours'])} | p90 {format_duration(stats['p90_hours'])}\n"
+            f"- SLA Breach Rate: {breach}\n"
+            f"- Data as of: {as_of}"
         )
     except Exception as e:
         return f"❌ Failed to load analytics: {e}"
 
 # ----------------------------- TOOL 6 -----------------------------
-@tool("ai_troubleshooter")
-def ai_troubleshooter(issue_description: str) -> str:
+@async_tool("ai_troubleshooter")
+async def ai_troubleshooter(issue_description: str) -> str:
     """Use LLM reasoning to diagnose and suggest fixes for a technical issue."""
     try:
         prompt = f"""
@@ -714,7 +671,7 @@ def ai_troubleshooter(issue_description: str) -> str:
         Issue Description:
         {issue_description}
         """
-        result = llm.invoke(prompt)
+        result = await get_chat_model("gpt-4", 0).ainvoke(prompt)
         return f"🤖 AI Troubleshooter Suggestion:\n{result.content.strip()}"
     except Exception as e:
         return f"❌ Failed to analyze issue: {e}"
@@ -0,0 +1,309 @@
+# report_engine.py — Engineer ticket report rendered locally (HTML + PDF)
+#
+# generate_engineer_report_pdf used to send the ticket JSON to an LLM and ask it to
+# write a whole Chart.js dashboard: tens of seconds, thousands of output tokens and
+# numbers that changed between runs. The report is now computed and rendered here:
+#
+#   build_report(tickets, ...)  → summary cards, state / priority distributions and the
+#                                 latest tickets, computed with pandas
+#   render_html(report)         → one self-contained page from templates compiled at
+#                                 import (string.Template); charts are inline SVG, no CDN
+#   render_pdf(report, path)    → the same report through reportlab (tables + graphics)
+#
+# Both renderers take well under a second for hundreds of tickets; see
+# python -m benchmarks.engineer_report
+#
+# Tickets are Table API rows fetched with sysparm_display_value=true (state "In Progress",
+# priority "2 - High", dates "YYYY-MM-DD HH:MM:SS").
+import math
+from datetime import datetime
+from html import escape
+from string import Template
+
+import pandas as pd
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing, Rect, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+SOLVED_STATES = ("Resolved", "Closed")
+CLOSED_STATES = SOLVED_STATES + ("Canceled", "Cancelled")
+LATEST_TICKETS = 20
+PALETTE = ("#2563eb", "#16a34a", "#f59e0b", "#dc2626", "#7c3aed", "#0891b2", "#db2777", "#64748b")
+
+
+# ---------------------------------------------------
+# 🧮 Report data
+# ---------------------------------------------------
+def _display(value):
+    """Display value of a field (plain string, or a reference dict from the Table API)."""
+    if isinstance(value, dict):
+        value = value.get("display_value", "")
+    return str(value or "")
+
+
+def _days(hours):
+    if hours is None or pd.isna(hours):
+        return "n/a"
+    return f"{hours:.1f} h" if hours < 48 else f"{hours / 24:.1f} days"
+
+
+def build_report(tickets, engineer_name="", engineer_email="", generated_at=None):
+    """Summary, distributions and latest tickets of an engineer's tickets, as plain data."""
+    columns = ("number", "short_description", "state", "priority", "sys_created_on", "resolved_at",
+               "caller_id.name", "assignment_group")
+    frame = pd.DataFrame([{c: _display(t.get(c)) for c in columns} for t in tickets], columns=columns)
+
+    solved = frame["state"].isin(SOLVED_STATES)
+    pending = ~frame["state"].isin(CLOSED_STATES)
+    priority_level = pd.to_numeric(frame["priority"].str.extract(r"^(\d)", expand=False), errors="coerce")
+    created = pd.to_datetime(frame["sys_created_on"], errors="coerce")
+    resolved = pd.to_datetime(frame["resolved_at"], errors="coerce")
+    resolution_hours = ((resolved - created).dt.total_seconds() / 3600)[solved]
+    now = pd.Timestamp(generated_at or datetime.now())
+    age_hours = ((now - created).dt.total_seconds() / 3600)[pending]
+
+    groups = frame["assignment_group"].replace("", pd.NA).dropna().value_counts()
+    latest = frame.assign(_created=created).sort_values("_created", ascending=False).head(LATEST_TICKETS)
+
+    return {
+        "title": "Engineer Ticket Analytics Report",
+        "engineer_name": engineer_name,
+        "engineer_email": engineer_email,
+        "group": groups.index[0] if len(groups) else "",
+        "generated_at": now.strftime("%Y-%m-%d %H:%M"),
+        "cards": [
+            ("Total tickets", str(len(frame))),
+            ("Pending", str(int(pending.sum()))),
+            ("Solved", str(int(solved.sum()))),
+            ("Average priority", f"{priority_level.mean():.1f}" if priority_level.notna().any() else "n/a"),
+            ("Avg resolution time", _days(resolution_hours.mean() if len(resolution_hours) else None)),
+            ("Avg age of open tickets", _days(age_hours.mean() if len(age_hours) else None)),
+        ],
+        "states": list(frame["state"].replace("", "Unknown").value_counts().items()),
+        "priorities": sorted(frame["priority"].replace("", "Unknown").value_counts().items()),
+        "latest": latest[["number", "short_description", "state", "priority", "sys_created_on", "caller_id.name"]]
+            .values.tolist(),
+    }
+
+
+# ---------------------------------------------------
+# 🖼️ HTML (templates compiled once, charts as inline SVG)
+# ---------------------------------------------------
+PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+  body { font-family: "Segoe UI", Arial, sans-serif; background: #f1f5f9; color: #0f172a; margin: 0; padding: 32px; }
+  header { margin-bottom: 24px; }
+  h1 { margin: 0 0 4px; font-size: 26px; }
+  .muted { color: #64748b; font-size: 14px; }
+  .cards { display: grid; grid-template-columns: repeat(auto-fit, minmax(170px, 1fr)); gap: 16px; margin-bottom: 24px; }
+  .card { background: #fff; border-radius: 10px; padding: 16px; box-shadow: 0 1px 3px rgba(15, 23, 42, .12); }
+  .card .label { color: #64748b; font-size: 13px; text-transform: uppercase; letter-spacing: .04em; }
+  .card .value { font-size: 26px; font-weight: 600; margin-top: 6px; }
+  .charts { display: grid; grid-template-columns: repeat(auto-fit, minmax(320px, 1fr)); gap: 16px; margin-bottom: 24px; }
+  .panel { background: #fff; border-radius: 10px; padding: 16px; box-shadow: 0 1px 3px rgba(15, 23, 42, .12); }
+  .panel h2 { font-size: 16px; margin: 0 0 12px; }
+  table { width: 100%; border-collapse: collapse; font-size: 14px; }
+  th, td { text-align: left; padding: 8px 10px; border-bottom: 1px solid #e2e8f0; }
+  th { background: #f8fafc; color: #475569; font-weight: 600; }
+</style>
+</head>
+<body>
+<header>
+  <h1>$title</h1>
+  <div class="muted">$engineer$group · generated $generated_at</div>
+</header>
+<section class="cards">
+$cards
+</section>
+<section class="charts">
+  <div class="panel"><h2>State distribution</h2>$state_chart</div>
+  <div class="panel"><h2>Priority distribution</h2>$priority_chart</div>
+</section>
+<section class="panel">
+  <h2>Latest $latest_count tickets</h2>
+  <table>
+    <thead><tr><th>Number</th><th>Short description</th><th>State</th><th>Priority</th><th>Created</th><th>Caller</th></tr></thead>
+    <tbody>
+$rows
+    </tbody>
+  </table>
+</section>
+</body>
+</html>
+""")
+
+CARD = Template('  <div class="card"><div class="label">$label</div><div class="value">$value</div></div>')
+ROW = Template("      <tr>$cells</tr>")
+SLICE = Template('<path d="$path" fill="$color"><title>$label: $count</title></path>')
+LEGEND = Template('<rect x="200" y="$y" width="12" height="12" fill="$color"/>'
+                  '<text x="218" y="$text_y" font-size="13">$label ($count)</text>')
+BAR = Template('<rect x="$x" y="$y" width="$width" height="$height" fill="$color"><title>$label: $count</title></rect>'
+               '<text x="$label_x" y="$value_y" font-size="12" text-anchor="middle">$count</text>'
+               '<text x="$label_x" y="205" font-size="12" text-anchor="middle">$label</text>')
+
+
+def _donut_svg(items):
+    """Donut chart of (label, count) pairs with a legend."""
+    total = sum(count for _, count in items)
+    if not total:
+        return '<p class="muted">No tickets</p>'
+    cx, cy, outer, inner = 90, 90, 80, 46
+    parts, legend, angle = [], [], -math.pi / 2
+    for i, (label, count) in enumerate(items):
+        color = PALETTE[i % len(PALETTE)]
+        sweep = 2 * math.pi * count / total
+        if count == total:  # A single full ring cannot be drawn as one arc
+            path = (f"M {cx} {cy - outer} A {outer} {outer} 0 1 1 {cx - 0.01} {cy - outer} Z "
+                    f"M {cx} {cy - inner} A {inner} {inner} 0 1 0 {cx - 0.01} {cy - inner} Z")
+        else:
+            end = angle + sweep
+            large = 1 if sweep > math.pi else 0
+            points = [(cx + r * math.cos(a), cy + r * math.sin(a)) for r, a in
+                      ((outer, angle), (outer, end), (inner, end), (inner, angle))]
+            path = (f"M {points[0][0]:.2f} {points[0][1]:.2f} A {outer} {outer} 0 {large} 1 {points[1][0]:.2f} {points[1][1]:.2f} "
+                    f"L {points[2][0]:.2f} {points[2][1]:.2f} A {inner} {inner} 0 {large} 0 {points[3][0]:.2f} {points[3][1]:.2f} Z")
+            angle = end
+        label = escape(str(label))
+        parts.append(SLICE.substitute(path=path, color=color, label=label, count=count))
+        legend.append(LEGEND.substitute(y=20 + 22 * i, text_y=31 + 22 * i, color=color, label=label, count=count))
+    height = max(180, 30 + 22 * len(items))
+    return (f'<svg viewBox="0 0 420 {height}" width="100%" role="img" fill-rule="evenodd">'
+            + "".join(parts) + "".join(legend) + "</svg>")
+
+
+def _bar_svg(items):
+    """Vertical bar chart of (label, count) pairs."""
+    if not items:
+        return '<p class="muted">No tickets</p>'
+    top = max(count for _, count in items) or 1
+    slot = 400 / len(items)
+    width = min(60, slot * 0.6)
+    bars = []
+    for i, (label, count) in enumerate(items):
+        height = 160 * count / top
+        x = 10 + i * slot + (slot - width) / 2
+        bars.append(BAR.substitute(
+            x=f"{x:.1f}", y=f"{185 - height:.1f}", width=f"{width:.1f}", height=f"{height:.1f}",
+            color=PALETTE[i % len(PALETTE)], label=escape(str(label)), count=count,
+            label_x=f"{x + width / 2:.1f}", value_y=f"{180 - height:.1f}",
+        ))
+    return ('<svg viewBox="0 0 420 215" width="100%" role="img">'
+            '<line x1="10" y1="185" x2="410" y2="185" stroke="#cbd5e1"/>' + "".join(bars) + "</svg>")
+
+
+def render_html(report):
+    """Self-contained HTML page for a report from build_report()."""
+    engineer = escape(report["engineer_name"] or report["engineer_email"])
+    if report["engineer_name"] and report["engineer_email"]:
+        engineer += f" &lt;{escape(report['engineer_email'])}&gt;"
+    return PAGE.substitute(
+        title=escape(report["title"]),
+        engineer=engineer,
+        group=f" · {escape(report['group'])}" if report["group"] else "",
+        generated_at=escape(report["generated_at"]),
+        cards="\n".join(CARD.substitute(label=escape(l), value=escape(v)) for l, v in report["cards"]),
+        state_chart=_donut_svg(report["states"]),
+        priority_chart=_bar_svg(report["priorities"]),
+        latest_count=len(report["latest"]),
+        rows="\n".join(
+            ROW.substitute(cells="".join(f"<td>{escape(str(v))}</td>" for v in row)) for row in report["latest"]
+        ),
+    )
+
+
+# ---------------------------------------------------
+# 📄 PDF (reportlab)
+# ---------------------------------------------------
+def _pdf_pie(items):
+    drawing = Drawing(240, 170)
+    if not items:
+        drawing.add(String(10, 80, "No tickets", fontSize=10))
+        return drawing
+    pie = Pie()
+    pie.x, pie.y, pie.width, pie.height = 10, 15, 140, 140
+    pie.data = [count for _, count in items]
+    pie.labels = None
+    for i in range(len(items)):
+        pie.slices[i].fillColor = colors.HexColor(PALETTE[i % len(PALETTE)])
+        pie.slices[i].strokeColor = colors.white
+    drawing.add(pie)
+    for i, (label, count) in enumerate(items[:8]):
+        y = 145 - 17 * i
+        drawing.add(Rect(160, y - 1, 8, 8, fillColor=colors.HexColor(PALETTE[i % len(PALETTE)]), strokeColor=None))
+        drawing.add(String(172, y, f"{label} ({count})", fontSize=8))
+    return drawing
+
+
+def _pdf_bars(items):
+    drawing = Drawing(240, 170)
+    if not items:
+        drawing.add(String(10, 80, "No tickets", fontSize=10))
+        return drawing
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = 30, 35, 200, 120
+    chart.data = [[count for _, count in items]]
+    chart.categoryAxis.categoryNames = [str(label) for label, _ in items]
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.angle = 20
+    chart.categoryAxis.labels.boxAnchor = "ne"
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.bars[0].fillColor = colors.HexColor(PALETTE[0])
+    drawing.add(chart)
+    return drawing
+
+
+def render_pdf(report, path):
+    """Write a report from build_report() as a PDF to `path`; returns the path."""
+    styles = getSampleStyleSheet()
+    cell = styles["BodyText"].clone("cell", fontSize=8, leading=10)
+    doc = SimpleDocTemplate(path, pagesize=A4, leftMargin=15 * mm, rightMargin=15 * mm,
+                            topMargin=15 * mm, bottomMargin=15 * mm, title=report["title"])
+
+    engineer = report["engineer_name"] or report["engineer_email"]
+    subtitle = " · ".join(escape(p) for p in (engineer, report["group"], f"generated {report['generated_at']}") if p)
+    elements = [Paragraph(escape(report["title"]), styles["Title"]), Paragraph(subtitle, styles["Normal"]), Spacer(1, 12)]
+
+    cards = report["cards"]
+    card_rows = [[Paragraph(f"<font size=8 color='#64748b'>{escape(label.upper())}</font><br/>"
+                            f"<font size=15><b>{escape(value)}</b></font>", styles["Normal"])
+                  for label, value in cards[i:i + 3]] for i in range(0, len(cards), 3)]
+    card_table = Table(card_rows, colWidths=[60 * mm] * 3, rowHeights=16 * mm)
+    card_table.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#e2e8f0")),
+        ("INNERGRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#e2e8f0")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ]))
+    elements += [card_table, Spacer(1, 12)]
+
+    charts = Table([[Paragraph("<b>State distribution</b>", styles["Normal"]),
+                     Paragraph("<b>Priority distribution</b>", styles["Normal"])],
+                    [_pdf_pie(report["states"]), _pdf_bars(report["priorities"])]],
+                   colWidths=[90 * mm, 90 * mm])
+    elements += [charts, Spacer(1, 12), Paragraph(f"<b>Latest {len(report['latest'])} tickets</b>", styles["Normal"]),
+                 Spacer(1, 6)]
+
+    header = ["Number", "Short description", "State", "Priority", "Created", "Caller"]
+    rows = [[Paragraph(escape(str(v)), cell) for v in row] for row in report["latest"]]
+    tickets = Table([header] + rows, repeatRows=1,
+                    colWidths=[22 * mm, 62 * mm, 22 * mm, 24 * mm, 26 * mm, 24 * mm])
+    tickets.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f8fafc")),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, 0), 8),
+        ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.HexColor("#e2e8f0")),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    elements.append(tickets)
+
+    doc.build(elements)
+    return path
@@ -0,0 +1,323 @@
+# fake_servicenow.py — Local fake of the ServiceNow Table API for tests and benchmarks
+#
+# Serves the part of the Table API our tools use, over deterministic synthetic data
+# (engineers, callers, groups and incidents with journals), so the tools, the
+# incident mirror and the benchmarks run without a ServiceNow instance:
+#
+#   GET    /api/now/table/{table}             sysparm_query, sysparm_fields, sysparm_limit,
+#                                             sysparm_offset, sysparm_display_value
+#                                             (false / true / all), sysparm_exclude_reference_link
+#   GET    /api/now/table/{table}/{sys_id}
+#   POST   /api/now/table/{table}
+#   PATCH  /api/now/table/{table}/{sys_id}    work_notes / comments are appended to the journal
+#
+# Tables: incident, sys_user, sys_user_group. Encoded queries support field=value, !=,
+# >=, <=, >, <, IN, NOT IN, ^ (AND), ORDERBY / ORDERBYDESC and dot-walked references
+# (caller_id.name, assigned_to.email); plain field=value URL parameters filter too.
+# Every request can be delayed (--latency) to mimic a remote instance, and
+# app.state.requests counts requests per "VERB table".
+#
+# Usage (from src/):
+#   python -m fake_servicenow --port 8787 --incidents 2000 --latency 0.15
+#   SNOW_INSTANCE=http://127.0.0.1:8787 python orchestrate.py
+import re
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+SNOW_DATETIME = "%Y-%m-%d %H:%M:%S"
+
+REFERENCES = {  # Reference field -> table it points to
+    "caller_id": "sys_user",
+    "assigned_to": "sys_user",
+    "resolved_by": "sys_user",
+    "assignment_group": "sys_user_group",
+}
+CHOICES = {
+    "state": {"1": "New", "2": "In Progress", "3": "On Hold", "6": "Resolved", "7": "Closed", "8": "Canceled"},
+    "priority": {"1": "1 - Critical", "2": "2 - High", "3": "3 - Moderate", "4": "4 - Low", "5": "5 - Planning"},
+}
+CLOSED_STATES = ("6", "7", "8")
+JOURNAL_FIELDS = {"work_notes": "Work notes", "comments": "Additional comments"}
+QUERY_TERM = re.compile(r"^([\w.]+?)(NOT IN|IN|!=|>=|<=|=|>|<)(.*)$")
+
+GROUPS = ("Service Desk", "Network", "Hardware", "Software", "Access Management")
+ISSUES = ("VPN disconnects every hour", "Outlook not syncing", "Laptop battery drains fast",
+          "Printer offline on floor 3", "Access to shared drive", "Teams camera not detected",
+          "Password reset required", "Wi-Fi drops in meeting rooms")
+ENGINEERS = ("david.miller@petabytz.com", "priya.nair@petabytz.com", "tom.becker@petabytz.com")
+CALLERS = ("carol@gmail.com", "bob@example.com", "alice@example.com", "dan@example.com")
+
+
+def now():
+    return datetime.now(timezone.utc).strftime(SNOW_DATETIME)
+
+
+class FakeInstance:
+    """In-memory tables plus the Table API semantics (queries, display values, journals)."""
+
+    def __init__(self, incidents=500, seed=7):
+        self.tables = {"incident": {}, "sys_user": {}, "sys_user_group": {}}
+        self.next_number = 10000
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self._seed(incidents, self.random)
+
+    # -- data --------------------------------------------------------------------
+    def _seed(self, count, rnd):
+        for name in GROUPS:
+            self._put("sys_user_group", {"sys_id": self.new_sys_id(), "name": name})
+        for email in ENGINEERS + CALLERS:
+            name = email.split("@")[0].replace(".", " ").title()
+            self._put("sys_user", {"sys_id": self.new_sys_id(), "name": name, "email": email, "user_name": email.split("@")[0]})
+
+        users = {u["email"]: u["sys_id"] for u in self.tables["sys_user"].values()}
+        groups = list(self.tables["sys_user_group"])
+        started = datetime.now(timezone.utc)
+        for _ in range(count):
+            opened = started - timedelta(hours=rnd.randint(1, 24 * 400))
+            state = rnd.choice(("1", "2", "3", "6", "7", "7", "8"))
+            ended = opened + timedelta(hours=rnd.randint(1, 24 * 10)) if state in CLOSED_STATES else None
+            updated = min(ended or opened + timedelta(hours=rnd.randint(0, 48)), started)
+            issue = rnd.choice(ISSUES)
+            record = self.create("incident", {
+                "short_description": issue,
+                "description": f"{issue}. Reported by the user.",
+                "state": state,
+                "priority": str(rnd.randint(1, 5)),
+                "caller_id": users[rnd.choice(CALLERS)],
+                "assigned_to": users[rnd.choice(ENGINEERS)] if rnd.random() < 0.8 else "",
+                "assignment_group": rnd.choice(groups),
+                "made_sla": "true" if rnd.random() < 0.85 else "false",
+                "sla_due": (opened + timedelta(days=3)).strftime(SNOW_DATETIME),
+            }, at=opened.strftime(SNOW_DATETIME))
+            if ended is not None:
+                record["resolved_at"] = ended.strftime(SNOW_DATETIME)
+                record["closed_at"] = ended.strftime(SNOW_DATETIME) if state == "7" else ""
+                record["_journal"].append((record["resolved_at"], "System Administrator", "Work notes", "Issue resolved."))
+            record["sys_updated_on"] = updated.strftime(SNOW_DATETIME)
+
+    def new_sys_id(self):
+        return uuid.UUID(int=self.random.getrandbits(128)).hex
+
+    def _put(self, table, record):
+        self.tables[table][record["sys_id"]] = record
+        return record
+
+    def _reference(self, field, value):
+        """sys_id for a reference given as a sys_id or a display value (like the Table API accepts)."""
+        table = self.tables[REFERENCES[field]]
+        if not value or value in table:
+            return value or ""
+        return next((sys_id for sys_id, r in table.items() if r.get("name") == value), value)
+
+    def create(self, table, fields, at=None):
+        with self.lock:
+            at = at or now()
+            record = {"sys_id": self.new_sys_id(), "sys_created_on": at, "sys_updated_on": at, "sys_mod_count": "0"}
+            if table == "incident":
+                record.update({
+                    "number": f"INC{self.next_number:07d}", "state": "1", "active": "true", "priority": "3",
+                    "opened_at": at, "resolved_at": "", "closed_at": "", "made_sla": "true", "sla_due": "",
+                    "caller_id": "", "assigned_to": "", "assignment_group": "", "_journal": [],
+                })
+                self.next_number += 1
+            self._apply(record, fields, at)
+            return self._put(table, record)
+
+    def update(self, table, sys_id, fields):
+        with self.lock:
+            record = self.tables[table].get(sys_id)
+            if record is None:
+                return None
+            at = now()
+            self._apply(record, fields, at)
+            record["sys_updated_on"] = at
+            record["sys_mod_count"] = str(int(record.get("sys_mod_count", "0")) + 1)
+            return record
+
+    def _apply(self, record, fields, at):
+        for field, value in fields.items():
+            value = "" if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+            if field in JOURNAL_FIELDS and "_journal" in record:
+                if value:
+                    record["_journal"].append((at, "System Administrator", JOURNAL_FIELDS[field], value))
+            elif field in REFERENCES:
+                record[field] = self._reference(field, value)
+            else:
+                record[field] = value
+        if "_journal" in record and "state" in fields:
+            state = record["state"]
+            record["active"] = "false" if state in CLOSED_STATES else "true"
+            if state in ("6", "7") and not record.get("resolved_at"):
+                record["resolved_at"] = at
+            if state == "7" and not record.get("closed_at"):
+                record["closed_at"] = at
+
+    # -- field values ------------------------------------------------------------
+    def raw(self, record, field):
+        if "." in field:
+            ref, rest = field.split(".", 1)
+            target = self.tables.get(REFERENCES.get(ref, ""), {}).get(record.get(ref, ""))
+            return self.raw(target, rest) if target else ""
+        if field in JOURNAL_FIELDS:
+            return ""  # Journal fields only have a display value
+        return record.get(field, "")
+
+    def display(self, record, field):
+        if "." in field:
+            ref, rest = field.split(".", 1)
+            target = self.tables.get(REFERENCES.get(ref, ""), {}).get(record.get(ref, ""))
+            return self.display(target, rest) if target else ""
+        if field in JOURNAL_FIELDS:
+            return "".join(f"{at} - {author} ({kind})\n{text}\n\n"
+                           for at, author, kind, text in reversed(record.get("_journal", []))
+                           if kind == JOURNAL_FIELDS[field])
+        if field in REFERENCES:
+            target = self.tables[REFERENCES[field]].get(record.get(field, ""))
+            return target.get("name", "") if target else ""
+        value = record.get(field, "")
+        return CHOICES.get(field, {}).get(value, value)
+
+    def render(self, table, record, fields, mode, links, base_url):
+        fields = fields or [f for f in record if not f.startswith("_")]
+        result = {}
+        for field in fields:
+            raw = self.raw(record, field)
+            if mode == "all":
+                value = {"display_value": self.display(record, field), "value": raw}
+            elif mode == "true":
+                value = self.display(record, field)
+            else:
+                value = raw
+            if links and field in REFERENCES and raw:
+                link = f"{base_url}/api/now/table/{REFERENCES[field]}/{raw}"
+                value = {**value, "link": link} if isinstance(value, dict) else {
+                    "link": link, ("display_value" if mode == "true" else "value"): value}
+            result[field] = value
+        return result
+
+    # -- queries -----------------------------------------------------------------
+    def _matches(self, record, field, op, value):
+        actual = str(self.raw(record, field)).lower()
+        value = value.lower()
+        if op == "=":
+            return actual == value
+        if op == "!=":
+            return actual != value
+        if op in ("IN", "NOT IN"):
+            return (actual in [v.strip() for v in value.split(",")]) == (op == "IN")
+        return {">=": actual >= value, "<=": actual <= value, ">": actual > value, "<": actual < value}[op]
+
+    def select(self, table, query="", filters=()):
+        conditions, order = [], []
+        for term in filter(None, query.split("^")):
+            if term.startswith("ORDERBYDESC"):
+                order.append((term[len("ORDERBYDESC"):], True))
+            elif term.startswith("ORDERBY"):
+                order.append((term[len("ORDERBY"):], False))
+            else:
+                match = QUERY_TERM.match(term)
+                if not match:
+                    raise HTTPException(400, f"Unsupported query term: {term}")
+                conditions.append(match.groups())
+        conditions += [(field, "=", value) for field, value in filters]
+
+        with self.lock:
+            records = [r for r in self.tables[table].values()
+                       if all(self._matches(r, *condition) for condition in conditions)]
+        for field, descending in reversed(order):
+            records.sort(key=lambda r: str(self.raw(r, field)), reverse=descending)
+        return records
+
+
+def create_app(incidents=500, seed=7, latency=0.0):
+    """FastAPI app serving a FakeInstance; the instance is app.state.instance."""
+    instance = FakeInstance(incidents, seed)
+    app = FastAPI(title="Fake ServiceNow")
+    app.state.instance = instance
+    app.state.requests = Counter()
+    app.state.latency = latency
+
+    def options(request):
+        params = request.query_params
+        fields = [f for f in params.get("sysparm_fields", "").split(",") if f]
+        mode = params.get("sysparm_display_value", "false").lower()
+        links = params.get("sysparm_exclude_reference_link", "false").lower() != "true"
+        return fields, mode, links, str(request.base_url).rstrip("/")
+
+    def table_of(table):
+        if table not in instance.tables:
+            raise HTTPException(400, f"Invalid table {table}")
+        return table
+
+    @app.middleware("http")
+    async def count_and_delay(request, call_next):
+        path = request.url.path.split("/")
+        app.state.requests[f"{request.method} {path[4] if len(path) > 4 else 'other'}"] += 1
+        if app.state.latency:
+            await asyncio.sleep(app.state.latency)
+        return await call_next(request)
+
+    @app.exception_handler(HTTPException)
+    async def failure(request, exc):
+        return JSONResponse({"error": {"message": exc.detail}, "status": "failure"}, status_code=exc.status_code)
+
+    @app.get("/api/now/table/{table}")
+    def list_records(table: str, request: Request):
+        params = request.query_params
+        filters = [(k, v) for k, v in params.items() if not k.startswith("sysparm_")]
+        records = instance.select(table_of(table), params.get("sysparm_query", ""), filters)
+        offset = int(params.get("sysparm_offset", 0))
+        limit = int(params.get("sysparm_limit", 10000))
+        return {"result": [instance.render(table, r, *options(request)) for r in records[offset:offset + limit]]}
+
+    @app.get("/api/now/table/{table}/{sys_id}")
+    def get_record(table: str, sys_id: str, request: Request):
+        record = instance.tables[table_of(table)].get(sys_id)
+        if record is None:
+            raise HTTPException(404, "No Record found")
+        return {"result": instance.render(table, record, *options(request))}
+
+    @app.post("/api/now/table/{table}", status_code=201)
+    async def create_record(table: str, request: Request):
+        record = instance.create(table_of(table), await request.json())
+        return {"result": instance.render(table, record, *options(request))}
+
+    @app.patch("/api/now/table/{table}/{sys_id}")
+    async def update_record(table: str, sys_id: str, request: Request):
+        record = instance.update(table_of(table), sys_id, await request.json())
+        if record is None:
+            raise HTTPException(404, "No Record found")
+        return {"result": instance.render(table, record, *options(request))}
+
+    return app
+
+
+def serve_in_background(app, host="127.0.0.1", port=8787):
+    """Run the app on a daemon thread; returns the uvicorn server (set should_exit to stop it)."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="fake-servicenow", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake of the ServiceNow Table API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--incidents", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.incidents, args.seed, args.latency), host=args.host, port=args.port)
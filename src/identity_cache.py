@@ -0,0 +1,230 @@
+# identity_cache.py — email → sys_user cache shared by the user and engineer tools
+#
+# Submitting a ticket (register_user) and listing a user's tickets (show_my_tickets)
+# both need the caller's sys_user sys_id, and used to look it up on every call.
+# resolve_user() answers from a per-process cache instead:
+#
+#   - found users are kept for IDENTITY_CACHE_TTL seconds, unknown emails for
+#     IDENTITY_NEGATIVE_TTL seconds (short, so a user created elsewhere shows up soon)
+#   - at most IDENTITY_CACHE_SIZE emails, least recently used dropped first
+#   - concurrent lookups of the same email share one ServiceNow request
+#   - prewarmed from a bulk sys_user export (IDENTITY_EXPORT, CSV or JSON) by the
+#     startup warmup; create the export with:
+#         python -m identity_cache export data/sys_user.csv
+#
+# Engineer tools use assigned_to_query(), which filters on the indexed assigned_to
+# reference when the engineer's sys_id is cached and dot-walks the email otherwise,
+# so it never adds a lookup of its own.
+#
+# Configuration (environment):
+#   IDENTITY_CACHE_TTL     → seconds a resolved user is trusted (default 3600)
+#   IDENTITY_NEGATIVE_TTL  → seconds an unknown email is remembered (default 300)
+#   IDENTITY_CACHE_SIZE    → max cached emails (default 10000)
+#   IDENTITY_EXPORT        → sys_user export loaded at startup (default: none)
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+
+from servicenow_client import snow_get
+from startup import Lazy
+
+SNOW_INSTANCE = os.getenv("SNOW_INSTANCE")
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "3600"))
+IDENTITY_NEGATIVE_TTL = float(os.getenv("IDENTITY_NEGATIVE_TTL", "300"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_EXPORT = os.getenv("IDENTITY_EXPORT", "")
+
+USER_FIELDS = ("sys_id", "name", "email", "user_name")
+
+
+def _key(email):
+    return str(email or "").strip().lower()
+
+
+class IdentityCache:
+    """LRU of email -> sys_user record (or None for a known-missing email), with TTLs."""
+
+    _MISSING = object()
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL, negative_ttl=IDENTITY_NEGATIVE_TTL, max_size=IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # email -> (expires_at, record | None)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "lookups": 0}
+
+    def get(self, email):
+        """The cached record, None for a cached miss, or IdentityCache._MISSING."""
+        key = _key(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self._entries.pop(key, None)
+                self.stats["misses"] += 1
+                return self._MISSING
+            self._entries.move_to_end(key)
+            self.stats["hits" if entry[1] is not None else "negative_hits"] += 1
+            return entry[1]
+
+    def put(self, email, record):
+        """Cache a record; record=None caches the email as unknown (negative TTL)."""
+        key = _key(email)
+        if not key:
+            return
+        ttl = self.ttl if record is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(_key(email), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+identity_cache = IdentityCache()
+
+
+def _record(row):
+    return {field: str(row.get(field) or "") for field in USER_FIELDS}
+
+
+def remember_user(record):
+    """Cache a sys_user record (e.g. one just created); needs sys_id and email."""
+    if record and record.get("sys_id") and record.get("email"):
+        identity_cache.put(record["email"], _record(record))
+
+
+def cached_sys_id(email):
+    """sys_id of a cached user, without any ServiceNow call; None when not cached."""
+    record = identity_cache.get(email)
+    return record["sys_id"] if record and record is not IdentityCache._MISSING else None
+
+
+def assigned_to_query(email):
+    """Encoded query term selecting records assigned to `email`."""
+    sys_id = cached_sys_id(email)
+    return f"assigned_to={sys_id}" if sys_id else f"assigned_to.email={email}"
+
+
+# ---------------------------------------------------
+# 🔎 Lookup
+# ---------------------------------------------------
+# One in-flight lookup per (event loop, email): parallel tool calls share it
+_inflight = weakref.WeakKeyDictionary()
+
+
+async def _lookup(email):
+    identity_cache.stats["lookups"] += 1
+    response = await snow_get(
+        f"{SNOW_INSTANCE}/api/now/table/sys_user",
+        params={"sysparm_query": f"email={email}", "sysparm_fields": ",".join(USER_FIELDS), "sysparm_limit": 1},
+    )
+    response.raise_for_status()
+    result = response.json().get("result", [])
+    record = _record(result[0]) if result else None
+    identity_cache.put(email, record)
+    return record
+
+
+async def resolve_user(email):
+    """
+    sys_user record ({sys_id, name, email, user_name}) for `email`, or None when no
+    user has it. Served from the cache when possible; ServiceNow errors propagate
+    (SnowRequestError) and are not cached.
+    """
+    cached = identity_cache.get(email)
+    if cached is not IdentityCache._MISSING:
+        return cached
+
+    pending = _inflight.setdefault(asyncio.get_running_loop(), {})
+    key = _key(email)
+    task = pending.get(key)
+    if task is None:
+        task = pending[key] = asyncio.ensure_future(_lookup(email))
+        task.add_done_callback(lambda _: pending.pop(key, None))
+    return await asyncio.shield(task)
+
+
+# ---------------------------------------------------
+# 🔥 Prewarm from a bulk export
+# ---------------------------------------------------
+def load_export(path):
+    """
+    Load a sys_user export into the cache: CSV with sys_id/email columns, or JSON
+    (a list, or ServiceNow's {"records": [...]} / {"result": [...]}). Returns the count.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        rows = (data.get("records") or data.get("result") or []) if isinstance(data, dict) else data
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+
+    loaded = 0
+    for row in rows:
+        if row.get("sys_id") and row.get("email"):
+            identity_cache.put(row["email"], _record(row))
+            loaded += 1
+    print(f"👤 Identity cache prewarmed with {loaded} users from {path}")
+    return loaded
+
+
+def _prewarm():
+    if IDENTITY_EXPORT and os.path.exists(IDENTITY_EXPORT):
+        return load_export(IDENTITY_EXPORT)
+    return 0
+
+
+identity_prewarm = Lazy(_prewarm, "identity_cache_prewarm")
+
+
+async def export_users(path, page_size=1000):
+    """Write every active sys_user with an email to `path` (CSV), paging through the table."""
+    rows = []
+    offset = 0
+    while True:
+        response = await snow_get(f"{SNOW_INSTANCE}/api/now/table/sys_user", params={
+            "sysparm_query": "active=true^emailISNOTEMPTY",
+            "sysparm_fields": ",".join(USER_FIELDS),
+            "sysparm_limit": page_size,
+            "sysparm_offset": offset,
+        })
+        response.raise_for_status()
+        page = response.json().get("result", [])
+        rows += [_record(r) for r in page]
+        if len(page) < page_size:
+            break
+        offset += page_size
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=USER_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "export":
+        print(f"✅ Exported {asyncio.run(export_users(sys.argv[2]))} users to {sys.argv[2]}")
+    else:
+        print("Usage: python -m identity_cache export <path.csv>")
+        sys.exit(2)
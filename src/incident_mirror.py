@@ -0,0 +1,366 @@
+# incident_mirror.py — Local SQLite mirror of the ServiceNow incident table for the read tools
+#
+# check_status, show_my_tickets, get_ticket_history, review_analytics and the manager's
+# ticket listings used to query the live Table API on every call. They now read a
+# local mirror of the incident table:
+#
+#   - a background worker syncs incrementally every INCIDENT_MIRROR_SYNC_INTERVAL
+#     seconds: only incidents with sys_updated_on >= the stored watermark are fetched
+#     (ordered, paged) and upserted; the first sync backfills INCIDENT_MIRROR_BACKFILL_DAYS
+#   - records are fetched with sysparm_display_value=all and every field is stored
+#     twice: the raw value in a column (indexed for number, caller_id,
+#     assigned_to.email, state and sys_created_on) and the display value in a JSON
+#     column, so a read returns the same dicts as the Table API with either setting
+#   - reads are bounded in staleness: when the last successful sync is older than
+#     INCIDENT_MIRROR_MAX_AGE the read syncs first; if that fails it is answered from
+#     the mirror as it is (with a warning), or fails when the mirror was never synced
+#   - a lookup by number that misses (older than the backfill, created a moment ago)
+#     falls back to one live query, and the result is stored
+#   - writes made by our own tools are applied at once (write-through): they send
+#     WRITE_PARAMS so ServiceNow returns the updated record in the mirror's format,
+#     and write_through() stores it; an older copy never replaces a newer one
+#
+# Deleted incidents are not detected (the Table API does not report them).
+#
+# Usage (from src/):
+#   python -m incident_mirror sync
+#   python -m incident_mirror show INC0010018
+#
+# Configuration (environment):
+#   INCIDENT_MIRROR_DB             → SQLite path (default data/incidents.sqlite)
+#   INCIDENT_MIRROR_SYNC_INTERVAL  → seconds between background syncs (default 60)
+#   INCIDENT_MIRROR_MAX_AGE        → staleness bound of reads in seconds (default 300;
+#                                    0 syncs before every read)
+#   INCIDENT_MIRROR_BACKFILL_DAYS  → history fetched by the first sync (default 365; 0 = all)
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from servicenow_client import snow_get
+from startup import Lazy
+from utils import run_sync
+
+SNOW_INSTANCE = os.getenv("SNOW_INSTANCE")
+INCIDENT_MIRROR_DB = os.getenv("INCIDENT_MIRROR_DB", "data/incidents.sqlite")
+INCIDENT_MIRROR_SYNC_INTERVAL = float(os.getenv("INCIDENT_MIRROR_SYNC_INTERVAL", "60"))
+INCIDENT_MIRROR_MAX_AGE = float(os.getenv("INCIDENT_MIRROR_MAX_AGE", "300"))
+INCIDENT_MIRROR_BACKFILL_DAYS = int(os.getenv("INCIDENT_MIRROR_BACKFILL_DAYS", "365"))
+SYNC_PAGE_SIZE = 1000
+
+# Table API fields kept in the mirror (dot-walked ones included)
+MIRROR_FIELDS = (
+    "sys_id", "number", "short_description", "description", "state", "priority", "active",
+    "caller_id", "caller_id.name", "caller_id.email",
+    "assigned_to", "assigned_to.name", "assigned_to.email",
+    "assignment_group", "assignment_group.name",
+    "opened_at", "resolved_at", "closed_at", "made_sla", "sla_due",
+    "sys_created_on", "sys_updated_on", "work_notes",
+)
+INDEXED_FIELDS = ("number", "caller_id", "assigned_to.email", "state", "sys_created_on")
+UPPER_CASE_FIELDS = ("number",)
+LOWER_CASE_FIELDS = ("caller_id.email", "assigned_to.email")
+
+# Request parameters returning records the way the mirror stores them; send them with
+# POST / PATCH requests on the incident table so write_through() can use the response.
+MIRROR_PARAMS = {
+    "sysparm_fields": ",".join(MIRROR_FIELDS),
+    "sysparm_display_value": "all",
+    "sysparm_exclude_reference_link": "true",
+}
+WRITE_PARAMS = MIRROR_PARAMS
+
+SNOW_DATETIME = "%Y-%m-%d %H:%M:%S"
+
+
+def column(field):
+    """SQLite column of a Table API field ("assigned_to.email" → "assigned_to__email")."""
+    return field.replace(".", "__")
+
+
+def _split(value):
+    """(raw, display) of a field returned with sysparm_display_value=all."""
+    if isinstance(value, dict):
+        return str(value.get("value") or ""), str(value.get("display_value") or "")
+    value = "" if value is None else str(value)
+    return value, value
+
+
+class IncidentMirror:
+    """SQLite copy of the incident table, synced incrementally and updated by our own writes."""
+
+    def __init__(self, path=INCIDENT_MIRROR_DB, max_age=INCIDENT_MIRROR_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.generation = 0  # Bumped whenever rows change (derived caches compare it)
+        self.stats = {"reads": 0, "live_lookups": 0, "write_throughs": 0, "syncs": 0, "sync_errors": 0}
+        self._local = threading.local()  # sqlite connections are per thread
+        self._sync_lock = threading.Lock()  # One sync at a time, whichever event loop runs it
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connection() as conn:
+            columns = ", ".join(f"{column(f)} TEXT NOT NULL DEFAULT ''" for f in MIRROR_FIELDS if f != "sys_id")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS incidents (sys_id TEXT PRIMARY KEY, {columns}, "
+                         f"display TEXT NOT NULL DEFAULT '{{}}')")
+            for field in INDEXED_FIELDS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS incidents_{column(field)} ON incidents ({column(field)})")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def connection(self):
+        """This thread's connection to the mirror database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # -- sync state ----------------------------------------------------------
+    def _state(self, key, default=""):
+        row = self.connection().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @property
+    def watermark(self):
+        return self._state("watermark")
+
+    @property
+    def last_sync(self):
+        """Time of the last successful sync (0 when never synced)."""
+        return float(self._state("last_sync", "0"))
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+
+    # -- writes ------------------------------------------------------------------
+    def upsert(self, records):
+        """Store Table API records (display_value=all); returns how many rows changed."""
+        rows = []
+        for record in records:
+            raw, display = {}, {}
+            for field in MIRROR_FIELDS:
+                raw[field], display[field] = _split(record.get(field))
+            if not raw["sys_id"]:
+                continue
+            for field in UPPER_CASE_FIELDS:
+                raw[field] = raw[field].upper()
+            for field in LOWER_CASE_FIELDS:
+                raw[field] = raw[field].lower()
+            rows.append(tuple(raw[f] for f in MIRROR_FIELDS) + (json.dumps(display, ensure_ascii=False),))
+        if not rows:
+            return 0
+
+        columns = [column(f) for f in MIRROR_FIELDS] + ["display"]
+        conn = self.connection()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT INTO incidents ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(sys_id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns[1:])} "
+                # A sync page fetched before one of our writes must not undo it, and the
+                # same-second overlap of incremental syncs is not a change
+                f"WHERE excluded.sys_updated_on > incidents.sys_updated_on OR "
+                f"(excluded.sys_updated_on = incidents.sys_updated_on AND excluded.display != incidents.display)",
+                rows,
+            )
+            changed = conn.total_changes - before
+        if changed:
+            self.generation += 1
+        return changed
+
+    def _finish_sync(self, watermark):
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('watermark', max(?, ?))", (watermark, self.watermark))
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('last_sync', ?)", (str(time.time()),))
+
+    async def write_through(self, response):
+        """
+        Store the incident returned by a successful POST / PATCH sent with WRITE_PARAMS.
+        Returns the record with raw values ({} when there is none). Storing is best
+        effort: a failure is logged and the next sync catches up.
+        """
+        try:
+            record = response.json().get("result") if response.is_success else None
+        except ValueError:
+            record = None
+        if not isinstance(record, dict) or not record:
+            return {}
+        try:
+            if isinstance(record.get("sys_id"), dict):
+                await asyncio.to_thread(self.upsert, [record])
+                self.stats["write_throughs"] += 1
+            else:  # Sent without WRITE_PARAMS: display values unknown, fetch the record as a sync would
+                await self._fetch_into_mirror(f"sys_id={record.get('sys_id', '')}", 1)
+        except Exception as e:
+            print(f"⚠️ Incident mirror write-through failed, the next sync will pick it up: {e}")
+        return {field: _split(value)[0] for field, value in record.items()}
+
+    # -- sync ------------------------------------------------------------------
+    async def _fetch(self, query, limit, offset=0):
+        response = await snow_get(f"{SNOW_INSTANCE}/api/now/table/incident", params={
+            **MIRROR_PARAMS,
+            "sysparm_query": query,
+            "sysparm_limit": limit,
+            "sysparm_offset": offset,
+        })
+        response.raise_for_status()
+        return response.json().get("result", [])
+
+    async def _fetch_into_mirror(self, query, limit):
+        records = await self._fetch(query, limit)
+        await asyncio.to_thread(self.upsert, records)
+        return records
+
+    async def sync(self, max_age=None):
+        """
+        Fetch incidents updated since the watermark; returns the number of rows changed.
+        With `max_age`, a sync that finished less than `max_age` seconds ago (e.g. while
+        waiting for the lock) counts as done.
+        """
+        # Polled rather than awaited in a thread, so a cancelled caller never holds the lock
+        while not self._sync_lock.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        try:
+            if max_age is not None and time.time() - self.last_sync < max_age:
+                return 0
+            watermark = self.watermark
+            if not watermark and INCIDENT_MIRROR_BACKFILL_DAYS > 0:
+                watermark = (datetime.now(timezone.utc) - timedelta(days=INCIDENT_MIRROR_BACKFILL_DAYS)).strftime(SNOW_DATETIME)
+            # >= keeps same-second updates; the upsert makes the overlap harmless
+            query = f"sys_updated_on>={watermark}^ORDERBYsys_updated_on" if watermark else "ORDERBYsys_updated_on"
+
+            changed, newest, offset = 0, watermark, 0
+            try:
+                while True:
+                    page = await self._fetch(query, SYNC_PAGE_SIZE, offset)
+                    changed += await asyncio.to_thread(self.upsert, page)
+                    newest = max([newest] + [_split(r.get("sys_updated_on"))[0] for r in page])
+                    if len(page) < SYNC_PAGE_SIZE:
+                        break
+                    offset += SYNC_PAGE_SIZE
+            except Exception:
+                self.stats["sync_errors"] += 1
+                raise
+            await asyncio.to_thread(self._finish_sync, newest)
+            self.stats["syncs"] += 1
+            return changed
+        finally:
+            self._sync_lock.release()
+
+    async def ensure_fresh(self, max_age=None):
+        """Sync when the last sync is older than `max_age` seconds (default: the staleness bound)."""
+        max_age = self.max_age if max_age is None else max_age
+        last_sync = self.last_sync
+        if time.time() - last_sync < max_age:
+            return
+        try:
+            await self.sync(max_age)
+        except Exception as e:
+            if not last_sync:
+                raise
+            print(f"⚠️ Incident mirror sync failed, answering from data {time.time() - last_sync:.0f}s old: {e}")
+
+    # -- reads -------------------------------------------------------------------
+    def select(self, where="1", params=(), order_by="sys_created_on DESC", limit=None, fields=None, display=False):
+        """
+        Incidents as Table API dicts with raw (or display) values. `where` and `order_by`
+        are SQL over the columns (see column()); `fields` defaults to all mirrored fields.
+        """
+        fields = tuple(fields or MIRROR_FIELDS)
+        sql = f"SELECT {'display' if display else ', '.join(column(f) for f in fields)} FROM incidents WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self.connection().execute(sql, tuple(params)).fetchall()
+        if display:
+            return [{f: values.get(f, "") for f in fields} for values in (json.loads(row[0]) for row in rows)]
+        return [dict(zip(fields, row)) for row in rows]
+
+    async def query(self, where="1", params=(), order_by="sys_created_on DESC", limit=None, fields=None, display=False):
+        """select() within the staleness bound."""
+        await self.ensure_fresh()
+        self.stats["reads"] += 1
+        return self.select(where, params, order_by, limit, fields, display)
+
+    async def get(self, number, fields=None, display=False):
+        """One incident by number (None when ServiceNow has none); a miss is looked up live."""
+        number = str(number).strip().upper()
+        rows = await self.query("number = ?", (number,), None, 1, fields, display)
+        if not rows:
+            self.stats["live_lookups"] += 1
+            if await self._fetch_into_mirror(f"number={number}", 1):
+                rows = self.select("number = ?", (number,), None, 1, fields, display)
+        return rows[0] if rows else None
+
+
+# ---------------------------------------------------
+# 🔁 Background sync
+# ---------------------------------------------------
+class MirrorSyncWorker:
+    """Daemon thread running an incremental sync every `interval` seconds (on the shared background loop)."""
+
+    def __init__(self, mirror, interval=INCIDENT_MIRROR_SYNC_INTERVAL):
+        self.mirror = mirror
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="incident-mirror-sync", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                changed = run_sync(self.mirror.sync())
+                if changed:
+                    print(f"🔄 Incident mirror synced: {changed} incidents changed (watermark {self.mirror.watermark})")
+            except Exception as e:  # Never let the worker die; reads fall back to syncing themselves
+                print(f"⚠️ Incident mirror sync failed: {e}")
+            self._stop.wait(self.interval)
+
+
+incident_mirror = Lazy(IncidentMirror, "incident_mirror")
+# Built by the startup warmup, so the mirror is current before the first read needs it
+mirror_sync_worker = Lazy(lambda: MirrorSyncWorker(incident_mirror.get()).start(), "mirror_sync_worker")
+
+
+def get_incident_mirror():
+    """The process-wide mirror; the background sync starts with its first use."""
+    mirror_sync_worker.get()
+    return incident_mirror.get()
+
+
+def mirror_stats():
+    """Row count, watermark, age of the data and read / write / sync counters."""
+    mirror = incident_mirror.get()
+    last_sync = mirror.last_sync
+    return {
+        "incidents": mirror.count(),
+        "watermark": mirror.watermark,
+        "age_seconds": round(time.time() - last_sync, 1) if last_sync else None,
+        "max_age_seconds": mirror.max_age,
+        "worker": mirror_sync_worker.ready,
+        **mirror.stats,
+    }
+
+
+if __name__ == "__main__":
+    mirror = incident_mirror.get()
+    if len(sys.argv) == 2 and sys.argv[1] == "sync":
+        changed = asyncio.run(mirror.sync())
+        print(f"✅ Synced {changed} incidents ({mirror.count()} mirrored, watermark {mirror.watermark})")
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        print(json.dumps(asyncio.run(mirror.get(sys.argv[2], display=True)), indent=2, ensure_ascii=False))
+    else:
+        print("Usage: python -m incident_mirror sync | show <incident number>")
+        sys.exit(2)
@@ -0,0 +1,206 @@
+# intent_router.py — Fast path for deterministic commands, ahead of the assistant LLM
+#
+# "status of INC0010018", "show my tickets" or "history of INC0010016" used to cost a full
+# ReAct round: the assistant LLM picks the tool, the tool node runs it, the LLM
+# rewords the result. The user and engineer subgraphs now run an IntentRouter node
+# right after compact_context:
+#
+#   - the turn's message is normalized (case, polite filler, punctuation) and must
+#     match one intent's pattern in full, so only short command-like messages qualify
+#   - the matched tool is called directly (same timeout as in the tool node) and the
+#     reply comes from the intent's template: one ServiceNow round trip, no LLM call
+#   - the turn is recorded as AIMessage(tool_calls) → ToolMessage → AIMessage(reply),
+#     exactly what the ReAct loop would have left, so later turns read the same history
+#
+# Only read-only tools are routed: closing, reopening or updating a ticket needs the
+# assistant's confirmation step, and a question ("can i close INC0010016?") must
+# never be taken as the command itself, so no question or intention prefix is stripped.
+#
+# Anything else (no match, a missing email, a tool error or timeout) goes to the
+# assistant as before. Routed and passed-through turns are counted in router.stats.
+import re
+import time
+import uuid
+import asyncio
+from dataclasses import dataclass
+from string import Template
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from tool_execution import tool_timeout
+from utils import run_sync
+
+TICKET = r"(inc\d{5,})"
+TICKETS = r"(inc\d{5,}(?:\s*(?:,|and)\s*inc\d{5,})*)"
+EMAIL_PATTERN = re.compile(r"User email:\s*([^\s,]+@[^\s,]+)", re.IGNORECASE)
+
+# Filler stripped before matching: "hi, can you please show my tickets?" → "show my tickets"
+_LEADING = re.compile(r"^(?:(?:hi|hey|hello|ok|okay|please|pls|kindly|can you|could you|would you)\b[\s,]*)+")
+_TRAILING = re.compile(r"(?:[\s,]*\b(?:please|pls|thanks|thank you|now)\b)+$")
+
+
+def normalize(text):
+    text = re.sub(r"\s+", " ", str(text).lower()).strip()
+    text = text.strip(" .!?")
+    text = _LEADING.sub("", text)
+    return _TRAILING.sub("", text).strip(" .!?")
+
+
+def ticket_numbers(text):
+    return [t.upper() for t in re.findall(r"inc\d{5,}", text, re.IGNORECASE)]
+
+
+@dataclass
+class Intent:
+    name: str
+    tool: str
+    patterns: tuple          # Regexes matched against the whole normalized message
+    args: callable           # (match, email) -> tool arguments, or None when they cannot be filled
+    reply: Template          # $result is the tool output; $tickets the ticket numbers
+    needs_email: bool = False
+
+    def __post_init__(self):
+        self.compiled = tuple(re.compile(p) for p in self.patterns)
+
+    def match(self, text):
+        for pattern in self.compiled:
+            found = pattern.fullmatch(text)
+            if found:
+                return found
+        return None
+
+
+# ---------------------------------------------------
+# 📋 Intents
+# ---------------------------------------------------
+USER_INTENTS = (
+    Intent(
+        "ticket_status", "check_status",
+        (rf"(?:what(?:'s| is) the )?(?:status|state) (?:of |for )?(?:my )?(?:ticket |incident )?{TICKET}",
+         rf"(?:check|get|show) (?:the )?(?:status|state) (?:of |for )?(?:ticket |incident )?{TICKET}",
+         rf"(?:check )?(?:ticket |incident )?{TICKET} (?:status|state)",
+         rf"(?:what(?:'s| is) happening with|any update on|update on) (?:ticket |incident )?{TICKET}"),
+        lambda m, email: {"user_input": m.group(1).upper()},
+        Template("$result"),
+    ),
+    Intent(
+        "my_tickets", "show_my_tickets",
+        (r"(?:show|list|get|display|view|see|check) (?:me )?(?:all )?my (?:open )?(?:tickets|incidents)",
+         r"(?:what are )?(?:all )?my (?:open )?(?:tickets|incidents)"),
+        lambda m, email: {"user_email": email},
+        Template("Here are your tickets:\n\n$result"),
+        needs_email=True,
+    ),
+)
+
+ENGINEER_INTENTS = (
+    Intent(
+        "assigned_tickets", "show_assigned_tickets",
+        (r"(?:show|list|get|display|view|see|check) (?:me )?(?:all )?my (?:assigned |open )?(?:tickets|incidents)",
+         r"(?:what are )?(?:all )?my (?:assigned |open )?(?:tickets|incidents)",
+         r"(?:which|what) tickets are assigned to me"),
+        lambda m, email: {"engineer_email": email},
+        Template("$result"),
+        needs_email=True,
+    ),
+    Intent(
+        "ticket_details", "get_ticket_details",
+        (rf"(?:show|get|give me) (?:me )?(?:the )?(?:details|info|information) (?:of|for|on|about) (?:tickets? |incidents? )?{TICKETS}",
+         rf"(?:details|info) (?:of |for |on )?(?:tickets? |incidents? )?{TICKETS}",
+         rf"(?:show|open) (?:me )?(?:tickets? |incidents? )?{TICKETS}"),
+        lambda m, email: {"ticket_numbers": ",".join(ticket_numbers(m.group(1))), "engineer_email": email},
+        Template("$result"),
+        needs_email=True,
+    ),
+    Intent(
+        "ticket_history", "get_ticket_history",
+        (rf"(?:show|get|give me) (?:me )?(?:the )?history (?:of|for) (?:ticket |incident )?{TICKET}",
+         rf"(?:history of |history for )?(?:ticket |incident )?{TICKET} history",
+         rf"history (?:of |for )?(?:ticket |incident )?{TICKET}"),
+        lambda m, email: {"ticket_number": m.group(1).upper()},
+        Template("History of $tickets:\n\n$result"),
+    ),
+    Intent(
+        "analytics", "review_analytics",
+        (r"(?:show|get|review|display|see|check) (?:me )?my (?:ticket )?(?:analytics|stats|statistics|performance)",
+         r"my (?:ticket )?(?:analytics|stats|statistics|performance)"),
+        lambda m, email: {"engineer_email": email},
+        Template("$result"),
+        needs_email=True,
+    ),
+)
+
+
+# ---------------------------------------------------
+# 🔀 Router node
+# ---------------------------------------------------
+def _caller_email(messages):
+    """Email from the session intro ("User name: … User email: …"), kept pinned by compaction."""
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            found = EMAIL_PATTERN.search(str(message.content))
+            if found:
+                return found.group(1)
+    return None
+
+
+class IntentRouter:
+    """Graph node answering high-confidence commands with one direct tool call."""
+
+    def __init__(self, intents, tools, name):
+        self.intents = intents
+        self.tools = {t.name: t for t in tools}
+        self.name = name
+        self.stats = {"routed": 0, "passed": 0, "failed": 0}
+
+    def match(self, state):
+        """(intent, tool arguments) for the turn's message, or None to let the assistant handle it."""
+        messages = state.get("messages", [])
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        text = normalize(messages[-1].content)
+        for intent in self.intents:
+            found = intent.match(text)
+            if found is None or intent.tool not in self.tools:
+                continue
+            email = _caller_email(messages)
+            if intent.needs_email and not email:
+                return None
+            return intent, intent.args(found, email)
+        return None
+
+    async def aroute(self, state, config=None):
+        matched = self.match(state)
+        if matched is None:
+            self.stats["passed"] += 1
+            return {}
+
+        intent, args = matched
+        call = {"name": intent.tool, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}", "type": "tool_call"}
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.tools[intent.tool].ainvoke(call, config), tool_timeout(intent.tool))
+        except Exception as e:  # Timeout or tool failure: the assistant takes the turn
+            self.stats["failed"] += 1
+            print(f"⚠️ Fast path {intent.name} failed, handing over to the assistant: {e!r}")
+            return {}
+
+        self.stats["routed"] += 1
+        print(f"⚡ Fast path {intent.name} → {intent.tool} ({time.perf_counter() - started:.2f}s)")
+        output = str(result.content)
+        tickets = ", ".join(ticket_numbers(" ".join(str(v) for v in args.values())))
+        reply = output if output.startswith(("⚠️", "❌")) else intent.reply.substitute(result=output, tickets=tickets)
+        return {"messages": [
+            AIMessage(content="", tool_calls=[call]),
+            result,
+            AIMessage(content=reply, additional_kwargs={"fast_path": intent.name}),
+        ]}
+
+    def route(self, state, config=None):
+        return run_sync(self.aroute(state, config))
+
+    @staticmethod
+    def next_step(state):
+        """Conditional edge: "end" when the router answered the turn, else "assistant"."""
+        last = state["messages"][-1]
+        return "end" if isinstance(last, AIMessage) and last.additional_kwargs.get("fast_path") else "assistant"
@@ -0,0 +1,332 @@
+# llm_registry.py — Per-model concurrency / rate limits and metrics for the shared chat models
+#
+# startup.get_chat_model() hands out one client per (model, temperature, options), so
+# every caller shares one HTTP connection pool. The clients are LimitedChatOpenAI,
+# which puts every call (invoke, ainvoke, streaming, tool-bound) through the model's
+# ModelLimiter before it reaches OpenAI:
+#
+#   - at most `concurrency` calls in flight per model
+#   - token bucket of `tpm` tokens per minute: a call reserves its estimated cost
+#     (prompt ≈ chars / 4, plus the expected completion) and the reservation is
+#     corrected with the real usage when the response arrives
+#   - request bucket of `rpm` requests per minute
+#   - waiting calls are served first in, first out, from threads and event loops alike
+#
+# A burst therefore queues locally instead of tripping 429s (the OpenAI client still
+# retries the few that slip through). llm_metrics keeps, per model, a latency
+# histogram, queue wait, errors and prompt / completion / cached-prompt token totals;
+# bot_app.py serves them as GET /metrics/llm.
+#
+# Configuration (environment):
+#   LLM_LIMITS                 → JSON overrides per model, e.g.
+#                                {"gpt-4": {"concurrency": 4, "tpm": 20000, "rpm": 200}}
+#                                ("*" applies to models without an entry; 0 disables a limit)
+#   LLM_EXPECTED_COMPLETION    → completion tokens reserved per call without max_tokens (default 512)
+import os
+import json
+import time
+import asyncio
+import bisect
+import threading
+from collections import deque
+
+from langchain_openai import ChatOpenAI
+
+DEFAULT_LIMITS = {
+    "gpt-4": {"concurrency": 8, "tpm": 40000, "rpm": 500},
+    "gpt-4o-mini": {"concurrency": 16, "tpm": 200000, "rpm": 500},
+    "gpt-4.1-mini": {"concurrency": 16, "tpm": 200000, "rpm": 500},
+    "*": {"concurrency": 8, "tpm": 40000, "rpm": 500},
+}
+LLM_EXPECTED_COMPLETION = int(os.getenv("LLM_EXPECTED_COMPLETION", "512"))
+POLL_INTERVAL = 0.05  # Seconds between checks of an async waiter
+
+
+def _load_limits():
+    limits = {model: dict(values) for model, values in DEFAULT_LIMITS.items()}
+    overrides = os.getenv("LLM_LIMITS", "")
+    if overrides:
+        try:
+            for model, values in json.loads(overrides).items():
+                limits.setdefault(model, dict(limits["*"])).update(values)
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ Ignoring invalid LLM_LIMITS: {e}")
+    return limits
+
+
+LLM_LIMITS = _load_limits()
+
+
+# ---------------------------------------------------
+# 🚦 Limiter
+# ---------------------------------------------------
+class ModelLimiter:
+    """FIFO admission by concurrency slots, a token bucket and a request bucket (0 = unlimited)."""
+
+    def __init__(self, concurrency=0, tpm=0, rpm=0):
+        self.concurrency = concurrency
+        self.tpm = tpm
+        self.rpm = rpm
+        self.tokens = float(tpm)
+        self.requests = float(rpm)
+        self.in_flight = 0
+        self._refilled_at = time.monotonic()
+        self._waiters = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._refilled_at = now - self._refilled_at, now
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+
+    def _try_acquire(self, ticket, cost):
+        """0 when `ticket` got admitted, otherwise seconds worth waiting. Caller holds the lock."""
+        if self._waiters[0] is not ticket:
+            return POLL_INTERVAL
+        if self.concurrency and self.in_flight >= self.concurrency:
+            return POLL_INTERVAL
+        self._refill()
+        cost = min(cost, self.tpm) if self.tpm else 0  # An oversized call waits for a full bucket
+        waits = []
+        if self.tpm and self.tokens < cost:
+            waits.append((cost - self.tokens) * 60 / self.tpm)
+        if self.rpm and self.requests < 1:
+            waits.append((1 - self.requests) * 60 / self.rpm)
+        if waits:
+            return max(waits)
+
+        self.tokens -= cost
+        self.requests -= 1 if self.rpm else 0
+        self.in_flight += 1
+        self._waiters.popleft()
+        self._cond.notify_all()
+        return 0
+
+    def _leave(self, ticket):
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def acquire(self, cost):
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+        try:
+            with self._cond:
+                while True:
+                    wait = self._try_acquire(ticket, cost)
+                    if not wait:
+                        return
+                    self._cond.wait(wait)
+        finally:
+            self._leave(ticket)
+
+    async def aacquire(self, cost):
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(ticket, cost)
+                if not wait:
+                    return
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        finally:
+            self._leave(ticket)
+
+    def release(self, reserved, used):
+        """Free the slot and settle the token reservation with the real usage."""
+        with self._cond:
+            self.in_flight -= 1
+            if self.tpm and used is not None:
+                self._refill()
+                self.tokens = min(self.tpm, self.tokens + reserved - used)
+            self._cond.notify_all()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_name):
+    """The process-wide limiter of a model (created on first use from LLM_LIMITS)."""
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model_name)
+            if limiter is None:
+                limits = LLM_LIMITS.get(model_name, LLM_LIMITS["*"])
+                limiter = _limiters[model_name] = ModelLimiter(**limits)
+    return limiter
+
+
+# ---------------------------------------------------
+# 📊 Metrics
+# ---------------------------------------------------
+LATENCY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)  # Upper bounds, seconds
+
+
+class LLMMetrics:
+    """Per-model latency histogram, queue wait, errors and token totals (cached prompt tokens included)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, latency, wait, prompt_tokens, completion_tokens, error=None, cached_tokens=0):
+        with self._lock:
+            series = self._series.get(model)
+            if series is None:
+                series = self._series[model] = {
+                    "count": 0, "errors": 0, "sum": 0.0, "wait_sum": 0.0, "wait_max": 0.0,
+                    "buckets": [0] * (len(self.buckets) + 1),  # Last bucket is +Inf
+                    "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                }
+            series["count"] += 1
+            series["errors"] += 1 if error else 0
+            series["sum"] += latency
+            series["wait_sum"] += wait
+            series["wait_max"] = max(series["wait_max"], wait)
+            series["buckets"][bisect.bisect_left(self.buckets, latency)] += 1
+            series["prompt_tokens"] += prompt_tokens or 0
+            series["completion_tokens"] += completion_tokens or 0
+            series["cached_tokens"] += cached_tokens or 0
+
+    def snapshot(self):
+        """{model: {count, errors, avg, buckets {le: n}, avg_wait, max_wait, tokens, cached_ratio, in_flight, waiting}}"""
+        with self._lock:
+            result = {}
+            for model, s in sorted(self._series.items()):
+                labels = [str(b) for b in self.buckets] + ["+Inf"]
+                limiter = _limiters.get(model)
+                result[model] = {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg": s["sum"] / s["count"] if s["count"] else 0.0,
+                    "buckets": dict(zip(labels, s["buckets"])),
+                    "avg_wait": s["wait_sum"] / s["count"] if s["count"] else 0.0,
+                    "max_wait": s["wait_max"],
+                    "prompt_tokens": s["prompt_tokens"],
+                    "completion_tokens": s["completion_tokens"],
+                    "cached_tokens": s["cached_tokens"],
+                    "cached_ratio": s["cached_tokens"] / s["prompt_tokens"] if s["prompt_tokens"] else 0.0,
+                    "in_flight": limiter.in_flight if limiter else 0,
+                    "waiting": limiter.waiting if limiter else 0,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+llm_metrics = LLMMetrics()
+
+
+# ---------------------------------------------------
+# 🤖 Limited client
+# ---------------------------------------------------
+def _content_chars(content):
+    if isinstance(content, str):
+        return len(content)
+    return sum(len(part.get("text", "")) if isinstance(part, dict) else len(str(part)) for part in content)
+
+
+def _usage(message):
+    """(prompt tokens, completion tokens, cached prompt tokens) from a message's usage metadata."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    return usage.get("input_tokens"), usage.get("output_tokens"), cached
+
+
+class LimitedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose calls are admitted by the model's ModelLimiter and recorded in llm_metrics."""
+
+    def _estimate(self, messages, kwargs):
+        chars = sum(_content_chars(m.content) for m in messages)
+        if kwargs.get("tools"):
+            chars += len(json.dumps(kwargs["tools"], default=str))
+        return chars // 4 + (self.max_tokens or LLM_EXPECTED_COMPLETION)
+
+    def _finish(self, limiter, reserved, started, wait, usage, error=None):
+        prompt_tokens, completion_tokens, cached_tokens = usage
+        used = (prompt_tokens or 0) + (completion_tokens or 0) if prompt_tokens is not None else None
+        limiter.release(reserved, used)
+        llm_metrics.record(self.model_name, time.perf_counter() - started, wait,
+                           prompt_tokens, completion_tokens, error, cached_tokens)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, reserved = get_limiter(self.model_name), self._estimate(messages, kwargs)
+        queued = time.perf_counter()
+        limiter.acquire(reserved)
+        started = time.perf_counter()
+        usage, error = (None, None, 0), None
+        try:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            usage = _usage(result.generations[0].message) if result.generations else usage
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, reserved, started, started - queued, usage, error)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, reserved = get_limiter(self.model_name), self._estimate(messages, kwargs)
+        queued = time.perf_counter()
+        await limiter.aacquire(reserved)
+        started = time.perf_counter()
+        usage, error = (None, None, 0), None
+        try:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            usage = _usage(result.generations[0].message) if result.generations else usage
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, reserved, started, started - queued, usage, error)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, reserved = get_limiter(self.model_name), self._estimate(messages, kwargs)
+        queued = time.perf_counter()
+        limiter.acquire(reserved)
+        started = time.perf_counter()
+        usage, error = (None, None, 0), None
+        try:
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                if getattr(chunk.message, "usage_metadata", None):
+                    usage = _usage(chunk.message)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, reserved, started, started - queued, usage, error)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter, reserved = get_limiter(self.model_name), self._estimate(messages, kwargs)
+        queued = time.perf_counter()
+        await limiter.aacquire(reserved)
+        started = time.perf_counter()
+        usage, error = (None, None, 0), None
+        try:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                if getattr(chunk.message, "usage_metadata", None):
+                    usage = _usage(chunk.message)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(limiter, reserved, started, started - queued, usage, error)
@@ -0,0 +1,378 @@
+# mail_queue.py — Outbound mail spool and background delivery worker
+#
+# Report tools used to send mail inline: send_gmail opened a new SMTP_SSL connection
+# and logged in for every message, send_outlook re-authenticated an O365 Account per
+# call, and the agent turn waited for either. enqueue_mail() now writes the message
+# to a spool directory and returns a delivery ID at once; a daemon thread delivers it:
+#
+#   - one authenticated session (SMTP, or Microsoft Graph) is reused across messages
+#     and closed after MAIL_IDLE_SECONDS without mail
+#   - up to MAIL_BATCH_SIZE due messages are sent per round over that session
+#   - failures are retried with exponential backoff (MAIL_RETRY_BASE_SECONDS, doubling,
+#     capped at MAIL_RETRY_MAX_SECONDS) up to MAIL_MAX_ATTEMPTS; a recipient or message
+#     the server rejects permanently (5xx) fails at once
+#   - the spool survives restarts: pending messages are delivered when the worker
+#     starts again (startup warmup, or the next enqueue_mail)
+#
+# delivery_status(id) reports queued / retrying / sent / failed with the attempts and
+# the last error; bot_app.py serves it as GET /mail/{delivery_id}, and from src/:
+#   python -m mail_queue status <delivery id>
+#
+# Spool layout (MAIL_SPOOL_DIR): pending/, sent/ and failed/ hold one <id>.json per
+# message; attachments are copied to files/<id>/ (removed once sent). Run one worker
+# per spool directory.
+#
+# Testing against a local aiosmtpd stand-in:
+#   python -m aiosmtpd -n -l localhost:8025
+#   MAIL_SMTP_HOST=localhost MAIL_SMTP_PORT=8025 MAIL_SMTP_SECURITY=none python bot_app.py
+#
+# Configuration (environment):
+#   MAIL_TRANSPORT           → "smtp" (default) or "graph" (O365 app credentials
+#                              CLIENT_ID / CLIENT_SECRET / TENANT_ID)
+#   MAIL_SPOOL_DIR           → spool directory (default data/mail_spool)
+#   MAIL_SMTP_HOST / _PORT   → SMTP server (default smtp.gmail.com:465)
+#   MAIL_SMTP_SECURITY       → "ssl" (default), "starttls" or "none"
+#   MAIL / GOOG_PASS         → sender address and SMTP password (no login without a password)
+#   MAIL_REDIRECT_TO         → deliver every message to this address instead (testing)
+#   MAIL_BATCH_SIZE          → messages per round (default 20)
+#   MAIL_MAX_ATTEMPTS        → delivery attempts before a message fails (default 5)
+#   MAIL_RETRY_BASE_SECONDS  → first retry delay, doubled per attempt (default 30)
+#   MAIL_RETRY_MAX_SECONDS   → retry delay cap (default 900)
+#   MAIL_IDLE_SECONDS        → idle time before the session is closed (default 60)
+import os
+import sys
+import ssl
+import json
+import time
+import uuid
+import shutil
+import smtplib
+import mimetypes
+import threading
+from textwrap import dedent
+from email.message import EmailMessage
+
+from startup import Lazy
+
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "smtp")
+MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR", "data/mail_spool")
+MAIL_SMTP_HOST = os.getenv("MAIL_SMTP_HOST", "smtp.gmail.com")
+MAIL_SMTP_PORT = int(os.getenv("MAIL_SMTP_PORT", "465"))
+MAIL_SMTP_SECURITY = os.getenv("MAIL_SMTP_SECURITY", "ssl")
+MAIL_SENDER = os.getenv("MAIL", "")
+MAIL_PASSWORD = os.getenv("GOOG_PASS", "")
+MAIL_REDIRECT_TO = os.getenv("MAIL_REDIRECT_TO", "")
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "30"))
+MAIL_RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX_SECONDS", "900"))
+MAIL_IDLE_SECONDS = float(os.getenv("MAIL_IDLE_SECONDS", "60"))
+
+STATES = ("pending", "sent", "failed")
+
+
+class PermanentMailError(Exception):
+    """The server rejected the message or recipient; retrying will not help."""
+
+
+# ---------------------------------------------------
+# 📂 Spool
+# ---------------------------------------------------
+class MailSpool:
+    """Messages as JSON files under pending/, sent/ and failed/ of a directory."""
+
+    def __init__(self, root=MAIL_SPOOL_DIR):
+        self.root = root
+        for state in STATES + ("files",):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, state, delivery_id):
+        return os.path.join(self.root, state, f"{delivery_id}.json")
+
+    def _write(self, state, message):
+        path = self._path(state, message["id"])
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(message, f)
+        os.replace(tmp, path)  # Readers never see a partial file
+
+    def add(self, to, subject, body, attachments=(), transport=None):
+        delivery_id = uuid.uuid4().hex
+        files_dir = os.path.join(self.root, "files", delivery_id)
+        copies = []
+        for path in attachments:
+            os.makedirs(files_dir, exist_ok=True)
+            copy = os.path.join(files_dir, os.path.basename(path))
+            shutil.copyfile(path, copy)
+            copies.append(copy)
+
+        now = time.time()
+        self._write("pending", {
+            "id": delivery_id, "status": "queued", "transport": transport or MAIL_TRANSPORT,
+            "to": to, "subject": subject, "body": body, "attachments": copies,
+            "attempts": 0, "last_error": "", "created_at": now, "next_attempt_at": now, "sent_at": None,
+        })
+        return delivery_id
+
+    def get(self, delivery_id):
+        for _ in range(2):  # A message may move between directories while we look
+            for state in STATES:
+                try:
+                    with open(self._path(state, delivery_id), encoding="utf-8") as f:
+                        return json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+        return None
+
+    def pending(self):
+        messages = []
+        for name in os.listdir(os.path.join(self.root, "pending")):
+            if name.endswith(".json"):
+                message = self.get(name[:-5])
+                if message and message["status"] in ("queued", "retrying"):
+                    messages.append(message)
+        return sorted(messages, key=lambda m: m["created_at"])
+
+    def due(self, limit):
+        now = time.time()
+        return [m for m in self.pending() if m["next_attempt_at"] <= now][:limit]
+
+    def seconds_until_due(self):
+        waits = [m["next_attempt_at"] - time.time() for m in self.pending()]
+        return max(0.0, min(waits)) if waits else None
+
+    def mark_sent(self, message):
+        message.update(status="sent", sent_at=time.time(), last_error="")
+        self._write("sent", message)
+        os.remove(self._path("pending", message["id"]))
+        shutil.rmtree(os.path.join(self.root, "files", message["id"]), ignore_errors=True)
+
+    def mark_failed(self, message, error):
+        message.update(status="failed", last_error=str(error))
+        self._write("failed", message)
+        os.remove(self._path("pending", message["id"]))
+
+    def retry_later(self, message, error):
+        """Schedule another attempt with exponential backoff, or fail after MAIL_MAX_ATTEMPTS."""
+        if message["attempts"] >= MAIL_MAX_ATTEMPTS:
+            return self.mark_failed(message, error)
+        delay = min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** (message["attempts"] - 1))
+        message.update(status="retrying", last_error=str(error), next_attempt_at=time.time() + delay)
+        self._write("pending", message)
+
+    def counts(self):
+        return {state: sum(n.endswith(".json") for n in os.listdir(os.path.join(self.root, state)))
+                for state in STATES}
+
+
+# ---------------------------------------------------
+# ✉️ Transports (one session, many messages)
+# ---------------------------------------------------
+def _recipient(message):
+    return MAIL_REDIRECT_TO or message["to"]
+
+
+class SmtpTransport:
+    def __init__(self, host=MAIL_SMTP_HOST, port=MAIL_SMTP_PORT, security=MAIL_SMTP_SECURITY,
+                 sender=MAIL_SENDER, password=MAIL_PASSWORD):
+        self.host, self.port, self.security = host, port, security
+        self.sender, self.password = sender, password
+        self.smtp = None
+
+    def open(self):
+        if self.security == "ssl":
+            self.smtp = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=30)
+        else:
+            self.smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.security == "starttls":
+                self.smtp.starttls(context=ssl.create_default_context())
+        if self.password:
+            self.smtp.login(self.sender, self.password)
+
+    def send(self, message):
+        mime = EmailMessage()
+        mime["From"] = self.sender
+        mime["To"] = _recipient(message)
+        mime["Subject"] = message["subject"]
+        mime.set_content(dedent(message["body"]).strip())
+        for path in message["attachments"]:
+            kind, _ = mimetypes.guess_type(path)
+            maintype, subtype = (kind or "application/octet-stream").split("/", 1)
+            with open(path, "rb") as f:
+                mime.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=os.path.basename(path))
+        try:
+            self.smtp.send_message(mime)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentMailError(f"Recipient refused: {e.recipients}") from e
+        except smtplib.SMTPResponseException as e:
+            if 500 <= e.smtp_code < 600:
+                raise PermanentMailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            raise
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            pass
+        self.smtp = None
+
+
+class GraphTransport:
+    """Microsoft Graph sendMail through one authenticated O365 Account (app credentials)."""
+
+    def __init__(self, sender=MAIL_SENDER):
+        self.sender = sender
+        self.mailbox = None
+
+    def open(self):
+        from O365 import Account, FileSystemTokenBackend
+
+        account = Account(
+            (os.getenv("CLIENT_ID", "").strip(), os.getenv("CLIENT_SECRET", "").strip()),
+            auth_flow_type="credentials",
+            tenant_id=os.getenv("TENANT_ID", "").strip(),
+            token_backend=FileSystemTokenBackend(token_path=MAIL_SPOOL_DIR, token_filename="o365_token.txt"),
+        )
+        if not account.is_authenticated and not account.authenticate():
+            raise RuntimeError("Microsoft Graph authentication failed")
+        self.mailbox = account.mailbox(self.sender)
+
+    def send(self, message):
+        mail = self.mailbox.new_message()
+        mail.to.add([_recipient(message)])
+        mail.subject = message["subject"]
+        mail.body = dedent(message["body"]).strip()
+        mail.body_type = "text"
+        for path in message["attachments"]:
+            mail.attachments.add(path)
+        if not mail.send():
+            raise RuntimeError("Microsoft Graph did not accept the message")
+
+    def close(self):
+        self.mailbox = None
+
+
+TRANSPORTS = {"smtp": SmtpTransport, "graph": GraphTransport}
+
+
+# ---------------------------------------------------
+# 🔁 Worker
+# ---------------------------------------------------
+class MailWorker:
+    """Daemon thread delivering due spool messages over reused transport sessions."""
+
+    def __init__(self, spool, transports=TRANSPORTS):
+        self.spool = spool
+        self.transports = transports
+        self.sessions = {}  # transport name -> open transport
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "sessions_opened": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mail-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _session(self, name):
+        transport = self.sessions.get(name)
+        if transport is None:
+            transport = self.transports[name]()
+            transport.open()
+            self.sessions[name] = transport
+            self.stats["sessions_opened"] += 1
+        return transport
+
+    def _close(self, name):
+        transport = self.sessions.pop(name, None)
+        if transport is not None:
+            transport.close()
+
+    def deliver(self, message):
+        message["attempts"] += 1
+        try:
+            self._session(message["transport"]).send(message)
+        except PermanentMailError as e:
+            self.stats["failed"] += 1
+            self.spool.mark_failed(message, e)
+            print(f"❌ Mail {message['id']} to {message['to']} rejected: {e}")
+        except Exception as e:
+            # The session may be broken (disconnect, expired token): reconnect next time
+            self._close(message["transport"])
+            self.stats["retries"] += 1
+            self.spool.retry_later(message, e)
+            print(f"⚠️ Mail {message['id']} attempt {message['attempts']} failed: {e}")
+        else:
+            self.stats["sent"] += 1
+            self.spool.mark_sent(message)
+            print(f"✅ Mail {message['id']} sent to {message['to']}")
+
+    def _run(self):
+        idle_since = time.time()
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                due = self.spool.due(MAIL_BATCH_SIZE)
+                for message in due:
+                    self.deliver(message)
+                if due:
+                    idle_since = time.time()
+                    continue
+
+                if self.sessions and time.time() - idle_since >= MAIL_IDLE_SECONDS:
+                    for name in list(self.sessions):
+                        self._close(name)
+                wait = self.spool.seconds_until_due()
+                self._wake.wait(min(MAIL_IDLE_SECONDS, wait if wait is not None else MAIL_IDLE_SECONDS))
+            except Exception as e:  # Never let the worker die; the spool keeps the mail
+                print(f"❌ Mail worker error: {e}")
+                self._wake.wait(MAIL_RETRY_BASE_SECONDS)
+        for name in list(self.sessions):
+            self._close(name)
+
+
+mail_spool = Lazy(MailSpool, "mail_spool")
+# Built by the startup warmup, so mail spooled before a restart goes out without waiting for new mail
+mail_worker = Lazy(lambda: MailWorker(mail_spool.get()).start(), "mail_worker")
+
+
+def enqueue_mail(to, subject, body, attachments=(), transport=None):
+    """Spool a plain-text message (attachments are copied) and return its delivery ID at once."""
+    delivery_id = mail_spool.get().add(to, subject, body, attachments, transport)
+    mail_worker.get().wake()
+    return delivery_id
+
+
+def delivery_status(delivery_id):
+    """Spool record of a message without its body, or None for an unknown ID."""
+    message = mail_spool.get().get(delivery_id)
+    if message is None:
+        return None
+    return {k: v for k, v in message.items() if k not in ("body", "attachments")}
+
+
+def mail_stats():
+    """Spool counts plus the worker's delivery counters."""
+    stats = {"spool": mail_spool.get().counts()}
+    if mail_worker.ready:
+        stats["worker"] = dict(mail_worker.get().stats)
+    return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "status":
+        print(json.dumps(delivery_status(sys.argv[2]), indent=2, default=str))
+    elif len(sys.argv) == 2 and sys.argv[1] == "stats":
+        print(json.dumps(mail_stats(), indent=2))
+    else:
+        print("Usage: python -m mail_queue status <delivery id> | stats")
+        sys.exit(2)
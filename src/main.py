@@ -1,31 +1,26 @@
 # main.py
 
+import startup  # First import: marks the start of the cold-start measurement
+import sys
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
-# Import your agents
-from user.user_bot import get_agent as get_user_agent
-from engineer.engineer_bot import get_agent as get_engineer_agent
-from manager.manager_bot import get_agent as get_manager_agent
+# Import your agents (getters: each graph is compiled on first use or by the warmup)
+from user.user_subagent import get_user_subagent
+from engineer.engineer_subagent import get_engineer_subagent
+from manager.manager_subagent import get_manager_subagent
 
 # --------------------------------------------
-# STEP 1: Initialize all agents
-# --------------------------------------------
-USER_AGENT = get_user_agent()
-ENGINEER_AGENT = get_engineer_agent()
-MANAGER_AGENT = get_manager_agent()
-
-# --------------------------------------------
-# STEP 2: Define routing logic (email -> agent)
+# STEP 1: Define routing logic (email -> agent)
 # --------------------------------------------
 AGENT_MAP = {
-    "user@velixa.com": USER_AGENT,
-    "engineer@velixa.com": ENGINEER_AGENT,
-    "manager@velixa.com": MANAGER_AGENT,
+    "user@velixa.com": get_user_subagent,
+    "engineer@velixa.com": get_engineer_subagent,
+    "manager@velixa.com": get_manager_subagent,
 }
 
 # --------------------------------------------
-# STEP 3: Setup FastAPI app
+# STEP 2: Setup FastAPI app
 # --------------------------------------------
 app = FastAPI(
     title="VELIXA Multi-Agent System",
@@ -47,15 +42,23 @@ async def ask_agent(req: QueryRequest):
     email = req.email.strip().lower()
     query = req.query.strip()
 
-    agent = AGENT_MAP.get(email)
-    if not agent:
+    get_agent = AGENT_MAP.get(email)
+    if not get_agent:
         raise HTTPException(status_code=403, detail="Unauthorized email or no persona assigned.")
 
     try:
-        result = agent.invoke({"messages": [query]})
+        result = await get_agent().ainvoke({"messages": [query]})
         response = result["messages"][-1].content
         return {"email": email, "response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent Error: {str(e)}")
 
 
+@app.on_event("startup")
+async def warm_up():
+    startup.warmup_in_background()
+
+
+if __name__ == "__main__":
+    if startup.profile_requested():
+        sys.exit(startup.profile_startup())
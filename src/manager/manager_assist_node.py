@@ -3,6 +3,9 @@ from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableConfig
 from .manager_tool import manager_tools  # import your manager tools
 from langchain_openai import ChatOpenAI
+from startup import Lazy, get_chat_model
+from context_compaction import ContextCompactor
+from prompt_assembly import AssistantPrompt, record_cache_usage
 from dotenv import load_dotenv
 import os
 
@@ -14,16 +17,20 @@ load_dotenv(dotenv_path=".env", override=True)
 # Initialize LLM
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
 # Bind all manager tools to the LLM
-llm_with_manager_tools = llm.bind_tools(manager_tools)
+# Bound on first use so importing the node does not construct LLM clients
+llm_with_manager_tools = Lazy(lambda: get_chat_model("gpt-4", 0).bind_tools(manager_tools), "manager_llm_with_tools")
+
+# Rolling summary + recent turns, kept within the gpt-4 prompt budget
+manager_context = ContextCompactor("gpt-4")
 
 # -----------------------------
 # Generate Manager Prompt
 # -----------------------------
-def generate_manager_prompt(memory: str = "None") -> str:
-    return f"""
+manager_prompt = AssistantPrompt(
+    "manager_assistant",
+    """
 You are a professional **Manager Assistance Agent** in the IT Helpdesk Team.
 Your responsibilities include helping managers monitor tickets, generate reports, and guide team performance.
 
@@ -34,7 +41,7 @@ Your responsibilities include helping managers monitor tickets, generate reports
 - Politely redirect unrelated requests.
 
 ⚙️ AVAILABLE ACTIONS:
-1. show_tickets — Show top open tickets.
+1. show_tickets — Show top open tickets (set include_summary only when an overview is requested).
 2. fetch_individual_ticket — Get details of a specific ticket.
 3. show_individual_ticket — Show formatted view of a ticket.
 4. fetch_recent_incidents — Fetch recent incidents for reporting.
@@ -45,8 +52,11 @@ Your responsibilities include helping managers monitor tickets, generate reports
 - Avoid hallucinations; only use tool outputs.
 - Never expose credentials.
 
-📌 Prior saved manager preferences: {memory}
-"""
+""",
+    """
+    📌 Prior saved manager preferences: $memory
+    """,
+)
 
 # -----------------------------
 # Manager Assistance Node
@@ -58,12 +68,20 @@ def manager_assistance(state, config: RunnableConfig):
     - Generates a contextual prompt.
     - Invokes the LLM bound with manager tools.
     """
-    memory = state.get("loaded_memory", "None")
-    manager_prompt = generate_manager_prompt(memory)
-    messages = [SystemMessage(manager_prompt)] + state.get("messages", [])
+    messages = manager_prompt.messages(manager_context, state)
 
     # Call LLM with bound tools
-    response = llm_with_manager_tools.invoke(messages)
+    response = llm_with_manager_tools.get().invoke(messages)
+    record_cache_usage(manager_prompt, response)
 
     # Update conversation history
     return {"messages": [response]}
+
+
+async def amanager_assistance(state, config: RunnableConfig):
+    """Async variant of manager_assistance, used when the graph runs with ainvoke/astream."""
+    messages = manager_prompt.messages(manager_context, state)
+
+    response = await llm_with_manager_tools.get().ainvoke(messages)
+    record_cache_usage(manager_prompt, response)
+    return {"messages": [response]}
@@ -8,6 +8,8 @@ import uuid
 # import os
 # sys.path.append(os.path.dirname(__file__))  # add current folder to path
 # from utils import show_graph
+from startup import Lazy
+from session_store import get_checkpointer, get_long_term_store
 
 from typing_extensions import TypedDict
 from typing import Annotated, List
@@ -17,7 +19,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.memory import InMemoryStore
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage
-from langgraph.prebuilt import ToolNode
+from tool_execution import build_tool_node
 from langgraph.graph import StateGraph, START, END
 #from manager_subagent import manager_subagent  # Import your compiled manager subagent
 
@@ -25,7 +27,8 @@ from utils import show_graph
 
 # Import your manager tools
 from .manager_tool import manager_tools
-from .manager_assist_node import manager_assistance  # similar to user_assistance but for managers
+from .manager_assist_node import manager_assistance, amanager_assistance, manager_context  # similar to user_assistance but for managers
+from langchain_core.runnables import RunnableLambda
 
 # -------------------------------------------------------------------
 # 1️⃣ Load environment and initialize LLM
@@ -35,14 +38,14 @@ load_dotenv(dotenv_path=".env", override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+# The LLM (bound to the tools) lives in the assist node and is created on first use.
 
 
 # -------------------------------------------------------------------
 # 2️⃣ Initialize memory systems
 # -------------------------------------------------------------------
-in_memory_store = InMemoryStore()
-checkpointer = MemorySaver()
+# Shared, bounded backends from session_store (in-process by default, SQLite with
+# SESSION_BACKEND=sqlite); they are opened when the graph is first built.
 
 # -------------------------------------------------------------------
 # 3️⃣ Define the state schema
@@ -52,13 +55,14 @@ class ManagerState(TypedDict):
     manager_id: str
     messages: Annotated[list[AnyMessage], add_messages]
     loaded_memory: str
+    summary: str  # Rolling summary of the turns compacted out of `messages`
     remaining_steps: RemainingSteps
 
 # -------------------------------------------------------------------
 # 4️⃣ Bind tools and create a tool node
 # -------------------------------------------------------------------
-llm_with_manager_tools = llm.bind_tools(manager_tools)
-manager_tool_node = ToolNode(manager_tools)
+# Independent tool calls of one step run concurrently (bounded, with per-tool timeouts)
+manager_tool_node = build_tool_node(manager_tools)
 
 # -------------------------------------------------------------------
 # 5️⃣ Conditional function for routing logic
@@ -74,39 +78,58 @@ def should_continue(state: ManagerState, config: RunnableConfig):
 # -------------------------------------------------------------------
 # 6️⃣ Define the manager workflow graph
 # -------------------------------------------------------------------
-manager_workflow = StateGraph(ManagerState)
-
-manager_workflow.add_node("manager_assistant", manager_assistance)
-manager_workflow.add_node("manager_tool_node", manager_tool_node)
-
-manager_workflow.add_edge(START, "manager_assistant")
-manager_workflow.add_conditional_edges(
-    "manager_assistant",
-    should_continue,
-    {
-        "continue": "manager_tool_node",
-        "end": END,
-    },
-)
-manager_workflow.add_edge("manager_tool_node", "manager_assistant")
-
-manager_subagent = manager_workflow.compile(
-    name="manager_subagent",
-    checkpointer=checkpointer,
-    store=in_memory_store,
-)
+def build_manager_subagent():
+    """Build and compile the manager subagent graph (called once, on first use)."""
+    manager_workflow = StateGraph(ManagerState)
+
+    manager_workflow.add_node("manager_assistant", RunnableLambda(manager_assistance, afunc=amanager_assistance, name="manager_assistant"))
+    manager_workflow.add_node("manager_tool_node", manager_tool_node)
+    manager_workflow.add_node("compact_context", RunnableLambda(manager_context.compact, afunc=manager_context.acompact, name="compact_context"))
+
+    manager_workflow.add_edge(START, "compact_context")  # Bound the context once per turn
+    manager_workflow.add_edge("compact_context", "manager_assistant")
+    manager_workflow.add_conditional_edges(
+        "manager_assistant",
+        should_continue,
+        {
+            "continue": "manager_tool_node",
+            "end": END,
+        },
+    )
+    manager_workflow.add_edge("manager_tool_node", "manager_assistant")
+
+    manager_subagent = manager_workflow.compile(
+        name="manager_subagent",
+        checkpointer=get_checkpointer(),
+        store=get_long_term_store(),
+    )
+    return manager_subagent
+
+
+# Compiled on first use (or by the startup warmup) instead of at import time.
+manager_subagent_resource = Lazy(build_manager_subagent, "manager_subagent")
+get_manager_subagent = manager_subagent_resource.get
+
+
+def __getattr__(name):
+    # Backwards compatible `from manager.manager_subagent import manager_subagent` (builds on access)
+    if name == "manager_subagent":
+        return get_manager_subagent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # -------------------------------------------------------------------
 # 7️⃣ Visualize and test the subagent
 # -------------------------------------------------------------------
-show_graph(manager_subagent)
 
 if __name__ == "__main__":
-    thread_id = uuid.uuid4()
+    show_graph(get_manager_subagent())  # Rendering is on demand only (it may call a remote Mermaid service)
+
+    thread_id = str(uuid.uuid4())
     query = "Show all my assigned tickets and add a note to INC00321."
     config = {"configurable": {"thread_id": thread_id}}
 
-    result = manager_subagent.invoke(
+    result = get_manager_subagent().invoke(
         {"messages": [HumanMessage(content=query)]},
         config=config
     )
@@ -1,14 +1,16 @@
 import os
 import json
+import asyncio
 import datetime
-import requests
-from requests.auth import HTTPBasicAuth
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 
-from openai import OpenAI
+from incident_mirror import get_incident_mirror
+from .ticket_formatting import top_recent_tickets, render_tickets_markdown, render_tickets_adaptive_card, summary_prompt
+from utils import async_tool
+from startup import get_chat_model
 
 
 # Load environment variables
@@ -24,16 +26,12 @@ SNOW_USER = os.getenv("SNOW_USER")
 SNOW_PASS = os.getenv("SNOW_PASS")
 SNOW_API = f"{SNOW_INSTANCE}/api/now/table/incident"
 
-# Initialize ServiceNow client
-snow_client = requests.Session()
-snow_client.auth = HTTPBasicAuth(SNOW_USER, SNOW_PASS)
+# ServiceNow calls go through the shared pooled client (servicenow_client.py)
 
 # Initialize LLM
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
-
-open_ai_client = OpenAI(api_key=api_key)
+# Chat models are shared and rate limited (startup.get_chat_model / llm_registry)
 model = "gpt-4.1-mini"
 
 
@@ -52,76 +50,65 @@ def send_email_report(to_email, file_path, subject="Report"):
     pass
 
 
-def fetch_tickets() -> list:
-    """Fetches up to 50 active tickets from ServiceNow, saves locally to tickets.json, and returns the list."""
-    params = {
-        "sysparm_query": "active=true^stateNOT IN6,7,8^ORDERBYDESCsys_created_on",
-        "sysparm_fields": "number,short_description,priority,sys_created_on,caller_id.name,state,description,sla_due",
-        "sysparm_display_value": "true",
-        "sysparm_limit": 50
-    }
-    response = snow_client.get(f"{SNOW_INSTANCE}/api/now/table/incident", params=params)
-    result = response.json().get('result', [])
+async def fetch_tickets() -> list:
+    """Fetches up to 50 active tickets (local incident mirror), saves locally to tickets.json, and returns the list."""
+    result = await get_incident_mirror().query(
+        "active = 'true' AND state NOT IN ('6', '7', '8')",
+        order_by="sys_created_on DESC",
+        limit=50,
+        fields=("number", "short_description", "priority", "sys_created_on", "caller_id.name", "state",
+                "description", "sla_due", "assignment_group", "assigned_to"),
+        display=True,
+    )
     with open("tickets.json", "w", encoding="utf-8") as f:
         json.dump(result, f, indent=4, ensure_ascii=False)
     return result
 
 
-@tool("show_tickets")
-def show_tickets(user_input: str, mail: str) -> str:
-    """Displays top 5 open tickets sorted by creation date in chatbot-friendly Markdown format."""
+@async_tool("show_tickets", response_format="content_and_artifact")
+async def show_tickets(user_input: str, mail: str, include_summary: bool = False) -> tuple:
+    """
+    Displays top 5 open tickets sorted by creation date in chatbot-friendly Markdown format.
+    Set include_summary=True only when the manager asks for an overview or analysis.
+    """
+    # The Markdown goes to the model; the Adaptive Card rides along as the tool
+    # artifact and is sent by the Teams handler (streaming.py "card" events)
     try:
-        ticket_data = fetch_tickets()
-        number = len(ticket_data)
-
-        prompt = f"""
-        You have to show the top five most recent tickets from the {ticket_data}, sorted by sys_created_on (newest first).
-        If more than five open tickets exist, show only the five most recent. Otherwise, show all.
-        The ServiceNow instance is {SNOW_INSTANCE}.
-
-        Include:
-        - Ticket ID, Description, Priority, Age (in hours), SLA Due
-        - Assigned Group, Assigned Engineer, Caller
-        - Link to the ServiceNow instance
-
-        Format the output as a Markdown table like this:
-        | Ticket ID | Description | Priority | Age | SLA Due | Assigned Group | Assigned To | Caller |
-        |-----------|-------------|----------|-----|---------|----------------|-------------|--------|
-        📊 [View All {number} Tickets in ServiceNow](https://{SNOW_INSTANCE}/nav_to.do?uri=incident_list.do)
-        """
-
-        response = open_ai_client.chat.completions.create(
-            model=model,
-            messages=[{'role': 'user', 'content': prompt}],
-            temperature=0
-        )
+        ticket_data = await fetch_tickets()
+        rows = top_recent_tickets(ticket_data, limit=5)
+        table = render_tickets_markdown(rows, len(ticket_data), SNOW_INSTANCE)
 
-        output = remove_think_tags(response.choices[0].message.content)
-        bot_message = output
+        summary = None
+        if include_summary and rows:
+            response = await get_chat_model(model, 0).ainvoke(summary_prompt(rows, len(ticket_data)))
+            summary = remove_think_tags(response.content).strip()
 
-        return bot_message
+        card = render_tickets_adaptive_card(rows, len(ticket_data), SNOW_INSTANCE, summary)
+        return (f"{summary}\n\n{table}" if summary else table), card
 
     except Exception as e:
-        return f"⚠️ Error displaying tickets: {e}"
+        return f"⚠️ Error displaying tickets: {e}", None
+
+
 
+async def afetch_individual_ticket(ticket_number: str) -> dict:
+    """Fetches details of a specific ServiceNow ticket by ticket number (local incident mirror)."""
+    return await get_incident_mirror().get(
+        ticket_number,
+        fields=("number", "short_description", "priority", "sys_created_on", "caller_id.name", "state",
+                "description", "sla_due"),
+        display=True,
+    )
 
 
-def fetch_individual_ticket(ticket_number: str) -> dict:
-    """Fetches details of a specific ServiceNow ticket by ticket number."""
-    params = {
-        "sysparm_query": f"number={ticket_number}",
-        "sysparm_fields": "number,short_description,priority,sys_created_on,caller_id.name,state,description,sla_due",
-        "sysparm_display_value": "true"
-    }
-    response = snow_client.get(f"{SNOW_INSTANCE}/api/now/table/incident", params=params)
-    result = response.json().get('result', [])
-    return result[0] if result else None
+# Exposed to the agent as a tool as well
+fetch_individual_ticket = async_tool("fetch_individual_ticket")(afetch_individual_ticket)
 
 
-@tool("show_individual_ticket")
-def show_individual_ticket(user_input: str, ticket_number: str,mail: str) -> str:
+@async_tool("show_individual_ticket")
+async def show_individual_ticket(user_input: str, ticket_number: str,mail: str) -> str:
     """Shows a detailed, formatted view of an individual ServiceNow ticket."""
-    ticket = fetch_individual_ticket(ticket_number)
+    ticket = await afetch_individual_ticket(ticket_number)
     if not ticket:
         return f"⚠️ No ticket found for {ticket_number}."
 
@@ -140,13 +127,9 @@ def show_individual_ticket(user_input: str, ticket_number: str,mail: str) -> str
     - Direct link: {SNOW_INSTANCE}/nav_to.do?uri=incident.do?sys_id={ticket_number}
     """
 
-    response = open_ai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
+    response = await get_chat_model(model, 0).ainvoke(prompt)
 
-    output = remove_think_tags(response.choices[0].message.content)
+    output = remove_think_tags(response.content)
     bot_message = output
 
     return bot_message
@@ -160,22 +143,17 @@ from datetime import datetime
 # -------------------------------------------------------
 # 1️⃣ Fetch Recent Incidents (compact, limited response)
 # -------------------------------------------------------
-@tool("fetch_recent_incidents_tool", return_direct=True)
-def fetch_recent_incidents_tool(limit: int = 20) -> str:
+@async_tool("fetch_recent_incidents_tool", return_direct=True)
+async def fetch_recent_incidents_tool(limit: int = 20) -> str:
     """Fetch recent ServiceNow incidents (default 20). Returns JSON string."""
     try:
-        params = {
-            "sysparm_query": "ORDERBYDESCsys_created_on",
-            "sysparm_fields": (
-                "number,short_description,priority,"
-                "assignment_group.name,state,sys_created_on,caller_id.name"
-            ),
-            "sysparm_display_value": "true",
-            "sysparm_limit": str(limit)
-        }
-        response = snow_client.get(f"{SNOW_INSTANCE}/api/now/table/incident", params=params)
-        response.raise_for_status()
-        incidents = response.json().get("result", [])
+        incidents = await get_incident_mirror().query(
+            order_by="sys_created_on DESC",
+            limit=int(limit),
+            fields=("number", "short_description", "priority", "assignment_group.name", "state",
+                    "sys_created_on", "caller_id.name"),
+            display=True,
+        )
         return json.dumps(incidents, ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": f"Error fetching incidents: {e}"})
@@ -257,18 +235,18 @@ def save_html_report_tool(html_content: str) -> str:
 # -------------------------------------------------------
 # 4️⃣ Full Report Generation Pipeline
 # -------------------------------------------------------
-@tool("report_generation_tool", return_direct=True)
-def report_generation_tool(user_input: str, mail: str) -> str:
+@async_tool("report_generation_tool", return_direct=True)
+async def report_generation_tool(user_input: str, mail: str) -> str:
     """End-to-end pipeline: fetch → generate → save → email (optional)."""
     try:
         # Fetch and process data
-        incidents_json = fetch_recent_incidents_tool(limit=20)
-        html_report = generate_incident_report_tool(incidents_json)
-        file_path = save_html_report_tool(html_report)
+        incidents_json = await fetch_recent_incidents_tool.ainvoke({"limit": 20})
+        html_report = generate_incident_report_tool.invoke({"incident_data": incidents_json})
+        file_path = save_html_report_tool.invoke({"html_content": html_report})
 
         # Optional email dispatch
         if callable(globals().get("send_email_report")):
-            send_email_report(mail, file_path, subject="🧾 ServiceNow Incident Summary Report")
+            await asyncio.to_thread(send_email_report, mail, file_path, subject="🧾 ServiceNow Incident Summary Report")
 
         return (
             f"✅ **Report generated successfully!**\n\n"
@@ -0,0 +1,146 @@
+# ticket_formatting.py — Deterministic ticket tables for the manager tools
+#
+# Sorting, age computation, top-N selection and rendering (Markdown for chat,
+# Adaptive Card for Teams) happen here in Python, so listing tickets needs no LLM
+# call and can never show a row that ServiceNow did not return.
+import os
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+
+# Timezone the instance reports display values in (sysparm_display_value=true)
+SNOW_TIMEZONE = ZoneInfo(os.getenv("SNOW_TIMEZONE", "UTC"))
+SNOW_DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d-%m-%Y %H:%M:%S", "%m-%d-%Y %H:%M:%S")
+
+TABLE_COLUMNS = [
+    ("Ticket ID", "number"),
+    ("Description", "short_description"),
+    ("Priority", "priority"),
+    ("Age", "age"),
+    ("SLA Due", "sla_due"),
+    ("Assigned Group", "assignment_group"),
+    ("Assigned To", "assigned_to"),
+    ("Caller", "caller_id.name"),
+]
+
+
+def parse_snow_datetime(value):
+    """Parse a ServiceNow date-time string into an aware datetime, or None."""
+    if not value or not isinstance(value, str):
+        return None
+    for fmt in SNOW_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).replace(tzinfo=SNOW_TIMEZONE)
+        except ValueError:
+            continue
+    return None
+
+
+def ticket_age_hours(ticket, now=None):
+    created = parse_snow_datetime(ticket.get("sys_created_on"))
+    if created is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (now - created).total_seconds() / 3600)
+
+
+def _display(value):
+    """Reference fields come back as {'display_value': ...} or plain strings."""
+    if isinstance(value, dict):
+        value = value.get("display_value") or value.get("name") or value.get("value")
+    return str(value).strip() if value not in (None, "") else "—"
+
+
+def top_recent_tickets(tickets, limit=5, now=None):
+    """
+    Newest `limit` tickets (by sys_created_on) as flat rows with an 'age' column.
+    Tickets without a readable creation date sort last.
+    """
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    ordered = sorted(
+        tickets,
+        key=lambda t: parse_snow_datetime(t.get("sys_created_on")) or oldest,
+        reverse=True,
+    )
+
+    rows = []
+    for ticket in ordered[:limit]:
+        age = ticket_age_hours(ticket, now)
+        row = {key: _display(ticket.get(key)) for _, key in TABLE_COLUMNS if key != "age"}
+        row["age"] = f"{age:.1f} h" if age is not None else "—"
+        row["sys_created_on"] = _display(ticket.get("sys_created_on"))
+        rows.append(row)
+    return rows
+
+
+def ticket_url(instance, number):
+    return f"{instance}/nav_to.do?uri=incident.do?sysparm_query=number={number}"
+
+
+def ticket_list_url(instance):
+    return f"{instance}/nav_to.do?uri=incident_list.do"
+
+
+def _md_cell(value):
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def render_tickets_markdown(rows, total, instance):
+    """Markdown table with a link per ticket and a link to the full list."""
+    header = "| " + " | ".join(title for title, _ in TABLE_COLUMNS) + " |"
+    divider = "|" + "|".join("-" * (len(title) + 2) for title, _ in TABLE_COLUMNS) + "|"
+    lines = [header, divider]
+
+    for row in rows:
+        cells = []
+        for _, key in TABLE_COLUMNS:
+            if key == "number":
+                cells.append(f"[{row['number']}]({ticket_url(instance, row['number'])})")
+            else:
+                cells.append(_md_cell(row[key]))
+        lines.append("| " + " | ".join(cells) + " |")
+
+    if not rows:
+        lines.append("| " + " | ".join(["—"] * len(TABLE_COLUMNS)) + " |")
+
+    lines.append("")
+    lines.append(f"📊 [View All {total} Tickets in ServiceNow]({ticket_list_url(instance)})")
+    return "\n".join(lines)
+
+
+def render_tickets_adaptive_card(rows, total, instance, summary=None):
+    """Adaptive Card (schema 1.5) with one fact block per ticket, for Teams."""
+    body = [{"type": "TextBlock", "text": f"Most recent open tickets ({len(rows)} of {total})", "weight": "Bolder", "size": "Medium"}]
+    if summary:
+        body.append({"type": "TextBlock", "text": summary, "wrap": True, "spacing": "Small"})
+
+    for row in rows:
+        body.append({
+            "type": "Container",
+            "separator": True,
+            "items": [
+                {"type": "TextBlock", "text": f"[{row['number']}]({ticket_url(instance, row['number'])}) — {row['short_description']}", "wrap": True, "weight": "Bolder"},
+                {"type": "FactSet", "facts": [
+                    {"title": title, "value": row[key]}
+                    for title, key in TABLE_COLUMNS if key not in ("number", "short_description")
+                ]},
+            ],
+        })
+
+    return {
+        "type": "AdaptiveCard",
+        "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+        "version": "1.5",
+        "body": body,
+        "actions": [{"type": "Action.OpenUrl", "title": f"View all {total} tickets", "url": ticket_list_url(instance)}],
+    }
+
+
+def summary_prompt(rows, total):
+    """Compact prompt for the optional narrative summary (only the rows shown, few fields)."""
+    lines = [f"- {r['number']}: {r['short_description']} | {r['priority']} | {r['age']} old | {r['assigned_to']}" for r in rows]
+    return (
+        f"There are {total} open ServiceNow tickets; the newest are:\n" + "\n".join(lines) +
+        "\n\nWrite a 2-3 sentence summary for an IT manager (urgency, patterns, unassigned work). "
+        "Do not list the tickets again and do not invent facts."
+    )
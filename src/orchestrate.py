@@ -1,14 +1,16 @@
+import startup  # First import: marks the start of the cold-start measurement
+import sys
 import uuid
 from langchain_core.messages import HumanMessage
-from engineer.engineer_subagent import engineer_subagent
-from manager.manager_subagent import manager_subagent
-from user.user_subagent import user_subagent
+from engineer.engineer_subagent import get_engineer_subagent
+from manager.manager_subagent import get_manager_subagent
+from user.user_subagent import get_user_subagent
 
 # Map agent types to their corresponding subagents
 AGENT_MAP = {
-    "engineer": engineer_subagent,
-    "manager": manager_subagent,
-    "user": user_subagent
+    "engineer": get_engineer_subagent,
+    "manager": get_manager_subagent,
+    "user": get_user_subagent
 }
 
 # Map emails to agent types
@@ -26,10 +28,10 @@ def run_session(agent_type: str, user_name: str, user_email: str):
     Runs an interactive session for the specified agent_type.
     The agent receives the user's email immediately.
     """
-    subagent = AGENT_MAP[agent_type]
+    subagent = AGENT_MAP[agent_type]()
 
     # Generate a unique thread ID for this session
-    thread_id = uuid.uuid4()
+    thread_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
 
     # First message to agent: provide user's email
@@ -60,6 +62,7 @@ def run_session(agent_type: str, user_name: str, user_email: str):
             message.pretty_print()
 
 def main():
+    startup.warmup_in_background()  # Graphs and clients build while the user logs in
     print("=== Login ===")
     name = input("Enter your name: ").strip()
     email = input("Enter your email: ").strip()
@@ -73,6 +76,8 @@ def main():
     run_session(agent_type,name,email)
 
 if __name__ == "__main__":
+    if startup.profile_requested():
+        sys.exit(startup.profile_startup())
     main()
 
 
@@ -0,0 +1,57 @@
+# prompt_assembly.py — Cache-friendly system prompts for the assistant nodes
+#
+# The assistant prompts used to be rebuilt as one f-string per LLM step with the
+# saved preferences (memory) in the middle, so no two users, and no two turns after a
+# preference change, shared a prompt prefix and OpenAI's prompt caching never applied.
+# An AssistantPrompt is compiled once per role and lays the request out as:
+#
+#   [static system prompt]  role, actions, guidelines: byte-identical on every call
+#   [rolling summary]       changes only when the conversation is compacted
+#   [history …]             append-only between compactions
+#   [context]               variable parts (memory), from a template compiled at import
+#
+# so everything up to the newest messages is a stable prefix (the bound tool schemas,
+# sent ahead of the messages, are stable too). The provider's cached-token count comes
+# back in the usage metadata; record_cache_usage() logs the ratio per call and
+# llm_metrics totals it per model (GET /metrics/llm).
+#
+# Prompt caching starts at 1024 prompt tokens and only on models that support it
+# (gpt-4o and later); on others the ratio stays at 0.
+import hashlib
+from string import Template
+from textwrap import dedent
+
+from langchain_core.messages import SystemMessage
+
+
+class AssistantPrompt:
+    """Static system prompt (built once) plus a context template appended after the history."""
+
+    def __init__(self, role, static, context):
+        self.role = role
+        self.static = dedent(static).strip()
+        self.system_message = SystemMessage(self.static)
+        self.context_template = Template(dedent(context).strip())
+        # Changes only when the static text does, i.e. when the cached prefix is invalidated
+        self.fingerprint = hashlib.sha256(self.static.encode("utf-8")).hexdigest()[:12]
+
+    def context_message(self, state):
+        return SystemMessage(self.context_template.substitute(memory=state.get("loaded_memory", "None")))
+
+    def messages(self, compactor, state):
+        """Prompt for one step: static prefix, summary and history (within budget), then the context."""
+        return compactor.prompt_messages(self.system_message, state, tail=[self.context_message(state)])
+
+
+def cache_usage(response):
+    """(prompt tokens, cached prompt tokens) of a model response; (0, 0) without usage data."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0), (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+
+def record_cache_usage(prompt, response):
+    """Log the cached share of the prompt of one call."""
+    prompt_tokens, cached = cache_usage(response)
+    if prompt_tokens:
+        print(f"🧊 {prompt.role} prompt {prompt.fingerprint}: {prompt_tokens} tokens, "
+              f"{cached} cached ({cached / prompt_tokens:.0%})")
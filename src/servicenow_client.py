@@ -0,0 +1,227 @@
+# servicenow_client.py — Shared, pooled async client for the ServiceNow Table API
+#
+# Every ServiceNow call made by the user, engineer and manager tools goes through here:
+#   - one keep-alive connection pool per (event loop, host), bounded per host
+#   - connect/read timeouts in seconds rather than minutes
+#   - idempotent GETs retried with exponential backoff on transport errors,
+#     429 and 5xx gateway errors (Retry-After is honoured)
+#   - a metrics hook: every request reports (table, verb, status, latency) and the
+#     built-in recorder keeps a latency histogram per table and verb
+#
+# Configuration (environment):
+#   SNOW_CONNECT_TIMEOUT   → seconds to open a connection (default 5)
+#   SNOW_READ_TIMEOUT      → seconds to wait for a response (default 30)
+#   SNOW_POOL_TIMEOUT      → seconds to wait for a free pooled connection (default 10)
+#   SNOW_MAX_CONNECTIONS   → connections per host (default 20)
+#   SNOW_MAX_KEEPALIVE     → idle keep-alive connections per host (default 10)
+#   SNOW_GET_RETRIES       → retries for GET requests (default 3)
+#   SNOW_VERIFY_SSL        → verify TLS certificates (default true; the tools used to call
+#                            with verify=False, set "false" for instances with self-signed certificates)
+import os
+import re
+import time
+import random
+import asyncio
+import bisect
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env", override=True)
+
+SNOW_USER = os.getenv("SNOW_USER")
+SNOW_PASS = os.getenv("SNOW_PASS")
+SNOW_VERIFY_SSL = os.getenv("SNOW_VERIFY_SSL", "true").lower() not in ("0", "false", "no")
+
+SNOW_CONNECT_TIMEOUT = float(os.getenv("SNOW_CONNECT_TIMEOUT", "5"))
+SNOW_READ_TIMEOUT = float(os.getenv("SNOW_READ_TIMEOUT", "30"))
+SNOW_POOL_TIMEOUT = float(os.getenv("SNOW_POOL_TIMEOUT", "10"))
+SNOW_MAX_CONNECTIONS = int(os.getenv("SNOW_MAX_CONNECTIONS", "20"))
+SNOW_MAX_KEEPALIVE = int(os.getenv("SNOW_MAX_KEEPALIVE", "10"))
+SNOW_GET_RETRIES = int(os.getenv("SNOW_GET_RETRIES", "3"))
+SNOW_BACKOFF_BASE = 0.5         # Seconds; doubled on every retry
+SNOW_BACKOFF_MAX = 8.0
+
+RETRY_STATUSES = {429, 502, 503, 504}
+TABLE_PATTERN = re.compile(r"/api/now/(?:v\d+/)?table/([^/?]+)")
+
+# Errors raised by the helpers below (connection failures, timeouts, raise_for_status)
+SnowRequestError = httpx.HTTPError
+
+
+# ---------------------------------------------------
+# 📊 Metrics
+# ---------------------------------------------------
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Upper bounds, seconds
+
+
+class SnowMetrics:
+    """Latency histogram per (table, verb), plus status and retry counters."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, table, verb, status, latency, attempt):
+        with self._lock:
+            series = self._series.get((table, verb))
+            if series is None:
+                series = self._series[(table, verb)] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(self.buckets) + 1),  # Last bucket is +Inf
+                    "statuses": {},
+                    "retries": 0,
+                }
+            series["count"] += 1
+            series["sum"] += latency
+            series["buckets"][bisect.bisect_left(self.buckets, latency)] += 1
+            series["statuses"][status] = series["statuses"].get(status, 0) + 1
+            if attempt:
+                series["retries"] += 1
+
+    def snapshot(self):
+        """{'table VERB': {count, avg, buckets {le: n}, statuses, retries}}"""
+        with self._lock:
+            result = {}
+            for (table, verb), s in sorted(self._series.items()):
+                labels = [str(b) for b in self.buckets] + ["+Inf"]
+                result[f"{table} {verb}"] = {
+                    "count": s["count"],
+                    "avg": s["sum"] / s["count"] if s["count"] else 0.0,
+                    "buckets": dict(zip(labels, s["buckets"])),
+                    "statuses": dict(s["statuses"]),
+                    "retries": s["retries"],
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+snow_metrics = SnowMetrics()
+_metrics_hooks = [snow_metrics.record]
+
+
+def add_metrics_hook(hook):
+    """
+    Register hook(table, verb, status, latency_seconds, attempt) called after every
+    request attempt; status is the HTTP status code or the exception class name.
+    """
+    _metrics_hooks.append(hook)
+    return hook
+
+
+def remove_metrics_hook(hook):
+    if hook in _metrics_hooks:
+        _metrics_hooks.remove(hook)
+
+
+def _emit_metrics(table, verb, status, latency, attempt):
+    for hook in list(_metrics_hooks):
+        try:
+            hook(table, verb, status, latency, attempt)
+        except Exception as e:  # A broken exporter must never break a tool call
+            print(f"⚠️ ServiceNow metrics hook failed: {e}")
+
+
+def table_of(url: str) -> str:
+    match = TABLE_PATTERN.search(urlsplit(str(url)).path)
+    return match.group(1) if match else "other"
+
+
+# ---------------------------------------------------
+# 🔌 Connection pools
+# ---------------------------------------------------
+# httpx connections belong to the event loop that opened them, so each loop
+# (the server loop, the background loop used by sync callers) gets its own pools,
+# and each ServiceNow host gets its own bounded pool.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        auth=(SNOW_USER or "", SNOW_PASS or ""),
+        headers={"Accept": "application/json"},
+        timeout=httpx.Timeout(
+            connect=SNOW_CONNECT_TIMEOUT, read=SNOW_READ_TIMEOUT,
+            write=SNOW_READ_TIMEOUT, pool=SNOW_POOL_TIMEOUT,
+        ),
+        limits=httpx.Limits(max_connections=SNOW_MAX_CONNECTIONS, max_keepalive_connections=SNOW_MAX_KEEPALIVE),
+        verify=SNOW_VERIFY_SSL,
+    )
+
+
+def get_client(url: str = "") -> httpx.AsyncClient:
+    """Pooled keep-alive client for the running event loop and the host of `url`."""
+    host = urlsplit(str(url)).netloc
+    per_loop = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = per_loop.get(host)
+    if client is None or client.is_closed:
+        client = per_loop[host] = _new_client()
+    return client
+
+
+def _retry_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.replace(".", "", 1).isdigit():
+            return min(float(retry_after), SNOW_BACKOFF_MAX)
+    delay = SNOW_BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25)
+    return min(delay, SNOW_BACKOFF_MAX)
+
+
+async def snow_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared pool. GETs are retried on transport errors
+    and retryable statuses; writes are sent exactly once.
+    """
+    verb = method.upper()
+    table = table_of(url)
+    retries = SNOW_GET_RETRIES if verb == "GET" else 0
+    client = get_client(url)
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = await client.request(verb, url, **kwargs)
+        except httpx.TransportError as e:
+            _emit_metrics(table, verb, type(e).__name__, time.perf_counter() - started, attempt)
+            if attempt == retries:
+                raise
+            delay = _retry_delay(attempt)
+            print(f"⚠️ ServiceNow {verb} {table} failed ({type(e).__name__}); retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+
+        _emit_metrics(table, verb, response.status_code, time.perf_counter() - started, attempt)
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            delay = _retry_delay(attempt, response)
+            print(f"⚠️ ServiceNow {verb} {table} returned {response.status_code}; retrying in {delay:.1f}s...")
+            await response.aclose()
+            await asyncio.sleep(delay)
+            continue
+        return response
+
+
+async def snow_get(url: str, **kwargs) -> httpx.Response:
+    return await snow_request("GET", url, **kwargs)
+
+
+async def snow_post(url: str, **kwargs) -> httpx.Response:
+    return await snow_request("POST", url, **kwargs)
+
+
+async def snow_patch(url: str, **kwargs) -> httpx.Response:
+    return await snow_request("PATCH", url, **kwargs)
+
+
+async def aclose_client():
+    """Close the pools of the running loop (call on server shutdown)."""
+    for client in _clients.pop(asyncio.get_running_loop(), {}).values():
+        await client.aclose()
@@ -0,0 +1,356 @@
+# session_store.py — Bounded, optionally durable session and checkpoint backends
+#
+# Chat front ends (app.py for Teams, bot_app.py for the web UI) keep one session per
+# conversation: which agent it talks to and the LangGraph thread_id. The subagent
+# graphs keep the conversation itself in a LangGraph checkpointer keyed by that
+# thread_id. Both used to live in process memory forever; here they are bounded:
+#
+#   - idle TTL: sessions not touched for SESSION_TTL seconds are evicted
+#   - LRU cap:  at most SESSION_MAX sessions; the least recently used go first
+#   - evicting a session also deletes its checkpoint thread, so memory stays flat
+#
+# Backends (SESSION_BACKEND):
+#   memory → per-process dicts + MemorySaver (default; nothing survives a restart)
+#   sqlite → one SQLite file (SESSION_DB) for sessions, checkpoints and the long-term
+#            store; survives restarts and is shared by several uvicorn workers on one box
+#
+# Configuration (environment):
+#   SESSION_BACKEND  → "memory" (default) or "sqlite"
+#   SESSION_DB       → SQLite path (default data/sessions.sqlite)
+#   SESSION_TTL      → idle seconds before a session is evicted (default 86400)
+#   SESSION_MAX      → max sessions per namespace (default 1000)
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB = os.getenv("SESSION_DB", "data/sessions.sqlite")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+
+# Long-term store namespace (with the thread id) for tool payloads cut by context compaction
+TOOL_PAYLOAD_NAMESPACE = "tool_payloads"
+
+
+# ---------------------------------------------------
+# 🗂️ Session stores
+# ---------------------------------------------------
+class SessionStore(ABC):
+    """
+    Interface for conversation sessions. Values are JSON-serializable dicts.
+    Callbacks registered with on_evict(callback) receive (key, value) for every
+    session dropped by the TTL or the LRU cap (not for explicit deletes).
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._evict_callbacks = []
+
+    def on_evict(self, callback):
+        self._evict_callbacks.append(callback)
+        return callback
+
+    def _evicted(self, items):
+        for key, value in items:
+            for callback in self._evict_callbacks:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    print(f"⚠️ Session eviction callback failed for {key}: {e}")
+
+    @abstractmethod
+    def get(self, key):
+        """The session's value (refreshing its last access), or None."""
+
+    @abstractmethod
+    def put(self, key, value):
+        """Store or replace a session."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a session without calling the eviction callbacks."""
+
+    @abstractmethod
+    def evict(self):
+        """Drop idle and over-cap sessions; returns how many were evicted."""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of live sessions."""
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process store: an OrderedDict kept in least-recently-used order."""
+
+    def __init__(self, ttl_seconds=SESSION_TTL, max_sessions=SESSION_MAX):
+        super().__init__(ttl_seconds, max_sessions)
+        self._sessions = OrderedDict()  # key -> (last_access, value)
+        self._lock = threading.Lock()
+
+    def _collect_evictions(self, now):
+        evicted = []
+        # Oldest access first, so expired entries sit at the front
+        while self._sessions:
+            key, (last_access, value) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+            evicted.append((key, value))
+        return evicted
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl_seconds:
+                del self._sessions[key]
+                evicted = [(key, entry[1])]
+                value = None
+            else:
+                self._sessions[key] = (now, entry[1])
+                self._sessions.move_to_end(key)
+                return entry[1]
+        self._evicted(evicted)
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._sessions[key] = (now, value)
+            self._sessions.move_to_end(key)
+            evicted = self._collect_evictions(now)
+        self._evicted(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            return self._sessions.pop(key, None) is not None
+
+    def evict(self):
+        with self._lock:
+            evicted = self._collect_evictions(time.time())
+        self._evicted(evicted)
+        return len(evicted)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    File-backed store shared by every process that opens the same database.
+    `namespace` keeps independent front ends (Teams, web UI) apart in one file.
+    """
+
+    def __init__(self, path=SESSION_DB, namespace="default", ttl_seconds=SESSION_TTL, max_sessions=SESSION_MAX):
+        super().__init__(ttl_seconds, max_sessions)
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()  # sqlite connections are per thread
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, last_access REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (namespace, last_access)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _collect_evictions(self, conn, now):
+        rows = conn.execute(
+            "SELECT key, value FROM sessions WHERE namespace = ? AND last_access < ?",
+            (self.namespace, now - self.ttl_seconds),
+        ).fetchall()
+        count = conn.execute("SELECT COUNT(*) FROM sessions WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        overflow = count - len(rows) - self.max_sessions
+        if overflow > 0:
+            rows += conn.execute(
+                "SELECT key, value FROM sessions WHERE namespace = ? AND last_access >= ? "
+                "ORDER BY last_access LIMIT ?",
+                (self.namespace, now - self.ttl_seconds, overflow),
+            ).fetchall()
+        conn.executemany("DELETE FROM sessions WHERE namespace = ? AND key = ?", [(self.namespace, k) for k, _ in rows])
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, last_access FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key))
+                evicted = [(key, json.loads(row[0]))]
+            else:
+                conn.execute(
+                    "UPDATE sessions SET last_access = ? WHERE namespace = ? AND key = ?", (now, self.namespace, key)
+                )
+                return json.loads(row[0])
+        self._evicted(evicted)
+        return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, key, value, last_access) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now),
+            )
+            evicted = self._collect_evictions(conn, now)
+        self._evicted(evicted)
+
+    def delete(self, key):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key))
+        return cursor.rowcount > 0
+
+    def evict(self):
+        with self._connect() as conn:
+            evicted = self._collect_evictions(conn, time.time())
+        self._evicted(evicted)
+        return len(evicted)
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+
+# ---------------------------------------------------
+# 🧠 LangGraph checkpointer / long-term store
+# ---------------------------------------------------
+def _threaded_async(cls):
+    """
+    The sqlite checkpointer/store only implement the sync API; run it in worker
+    threads for ainvoke/astream. Their connection is shared and guarded by a lock.
+    """
+    if hasattr(cls, "get_tuple"):
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+        methods = dict(aget_tuple=aget_tuple, alist=alist, aput=aput, aput_writes=aput_writes, adelete_thread=adelete_thread)
+    else:
+        async def abatch(self, ops):
+            return await asyncio.to_thread(self.batch, list(ops))
+
+        methods = dict(abatch=abatch)
+    return type(f"Threaded{cls.__name__}", (cls,), methods)
+
+
+_checkpointer = None
+_long_term_store = None
+_backend_lock = threading.Lock()
+
+
+def _sqlite_connection(**kwargs):
+    """
+    A connection to SESSION_DB for one backend. SqliteSaver and SqliteStore each
+    serialize on their own lock and manage transactions differently (implicit vs
+    explicit BEGIN), so they must not share a connection; WAL lets both write the file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(SESSION_DB)), exist_ok=True)
+    conn = sqlite3.connect(SESSION_DB, check_same_thread=False, timeout=10, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def get_checkpointer():
+    """Process-wide LangGraph checkpointer shared by all subagents (thread ids are unique)."""
+    global _checkpointer
+    with _backend_lock:
+        if _checkpointer is None:
+            if SESSION_BACKEND == "sqlite":
+                from langgraph.checkpoint.sqlite import SqliteSaver
+
+                _checkpointer = _threaded_async(SqliteSaver)(_sqlite_connection())
+                _checkpointer.setup()
+            else:
+                from langgraph.checkpoint.memory import MemorySaver
+
+                _checkpointer = MemorySaver()
+    return _checkpointer
+
+
+def get_long_term_store():
+    """Process-wide LangGraph store (long-term memory) for the configured backend."""
+    global _long_term_store
+    with _backend_lock:
+        if _long_term_store is None:
+            if SESSION_BACKEND == "sqlite":
+                from langgraph.store.sqlite import SqliteStore
+
+                _long_term_store = _threaded_async(SqliteStore)(_sqlite_connection(isolation_level=None))  # Autocommit, as SqliteStore expects
+                _long_term_store.setup()
+            else:
+                from langgraph.store.memory import InMemoryStore
+
+                _long_term_store = InMemoryStore()
+    return _long_term_store
+
+
+def forget_thread(thread_id):
+    """Delete a conversation's checkpoints and stored tool payloads (called when its session is evicted)."""
+    get_checkpointer().delete_thread(str(thread_id))
+
+    store = get_long_term_store()
+    namespace = (TOOL_PAYLOAD_NAMESPACE, str(thread_id))
+    while True:
+        items = store.search(namespace, limit=100)
+        if not items:
+            break
+        for item in items:
+            store.delete(namespace, item.key)
+
+
+def get_session_store(namespace):
+    """
+    Session store for one front end, configured from the environment. Evicted
+    sessions take their checkpoint thread with them.
+    """
+    if SESSION_BACKEND == "sqlite":
+        store = SQLiteSessionStore(SESSION_DB, namespace=namespace)
+    else:
+        store = InMemorySessionStore()
+
+    @store.on_evict
+    def _drop_checkpoints(key, value):
+        if value.get("thread_id"):
+            forget_thread(value["thread_id"])
+
+    return store
@@ -0,0 +1,170 @@
+# startup.py — Lazy initialization layer and cold-start profiling
+#
+# Expensive objects (compiled subagent graphs, LLM clients, FAISS knowledge bases)
+# are wrapped in Lazy resources: nothing is built at import time, each resource is
+# built once on first use (thread-safe) or ahead of time by a background warmup.
+#
+# Entry points import this module first so PROCESS_T0 marks the start of their
+# imports; run any of them with --profile-startup to print the cold-start report:
+#   python orchestrate.py --profile-startup
+#   python bot_app.py --profile-startup
+#
+# Configuration (environment):
+#   STARTUP_BUDGET_SECONDS → cold-start budget checked by --profile-startup (default 3)
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+PROCESS_T0 = time.perf_counter()
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+
+_timings = OrderedDict()  # Resource name -> seconds spent building it
+_registry = OrderedDict()  # Resource name -> Lazy
+_timings_lock = threading.Lock()
+
+
+class Lazy:
+    """A value built by `factory()` on first get(); later calls return the same object."""
+
+    _UNSET = object()
+
+    def __init__(self, factory, name):
+        self.factory = factory
+        self.name = name
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    @property
+    def ready(self):
+        return self._value is not self._UNSET
+
+    def get(self):
+        if self._value is self._UNSET:
+            with self._lock:
+                if self._value is self._UNSET:
+                    started = time.perf_counter()
+                    value = self.factory()
+                    record_timing(self.name, time.perf_counter() - started)
+                    self._value = value
+        return self._value
+
+    __call__ = get
+
+    def reset(self):
+        with self._lock:
+            self._value = self._UNSET
+
+
+def lazy(name):
+    """Decorator: turn a zero-argument factory into a Lazy resource."""
+    def decorator(factory):
+        return Lazy(factory, name)
+    return decorator
+
+
+def record_timing(name, seconds):
+    with _timings_lock:
+        _timings[name] = seconds
+
+
+def startup_timings():
+    with _timings_lock:
+        return dict(_timings)
+
+
+# ---------------------------------------------------
+# 🤖 Shared chat models
+# ---------------------------------------------------
+_chat_models = {}
+_chat_models_lock = threading.Lock()
+
+
+def get_chat_model(model_name="gpt-4", temperature=0, **kwargs):
+    """
+    One chat client (and connection pool) per configuration, created on first use.
+    Calls are admitted by the model's concurrency / rate limits (llm_registry).
+    """
+    key = (model_name, temperature, tuple(sorted(kwargs.items())))
+    model = _chat_models.get(key)
+    if model is None:
+        with _chat_models_lock:
+            model = _chat_models.get(key)
+            if model is None:
+                from llm_registry import LimitedChatOpenAI
+
+                started = time.perf_counter()
+                kwargs.setdefault("stream_usage", True)  # Token metrics for streamed replies too
+                model = LimitedChatOpenAI(model=model_name, temperature=temperature, **kwargs)
+                record_timing(f"chat_model:{model_name}", time.perf_counter() - started)
+                _chat_models[key] = model
+    return model
+
+
+# ---------------------------------------------------
+# 🔥 Warmup
+# ---------------------------------------------------
+def _warm(resources):
+    for resource in resources:
+        try:
+            resource.get()
+        except Exception as e:  # Warmup is best effort; the request path retries on first use
+            print(f"⚠️ Warmup of '{resource.name}' failed: {e}")
+
+
+def warmup_in_background(*resources):
+    """Build resources (default: all registered) on a daemon thread; returns the thread."""
+    resources = resources or tuple(_registry.values())
+    thread = threading.Thread(target=_warm, args=(resources,), name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+async def warmup_async(*resources):
+    """Same as warmup_in_background, awaitable from an event loop (e.g. a startup hook)."""
+    resources = resources or tuple(_registry.values())
+    await asyncio.to_thread(_warm, resources)
+
+
+# ---------------------------------------------------
+# ⏱️ --profile-startup
+# ---------------------------------------------------
+def profile_startup(budget=STARTUP_BUDGET_SECONDS):
+    """
+    Print the cold-start report: time spent importing the entry point (what every
+    process pays before it can serve), then the first-use cost of every lazy resource.
+    Returns a process exit code: 1 when the cold start exceeds the budget.
+    """
+    cold_start = time.perf_counter() - PROCESS_T0
+    print(f"⏱️ Cold start (imports until ready to serve): {cold_start:.2f}s (budget {budget:.2f}s)")
+
+    warmup_started = time.perf_counter()
+    for name, resource in _registry.items():
+        if resource.ready:
+            print(f"   ⚠️ {name} was built during import")
+            continue
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"   ❌ {name}: failed ({e})")
+
+    warmup = time.perf_counter() - warmup_started
+
+    print("⏱️ First-use cost of lazy resources (nested resources are included in their parent):")
+    for name, seconds in startup_timings().items():
+        print(f"   {name:<40} {seconds:7.2f}s")
+
+    print(f"⏱️ Cold start + full warmup: {cold_start + warmup:.2f}s")
+
+    if cold_start > budget:
+        print(f"❌ Cold start exceeds the {budget:.2f}s budget.")
+        return 1
+    print("✅ Cold start within budget.")
+    return 0
+
+
+def profile_requested():
+    return "--profile-startup" in sys.argv
@@ -0,0 +1,115 @@
+# streaming.py — Token and tool-progress streaming from the subagent graphs
+#
+# stream_turn() runs one turn with astream_events and yields small dict events the
+# front ends forward as they happen, instead of waiting for the whole ReAct loop:
+#
+#   {"type": "progress", "text": "Looking up INC0010018…", "tool": "check_status"}
+#   {"type": "token",    "text": "The ticket"}        # reply tokens of the assistant node
+#   {"type": "reset"}                                 # the tokens so far were a preamble to tool calls
+#   {"type": "card",     "card": {...}}               # an Adaptive Card a tool returned as its artifact
+#   {"type": "final",    "text": "..."}               # the turn's reply (always sent last)
+#   {"type": "error",    "text": "..."}
+#
+# Tokens are streamed as the model writes them, before it is known whether the step
+# ends in tool calls. When it does, "reset" tells the front end to drop the text
+# streamed so far; "final" always carries the whole reply to settle the message with.
+#
+# bot_app.py forwards them as Server-Sent Events (sse()) to the chat UI; app.py turns
+# them into progressive Teams messages.
+import re
+import json
+
+# Graph nodes whose model output is the reply; LLM calls inside tools or the
+# compaction summarizer are not streamed to the user
+ASSISTANT_NODES = ("user_assistant", "engineer_assistant", "manager_assistant")
+
+TICKET_PATTERN = re.compile(r"\b(?:INC|RITM|REQ|CHG|PRB)\d{5,}\b", re.IGNORECASE)
+
+# Tool name -> progress line; {tickets} is filled from the call's arguments
+TOOL_PROGRESS = {
+    "submit_ticket": "Creating your ticket…",
+    "check_status": "Looking up {tickets}…",
+    "add_comments": "Adding your comment to {tickets}…",
+    "submit_feedback": "Submitting your feedback…",
+    "ask_question": "Searching the knowledge base…",
+    "reopen_ticket": "Reopening {tickets}…",
+    "show_my_tickets": "Fetching your tickets…",
+    "close_ticket": "Closing {tickets}…",
+    "retrieve_or_generate_solution": "Looking for a solution…",
+    "show_assigned_tickets": "Fetching your assigned tickets…",
+    "get_ticket_details": "Looking up {tickets}…",
+    "get_ticket_history": "Reading the history of {tickets}…",
+    "add_technical_note": "Adding a note to {tickets}…",
+    "upload_ticket_resolution": "Uploading the resolution to {tickets}…",
+    "update_ticket_state": "Updating {tickets}…",
+    "generate_engineer_report_pdf": "Generating your report…",
+    "review_analytics": "Crunching your ticket analytics…",
+    "ai_troubleshooter": "Working out troubleshooting steps…",
+    "show_tickets": "Fetching open tickets…",
+    "show_individual_ticket": "Looking up {tickets}…",
+    "fetch_individual_ticket": "Looking up {tickets}…",
+    "fetch_recent_incidents_tool": "Fetching recent incidents…",
+    "generate_incident_report_tool": "Writing the incident report…",
+    "save_html_report_tool": "Saving the report…",
+}
+
+
+def tool_progress_text(name, args):
+    """Human-readable progress line for a tool call, naming the tickets involved."""
+    tickets = sorted({t.upper() for t in TICKET_PATTERN.findall(json.dumps(args, default=str))})
+    template = TOOL_PROGRESS.get(name, "Running " + name.replace("_", " ") + "…")
+    if "{tickets}" in template and not tickets:
+        return template.replace(" {tickets}", "").replace("{tickets}", "the ticket")
+    return template.format(tickets=", ".join(tickets[:3]) + (" and more" if len(tickets) > 3 else ""))
+
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+async def stream_turn(subagent, messages, config):
+    """Run one turn of `subagent` and yield progress, token and final events."""
+    final = None
+    streamed_runs = set()  # Assistant model calls whose text was streamed
+    try:
+        async for event in subagent.astream_events({"messages": messages}, config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if kind == "on_chat_model_stream" and node in ASSISTANT_NODES:
+                text = _content_text(event["data"]["chunk"].content)
+                if text:
+                    streamed_runs.add(event["run_id"])
+                    yield {"type": "token", "text": text}
+
+            elif kind == "on_chat_model_end" and event["run_id"] in streamed_runs:
+                if getattr(event["data"].get("output"), "tool_calls", None):
+                    yield {"type": "reset"}
+
+            elif kind == "on_tool_start":
+                args = event["data"].get("input") or {}
+                yield {"type": "progress", "tool": event["name"], "text": tool_progress_text(event["name"], args)}
+
+            elif kind == "on_tool_end":
+                artifact = getattr(event["data"].get("output"), "artifact", None)
+                if isinstance(artifact, dict) and artifact.get("type") == "AdaptiveCard":
+                    yield {"type": "card", "card": artifact}
+
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = event["data"].get("output") or {}
+                replies = output.get("messages", []) if isinstance(output, dict) else []
+                if replies:
+                    final = _content_text(replies[-1].content)
+    except Exception as e:
+        print(f"❌ Streaming turn failed: {e}")
+        yield {"type": "error", "text": "Sorry, something went wrong while handling your request. Please try again."}
+        return
+
+    yield {"type": "final", "text": final or ""}
+
+
+def sse(event):
+    """Format an event as one Server-Sent Events frame."""
+    return f"data: {json.dumps(event)}\n\n"
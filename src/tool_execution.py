@@ -0,0 +1,115 @@
+# tool_execution.py — Concurrent tool calls with per-tool timeouts for the subagents
+#
+# When the model asks for several tools in one step (check_status for three
+# incidents plus show_my_tickets), the subagents' tool nodes run them side by side:
+#
+#   - graph.ainvoke: every call is its own task on the event loop (the tools are
+#     async, see utils.async_tool); plain sync tools run in worker threads
+#   - graph.invoke:  every call runs on a worker thread
+#
+# At most TOOL_MAX_CONCURRENCY calls run at once per process, every call has a
+# timeout (per tool name, see TOOL_TIMEOUTS), and results come back in call order,
+# so a multi-call step takes as long as its slowest call instead of the sum.
+# A call that times out is cancelled (async) or abandoned (sync: Python cannot stop
+# a running thread) and the model receives an error ToolMessage it can react to.
+#
+# Configuration (environment):
+#   TOOL_TIMEOUT_SECONDS  → default timeout per call (default 60)
+#   TOOL_TIMEOUTS         → per-tool overrides, e.g. "ai_troubleshooter=90,show_tickets=30"
+#   TOOL_MAX_CONCURRENCY  → tool calls running at once per process (default 8)
+import os
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt import ToolNode
+
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+
+# Tools that legitimately take longer (LLM generation, PDF rendering, e-mail)
+TOOL_TIMEOUTS = {
+    "generate_engineer_report_pdf": 180,
+    "generate_incident_report_tool": 180,
+    "save_html_report_tool": 120,
+    "retrieve_or_generate_solution": 90,
+    "ai_troubleshooter": 90,
+}
+for _entry in filter(None, os.getenv("TOOL_TIMEOUTS", "").split(",")):
+    _name, _, _seconds = _entry.partition("=")
+    TOOL_TIMEOUTS[_name.strip()] = float(_seconds)
+
+
+def tool_timeout(name):
+    return TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT_SECONDS)
+
+
+def _timeout_message(request, seconds):
+    call = request.tool_call
+    print(f"⚠️ Tool {call['name']} timed out after {seconds:g}s")
+    return ToolMessage(
+        content=f"Error: {call['name']} did not finish within {seconds:g} seconds and was cancelled. "
+                "Tell the user it timed out; do not retry it in this step.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+# ---------------------------------------------------
+# 🧵 Sync path (graph.invoke)
+# ---------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=TOOL_MAX_CONCURRENCY, thread_name_prefix="tool-call")
+    return _pool
+
+
+def run_tool_call(request, execute):
+    """wrap_tool_call hook: run one call on the bounded pool with its timeout."""
+    seconds = tool_timeout(request.tool_call["name"])
+    future = _get_pool().submit(execute, request)
+    try:
+        return future.result(timeout=seconds)
+    except FutureTimeoutError:
+        future.cancel()  # Only helps if it never started; a running thread is abandoned
+        return _timeout_message(request, seconds)
+
+
+# ---------------------------------------------------
+# ⚡ Async path (graph.ainvoke / astream)
+# ---------------------------------------------------
+# asyncio semaphores belong to one event loop; keep one per loop
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(TOOL_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def arun_tool_call(request, execute):
+    """awrap_tool_call hook: run one call as a task, cancelled when it overruns its timeout."""
+    seconds = tool_timeout(request.tool_call["name"])
+    async with _get_semaphore():
+        try:
+            return await asyncio.wait_for(execute(request), timeout=seconds)
+        except asyncio.TimeoutError:
+            return _timeout_message(request, seconds)
+
+
+def build_tool_node(tools, **kwargs):
+    """ToolNode running independent calls concurrently, in call order, with per-tool timeouts."""
+    return ToolNode(tools, wrap_tool_call=run_tool_call, awrap_tool_call=arun_tool_call, **kwargs)
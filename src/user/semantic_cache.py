@@ -0,0 +1,166 @@
+# semantic_cache.py — Semantic answer cache for retrieve_or_generate_solution
+import os
+import time
+import threading
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from data_pipeline.embedding_cache import CachedQueryEmbeddings
+
+
+# ---------------------------------------------------
+# ⚙️ Configuration
+# ---------------------------------------------------
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))        # Cosine similarity for a hit
+SEMANTIC_CACHE_INVALIDATE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_INVALIDATE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))           # Seconds
+
+
+class SemanticAnswerCache:
+    """
+    Caches answers by the meaning of the question.
+    An incoming query is embedded once (through the shared query-embedding cache)
+    and compared against previously answered queries; above the threshold the stored
+    answer is returned with its provenance instead of calling the KB/LLM again.
+    Memory is bounded by max_entries (least recently used entries go first) and a TTL.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        invalidate_threshold: float = SEMANTIC_CACHE_INVALIDATE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL,
+    ):
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.invalidate_threshold = invalidate_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._vectors = None   # (n, dim) L2-normalized query vectors
+        self._entries = []     # Entry dicts aligned with the rows of _vectors
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = CachedQueryEmbeddings(OpenAIEmbeddings())
+        return self._embeddings
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.array(self.embeddings.embed_query(text), dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _similarities(self, vector: np.ndarray) -> np.ndarray:
+        if self._vectors is None or not self._entries:
+            return np.zeros(0, dtype="float32")
+        return self._vectors @ vector
+
+    def _drop(self, rows):
+        rows = sorted(set(rows))
+        if not rows:
+            return
+        self._vectors = np.delete(self._vectors, rows, axis=0)
+        for row in reversed(rows):
+            del self._entries[row]
+
+    def _drop_expired(self, now: float):
+        self._drop([i for i, e in enumerate(self._entries) if e["expires_at"] < now])
+
+    # ---------------------------------------------------
+    # 🔍 Lookup / store
+    # ---------------------------------------------------
+    def lookup(self, query: str):
+        """Return the best cached entry (with its 'similarity') above the threshold, or None."""
+        vector = self._embed(query)
+        now = time.time()
+
+        with self._lock:
+            self._drop_expired(now)
+            similarities = self._similarities(vector)
+            if similarities.size:
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = self._entries[best]
+                    entry["last_hit"] = now
+                    entry["hits"] += 1
+                    self._stats["hits"] += 1
+                    return dict(entry, similarity=float(similarities[best]))
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, query: str, answer: str, source: str):
+        """Cache an answer; source records where it came from (e.g. 'knowledge_base', 'generated')."""
+        vector = self._embed(query)
+        now = time.time()
+        entry = {
+            "query": query,
+            "answer": answer,
+            "source": source,
+            "created_at": now,
+            "expires_at": now + self.ttl_seconds,
+            "last_hit": now,
+            "hits": 0,
+        }
+
+        with self._lock:
+            # Replace a near-identical question rather than storing it twice
+            similarities = self._similarities(vector)
+            self._drop(np.flatnonzero(similarities >= 0.999).tolist())
+
+            self._vectors = vector[None, :] if self._vectors is None or not self._entries else np.vstack([self._vectors, vector])
+            self._entries.append(entry)
+
+            while len(self._entries) > self.max_entries:
+                self._drop([min(range(len(self._entries)), key=lambda i: self._entries[i]["last_hit"])])
+                self._stats["evictions"] += 1
+
+    # ---------------------------------------------------
+    # 🧹 Invalidation
+    # ---------------------------------------------------
+    def invalidate_similar(self, query: str) -> int:
+        """Drop cached answers for questions similar to `query` (e.g. after the KB learned a new solution)."""
+        vector = self._embed(query)
+        with self._lock:
+            rows = np.flatnonzero(self._similarities(vector) >= self.invalidate_threshold).tolist()
+            self._drop(rows)
+            self._stats["invalidations"] += len(rows)
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._entries = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+def format_cached_answer(entry: dict) -> str:
+    """Cached answer followed by a provenance line."""
+    created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created_at"]))
+    return (
+        f"{entry['answer']}\n\n"
+        f"♻️ Reused answer from a similar question (\"{entry['query']}\", similarity {entry['similarity']:.2f}, "
+        f"source: {entry['source']}, cached {created})."
+    )
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Process-wide semantic answer cache, created on first use."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -0,0 +1,278 @@
+# ticket_classifier.py — Local priority / assignment-group classifier for submit_ticket
+#
+# submit_ticket used to ask gpt-4o-mini for the priority and the assignment group of
+# every new ticket. The group now comes from a nearest-centroid model over TF-IDF
+# features (words, word bigrams and character n-grams, so "compouter" still looks
+# like "computer"), trained at first use from the historical exports:
+#
+#   knowledge_base/issue_logs.csv                    → Issue, labelled by Engineer_Role
+#   knowledge_base/*chunked_knowledge-base.csv       → description, labelled by Place of issue
+#   knowledge_base/sn_incident.csv                   → short_description, when assignment_group is set
+#
+# The exports carry no usable priority labels (every historical incident is
+# "5 - Planning"), so priority comes from keyword rules with Medium as the default.
+# Only when the group confidence is below TICKET_CLASSIFIER_THRESHOLD does
+# classify_ticket() fall back to the LLM, so ticket creation normally makes no LLM call.
+#
+# No export labels a ticket "Machine Learning" or "Others", so the model cannot
+# predict them. Issues matching UNTRAINED_GROUP_RULES always go to the LLM, with the
+# rule's group as the local guess, instead of landing confidently in a trained group.
+#
+# Offline evaluation (accuracy, coverage, latency): python -m benchmarks.ticket_classifier
+#
+# Configuration (environment):
+#   TICKET_CLASSIFIER_THRESHOLD → minimum group confidence to skip the LLM (default 0.55)
+import os
+import re
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from startup import Lazy, get_chat_model
+
+KB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge_base")
+TICKET_CLASSIFIER_THRESHOLD = float(os.getenv("TICKET_CLASSIFIER_THRESHOLD", "0.55"))
+
+GROUPS = ("Software", "Hardware", "IT Support", "Networking", "Machine Learning", "Others")
+PRIORITIES = ("Low", "Medium", "High", "Critical")
+
+# issue_logs.csv Engineer_Role -> assignment group
+ROLE_GROUPS = {
+    "hardware": "Hardware",
+    "software": "Software",
+    "network": "Networking",
+    "service request": "IT Support",
+    "ml": "Machine Learning",
+    "data science": "Machine Learning",
+}
+
+# KB "Place of issue" keyword -> assignment group (first match wins)
+PLACE_GROUPS = (
+    (("vpn", "wifi", "network", "globalprotect", "domain"), "Networking"),
+    (("laptop", "printer", "bios", "desktop", "headset", "camera", "video call"), "Hardware"),
+    (("active directory", "password", "travel", "dataroom", "external link", "shared drive", "share point"), "IT Support"),
+    (("outlook", "word", "excel", "powerpoint", "teams", "one drive", "windows", "macos",
+      "pdf", "zip", "conversion", "power desk", "email"), "Software"),
+)
+
+# Priority keyword rules, checked from most to least severe
+PRIORITY_RULES = (
+    ("Critical", r"\b(outage|down for (everyone|all)|all users|entire (team|office)|security (breach|incident)|"
+                 r"ransomware|virus|malware|hacked|phishing|data loss|production (is )?down)\b"),
+    ("High", r"\b(urgent|asap|immediately|can ?not work|cannot work|can'?t work|unable to (work|login|log in|access)|"
+             r"locked out|not (booting|starting|turning on)|shut ?down|crash(ed|es)?|blank screen|screen (is )?blank|"
+             r"deadline|priority high)\b"),
+    ("Low", r"\b(request|i need an?|need a new|how (do|can) i|question|install(ation)?|new (mouse|keyboard|headset)|"
+            r"when convenient|no rush|priority low)\b"),
+)
+DEFAULT_PRIORITY = "Medium"
+
+# Keywords of groups without training examples -> group (sent to the LLM when untrained)
+UNTRAINED_GROUP_RULES = (
+    ("Machine Learning", r"\b(machine learning|ml|deep learning|data scien(ce|tist)|model (training|serving|deployment)|"
+                         r"training (server|job|run|cluster|pipeline)|tensorflow|pytorch|keras|scikit|sklearn|"
+                         r"jupyter|notebooks?|gpus?|cuda|mlflow|kubeflow|sagemaker|hugging ?face|llms?|datasets?)\b"),
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the i im i'm my me we our you your is are was were be been am to of in on at for with and or "
+    "it its this that please can could would will have has had do does did not no so but as from by "
+    "having issue issues problem problems user users".split()
+)
+
+
+def _features(text):
+    """Words, word bigrams and character 3-5-grams of the (lower-cased) text."""
+    words = [w for w in _TOKEN.findall(str(text).lower()) if w not in _STOPWORDS]
+    features = list(words)
+    features += [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        features += [padded[i:i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+    return features
+
+
+def rule_priority(text):
+    """(priority, matched): keyword rules, Medium when nothing matches."""
+    lowered = str(text).lower()
+    for priority, pattern in PRIORITY_RULES:
+        if re.search(pattern, lowered):
+            return priority, True
+    return DEFAULT_PRIORITY, False
+
+
+@dataclass
+class Classification:
+    priority: str
+    group: str
+    confidence: float   # Group confidence in [0, 1]
+    source: str         # "local" or "llm"
+
+
+# ---------------------------------------------------
+# 📚 Training data
+# ---------------------------------------------------
+def _place_group(place):
+    place = str(place).lower()
+    for keywords, group in PLACE_GROUPS:
+        if any(k in place for k in keywords):
+            return group
+    return None
+
+
+def load_training_examples(kb_dir=KB_DIR):
+    """(text, group) pairs from the historical exports, deduplicated."""
+    examples = []
+
+    path = os.path.join(kb_dir, "issue_logs.csv")
+    if os.path.exists(path):
+        logs = pd.read_csv(path)
+        for issue, role in zip(logs["Issue"], logs["Engineer_Role"]):
+            group = ROLE_GROUPS.get(str(role).strip().lower())
+            if group and isinstance(issue, str):
+                examples.append((issue, group))
+
+    for name in ("chunked_knowledge-base.csv", "ticket_chunked_knowledge-base.csv"):
+        path = os.path.join(kb_dir, name)
+        if not os.path.exists(path):
+            continue
+        kb = pd.read_csv(path, usecols=["description", "Place of issue", "fianl_description"])
+        for description, place, final in zip(kb["description"], kb["Place of issue"], kb["fianl_description"]):
+            group = _place_group(place)
+            if group:
+                examples += [(text, group) for text in (description, final) if isinstance(text, str)]
+
+    path = os.path.join(kb_dir, "sn_incident.csv")
+    if os.path.exists(path):
+        incidents = pd.read_csv(path)
+        if "assignment_group" in incidents.columns:
+            for text, group in zip(incidents["short_description"], incidents["assignment_group"]):
+                if isinstance(text, str) and group in GROUPS:
+                    examples.append((text, group))
+
+    seen = set()
+    unique = []
+    for text, group in examples:
+        key = (" ".join(_TOKEN.findall(text.lower())), group)
+        if key[0] and key not in seen:
+            seen.add(key)
+            unique.append((text.strip(), group))
+    return unique
+
+
+# ---------------------------------------------------
+# 🧮 Model
+# ---------------------------------------------------
+class TicketClassifier:
+    """Nearest-centroid classifier over L2-normalized TF-IDF vectors."""
+
+    def __init__(self, temperature=0.05):
+        self.temperature = temperature
+        self.vocabulary = {}
+        self.idf = None
+        self.groups = []
+        self.centroids = None
+
+    def _vectors(self, texts):
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(_features(text)).items():
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    matrix[row, column] = 1 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def fit(self, texts, labels):
+        document_frequency = Counter(f for text in texts for f in set(_features(text)))
+        self.vocabulary = {f: i for i, f in enumerate(sorted(document_frequency))}
+        self.idf = np.array(
+            [math.log((1 + len(texts)) / (1 + document_frequency[f])) + 1 for f in sorted(document_frequency)],
+            dtype=np.float32,
+        )
+
+        vectors = self._vectors(texts)
+        self.groups = sorted(set(labels))
+        labels = np.array(labels)
+        centroids = np.stack([vectors[labels == g].mean(axis=0) for g in self.groups])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        return self
+
+    def predict_proba(self, text):
+        """{group: probability} from a softmax over the centroid similarities."""
+        similarities = self.centroids @ self._vectors([text])[0]
+        if not similarities.any():  # Nothing in the text the model has seen
+            return {g: 1 / len(self.groups) for g in self.groups}
+        scaled = np.exp((similarities - similarities.max()) / self.temperature)
+        return dict(zip(self.groups, (scaled / scaled.sum()).tolist()))
+
+    def classify(self, text):
+        priority, _ = rule_priority(text)
+        lowered = str(text).lower()
+        for group, pattern in UNTRAINED_GROUP_RULES:
+            if group not in self.groups and re.search(pattern, lowered):
+                return Classification(priority, group, 0.0, "local")  # Never confident: the LLM decides
+
+        probabilities = self.predict_proba(text)
+        group = max(probabilities, key=probabilities.get)
+        return Classification(priority, group, probabilities[group], "local")
+
+    @classmethod
+    def from_knowledge_base(cls, kb_dir=KB_DIR):
+        examples = load_training_examples(kb_dir)
+        return cls().fit([t for t, _ in examples], [g for _, g in examples])
+
+
+ticket_classifier = Lazy(TicketClassifier.from_knowledge_base, "ticket_classifier")
+
+
+# ---------------------------------------------------
+# 🤖 LLM fallback
+# ---------------------------------------------------
+def _llm_prompt(issue):
+    return f"""
+    You are a ServiceNow ticket classifier.
+    Analyze the issue and decide two things:
+    1. The ticket PRIORITY (choose one: {', '.join(PRIORITIES)})
+    2. The ASSIGNMENT GROUP (choose one: {', '.join(GROUPS)})
+
+    Return your answer strictly in JSON format:
+    {{
+        "priority": "Medium",
+        "group": "Software"
+    }}
+
+    Issue description:
+    {issue}
+    """
+
+
+def _parse_llm(content, local):
+    parsed = json.loads(content.strip())
+    priority = parsed.get("priority") if parsed.get("priority") in PRIORITIES else local.priority
+    group = parsed.get("group") if parsed.get("group") in GROUPS else local.group
+    return Classification(priority, group, 1.0, "llm")
+
+
+async def classify_ticket(issue, threshold=TICKET_CLASSIFIER_THRESHOLD):
+    """
+    Priority and assignment group for a new ticket. Local when the group confidence
+    reaches `threshold`; otherwise gpt-4o-mini decides (the local guess is kept if
+    the LLM call fails or answers outside the known labels).
+    """
+    local = ticket_classifier.get().classify(issue)
+    if local.confidence >= threshold:
+        return local
+
+    try:
+        response = await get_chat_model("gpt-4o-mini", 0).ainvoke(_llm_prompt(issue))
+        return _parse_llm(response.content, local)
+    except Exception as e:
+        print(f"⚠️ LLM ticket classification failed, using the local guess: {e}")
+        return local
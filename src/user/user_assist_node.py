@@ -5,6 +5,9 @@ from .user_tool import user_tools
 #from user_tool_witout_loging import user_tools
 from dotenv import load_dotenv # Import function to load environment variables
 from langchain_openai import ChatOpenAI # Import the OpenAI chat model
+from startup import Lazy, get_chat_model
+from context_compaction import ContextCompactor
+from prompt_assembly import AssistantPrompt, record_cache_usage
 import os
 # ---------------------------------------------------
 # 🧠 Generate Prompt for the User Assistance Agent
@@ -13,16 +16,20 @@ load_dotenv(dotenv_path=".env", override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
 
 #user_tools =[submit_ticket, check_status, add_comments, submit_feedback, ask_question, reopen_ticket, show_my_tickets]
 
-llm_with_user_tools = llm.bind_tools(user_tools)
+# Bound on first use so importing the node does not construct LLM clients
+llm_with_user_tools = Lazy(lambda: get_chat_model("gpt-4", 0).bind_tools(user_tools), "user_llm_with_tools")
 
+# Rolling summary + recent turns, kept within the gpt-4 prompt budget
+user_context = ContextCompactor("gpt-4")
 
-def generate_user_assistance_prompt(memory: str = "None") -> str:
-    return f"""
+
+user_prompt = AssistantPrompt(
+    "user_assistant",
+    """
     You are a professional **User Assistance Agent** in the IT Helpdesk Team. 
     Your main responsibility is to help users with **ServiceNow-related tasks** such as creating, updating, and checking tickets, or general support queries .
     You have should not submit tickets or take actions without user confirmation.
@@ -51,10 +58,13 @@ def generate_user_assistance_prompt(memory: str = "None") -> str:
     - Avoid hallucination: only use information from tools or verified history.
     - Never expose credentials or internal API details.
 
-    🧩 ADDITIONAL CONTEXT:
-    Prior saved user preferences: {memory}
-    The current chat history is also attached below.
+    A summary of the earlier conversation (if any), the recent chat history and the saved preferences are attached below.
+    """,
     """
+    🧩 ADDITIONAL CONTEXT:
+    Prior saved user preferences: $memory
+    """,
+)
 
 
 # ---------------------------------------------------
@@ -68,16 +78,20 @@ def user_assistance(state, config: RunnableConfig):
     - Invokes the ServiceNow LLM agent with access to user_tools.
     """
 
-    # Extract user preferences from memory (if any)
-    memory = state.get("loaded_memory", "None")
-
-    # Generate dynamic system prompt
-    user_assistance_prompt = generate_user_assistance_prompt(memory)
-
     # Call the LLM with ServiceNow-related tools
-    response = llm_with_user_tools.invoke(
-        [SystemMessage(user_assistance_prompt)] + state["messages"]
+    response = llm_with_user_tools.get().invoke(
+        user_prompt.messages(user_context, state)
     )
+    record_cache_usage(user_prompt, response)
 
     # Update conversation history with new response
     return {"messages": [response]}
+
+
+async def auser_assistance(state, config: RunnableConfig):
+    """Async variant of user_assistance, used when the graph runs with ainvoke/astream."""
+    response = await llm_with_user_tools.get().ainvoke(
+        user_prompt.messages(user_context, state)
+    )
+    record_cache_usage(user_prompt, response)
+    return {"messages": [response]}
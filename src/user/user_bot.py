@@ -9,7 +9,7 @@ def run_user_session():
     Runs an interactive user Q&A session.
     """
     # Generate a unique thread ID for this conversation
-    thread_id = uuid.uuid4()
+    thread_id = str(uuid.uuid4())
 
     # Configuration for the agent
     config = {"configurable": {"thread_id": thread_id}}
@@ -4,6 +4,9 @@ import pandas as pd
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import FAISS
+from data_pipeline.embedding_cache import CachedQueryEmbeddings
+from .semantic_cache import get_answer_cache
+from startup import Lazy, get_chat_model
 
 # === Step 0: Load environment variables ===
 load_dotenv(dotenv_path=".env", override=True)
@@ -32,8 +35,8 @@ class KnowledgeBaseTool:
         os.makedirs(faiss_dir, exist_ok=True)
         self.faiss_dir = faiss_dir
 
-        self.embeddings = OpenAIEmbeddings()
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+        self.embeddings = CachedQueryEmbeddings(OpenAIEmbeddings())
+        self.llm = get_chat_model("gpt-4o-mini", 0.3)
 
         index_path = os.path.join(faiss_dir, "index.faiss")
         if os.path.exists(index_path):
@@ -119,22 +122,18 @@ os.environ["OPENAI_API_KEY"] = api_key
 # ---------------------------------------------------
 # 🧩 Knowledge Base Tools
 # ---------------------------------------------------
-kb_tool = KnowledgeBaseTool()
+kb_tool = Lazy(KnowledgeBaseTool, "knowledge_base")  # Loads/builds FAISS on first use or during warmup
 
 
 def retrieve_solution(query: str) -> str:
-    solution = kb_tool.retrieve_solution(query)
+    solution = kb_tool.get().retrieve_solution(query)
     if solution:
         return f"✅ Found in Knowledge Base:\n{solution}"
     return None
 
 
-def generate_solution(query: str, memory: str = "None") -> str:
-    """
-    Generate solution using LLM when KB does not have an answer.
-    """
-    llm_solution = ChatOpenAI(model="gpt-4", temperature=0.2)
-    prompt = f"""
+def _solution_prompt(query: str, memory: str) -> str:
+    return f"""
 You are a professional problem-solving assistant. The user asked:
 
 User Query: {query}
@@ -145,7 +144,21 @@ Provide a clear, concise, and practical solution for the user.
 
 💡 Generated Solution:
 """
-    response = llm_solution.invoke([SystemMessage(prompt)])
+
+
+def generate_solution(query: str, memory: str = "None") -> str:
+    """
+    Generate solution using LLM when KB does not have an answer.
+    """
+    llm_solution = get_chat_model("gpt-4", 0.2)
+    response = llm_solution.invoke([SystemMessage(_solution_prompt(query, memory))])
+    return response.content.strip()
+
+
+async def agenerate_solution(query: str, memory: str = "None") -> str:
+    """Async variant of generate_solution."""
+    llm_solution = get_chat_model("gpt-4", 0.2)
+    response = await llm_solution.ainvoke([SystemMessage(_solution_prompt(query, memory))])
     return response.content.strip()
 
 
@@ -154,7 +167,9 @@ def confirm_and_update_solution(query: str, solution: str, user_confirmed: bool)
     Update KB with solution only after user confirms it worked.
     """
     if user_confirmed:
-        kb_tool.add_solution(query, solution)
+        kb_tool.get().add_solution(query, solution)
+        # Cached answers for similar questions predate the confirmed solution
+        get_answer_cache().invalidate_similar(query)
         return f"💾 Solution confirmed and added to KB:\n{solution}"
     else:
         return "⚠️ Solution not confirmed. KB not updated."
@@ -229,30 +244,17 @@ Resolution: {row['resolution']}."""
 
 
 # ===========================
-# Main function
+# Persistent ticket RAG index
 # ===========================
-def get_ticket_answer(query: str, csv_file_path: str = "data_pipeline/data.csv") -> str | None:
-    """
-    Given a user query, return an answer from the ticket database using RAG.
-    If no relevant information is found, return None.
-    """
-    # Load CSV
-    df = pd.read_csv(csv_file_path)
-    if df.empty:
-        return None
+import asyncio
+import hashlib
+import json
+import threading
 
-    # Create documents
-    documents = [Document(page_content=row_to_text(row)) for _, row in df.iterrows()]
+TICKET_FAISS_DIR = "data_pipeline/ticket_faiss_store"   # Persisted next to data_pipeline/faiss_store
+TICKET_MANIFEST_FILE = "manifest.json"                  # Records the CSV hash the index was built from
 
-    # Create embeddings & vector store
-    embedding_model = OpenAIEmbeddings()
-    vector_store = FAISS.from_documents(documents, embedding_model)
-
-    # Create retriever
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-
-    # Prompt template
-    prompt_template = """
+RAG_PROMPT_TEMPLATE = """
 You are a helpful IT support assistant. Use the context below to answer the user's question.
 
 Context from ticket database:
@@ -263,21 +265,140 @@ User query: {question}
 If the answer is not in the context, respond exactly with: "NO_INFO".
 Answer concisely and based on the context.
 """
-    prompt = PromptTemplate.from_template(prompt_template)
-
-    # LLM
-    llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
-
-    # RAG pipeline
-    rag_pipeline = (
-        {
-            "context": retriever,
-            "question": RunnablePassthrough()
-        }
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TicketRAGIndex:
+    """
+    Long-lived FAISS index over the ticket CSV used by get_ticket_answer.
+    The index is persisted to disk, loaded lazily on first use, and only
+    re-embedded when the CSV's content hash changes.
+    """
+
+    def __init__(self, csv_file_path: str, index_dir: str = TICKET_FAISS_DIR):
+        self.csv_file_path = csv_file_path
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, TICKET_MANIFEST_FILE)
+
+        self.embeddings = CachedQueryEmbeddings(OpenAIEmbeddings())
+        self.llm = get_chat_model("gpt-4o-mini", 0)
+        self.prompt = PromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+
+        self.vector_store = None
+        self.rag_pipeline = None
+        self._csv_stat = None
+        self._lock = threading.Lock()
+
+    def _stat_csv(self):
+        st = os.stat(self.csv_file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, csv_hash: str, rows: int):
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"csv_path": self.csv_file_path, "csv_sha256": csv_hash, "rows": rows}, f, indent=2)
+
+    def _load_or_build(self):
+        """Load the persisted index if it matches the CSV hash, otherwise rebuild it."""
+        csv_hash = file_sha256(self.csv_file_path)
+        manifest = self._read_manifest()
+        index_path = os.path.join(self.index_dir, "index.faiss")
+
+        if manifest.get("csv_sha256") == csv_hash and os.path.exists(index_path):
+            print("📂 Loading persisted ticket RAG index...")
+            self.vector_store = FAISS.load_local(
+                self.index_dir, self.embeddings, allow_dangerous_deserialization=True
+            )
+        else:
+            print("🆕 Ticket CSV changed or index missing — re-embedding tickets...")
+            df = pd.read_csv(self.csv_file_path)
+            if df.empty:
+                self.vector_store = None
+            else:
+                documents = [Document(page_content=row_to_text(row)) for row in df.to_dict(orient="records")]
+                self.vector_store = FAISS.from_documents(documents, self.embeddings)
+                os.makedirs(self.index_dir, exist_ok=True)
+                self.vector_store.save_local(self.index_dir)
+                self._write_manifest(csv_hash, len(documents))
+                print(f"✅ Ticket RAG index built from {len(documents)} rows in {self.csv_file_path}")
+
+        if self.vector_store is None:
+            self.rag_pipeline = None
+            return
+
+        retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})
+        self.rag_pipeline = (
+            {
+                "context": retriever,
+                "question": RunnablePassthrough()
+            }
+            | self.prompt
+            | self.llm
+            | StrOutputParser()
+        )
+
+    def get_pipeline(self):
+        """
+        Return the RAG pipeline, (re)loading the index if the CSV changed on disk.
+        A cheap stat() guards the content hash so unchanged files are never re-read.
+        """
+        csv_stat = self._stat_csv()
+        if csv_stat == self._csv_stat:
+            return self.rag_pipeline
+
+        with self._lock:
+            if csv_stat != self._csv_stat:
+                self._load_or_build()
+                self._csv_stat = csv_stat
+        return self.rag_pipeline
+
+
+_ticket_rag_indexes = {}
+_ticket_rag_indexes_lock = threading.Lock()
+
+
+def get_ticket_rag_index(csv_file_path: str = "data_pipeline/data.csv") -> TicketRAGIndex:
+    """Return the process-wide ticket RAG index for a CSV, creating it on first use."""
+    index = _ticket_rag_indexes.get(csv_file_path)
+    if index is None:
+        with _ticket_rag_indexes_lock:
+            index = _ticket_rag_indexes.get(csv_file_path)
+            if index is None:
+                index = TicketRAGIndex(csv_file_path)
+                _ticket_rag_indexes[csv_file_path] = index
+    return index
+
+
+# ===========================
+# Main function
+# ===========================
+def get_ticket_answer(query: str, csv_file_path: str = "data_pipeline/data.csv") -> str | None:
+    """
+    Given a user query, return an answer from the ticket database using RAG.
+    If no relevant information is found, return None.
+
+    The ticket index is shared across calls, so each query costs one query
+    embedding plus one LLM call.
+    """
+    rag_pipeline = get_ticket_rag_index(csv_file_path).get_pipeline()
+    if rag_pipeline is None:
+        return None
 
     # Get model response
     answer = rag_pipeline.invoke(query).strip()
@@ -289,6 +410,19 @@ Answer concisely and based on the context.
     return answer
 
 
+async def aget_ticket_answer(query: str, csv_file_path: str = "data_pipeline/data.csv") -> str | None:
+    """Async variant of get_ticket_answer; the (rare) index load runs off the event loop."""
+    rag_pipeline = await asyncio.to_thread(get_ticket_rag_index(csv_file_path).get_pipeline)
+    if rag_pipeline is None:
+        return None
+
+    answer = (await rag_pipeline.ainvoke(query)).strip()
+    if answer.upper() == "NO_INFO":
+        return None
+
+    return answer
+
+
 # ===========================
 # Optional: Interactive testing
 # ===========================
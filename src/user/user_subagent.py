@@ -14,30 +14,25 @@ from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage
 from .user_tool import user_tools  # import tools from your user_tools.py
 #from user_tool_witout_loging import user_tools  # import tools from your user_tools.py
 
-from langgraph.prebuilt import ToolNode # Pre-built node for executing tools
-from .user_assist_node import user_assistance # Custom node for user assistance logic
+from intent_router import IntentRouter, USER_INTENTS # Regex fast path for deterministic commands
+from tool_execution import build_tool_node # ToolNode running tool calls concurrently with timeouts
+from .user_assist_node import user_assistance, auser_assistance, user_context # Custom node for user assistance logic (sync + async)
+from langchain_core.runnables import RunnableLambda
 
 # Load environment variables from the .env file. The `override=True` argument
 # ensures that variables from the .env file will overwrite existing environment variables.
 load_dotenv(dotenv_path=".env", override=True)
 
-# Initialize the ChatOpenAI model. We're using a specific model from Llama 3.3 series.
-# This `model` object will be used throughout the notebook for all LLM interactions.
+# The LLM (bound to user_tools) lives in user_assist_node and is created on first use.
 
 load_dotenv(dotenv_path=".env", override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
-
-# Initializing `InMemoryStore` for long-term memory. 
-# This store will hold user-specific data like music preferences across sessions.
-in_memory_store = InMemoryStore()
-
-# Initializing `MemorySaver` for short-term (thread-level) memory. 
-# This checkpointer saves the graph's state after each step, allowing for restarts or interruptions within a thread.
-checkpointer = MemorySaver()
+# Long-term memory (store) and short-term thread-level memory (checkpointer) come from
+# session_store: in-process by default, or a shared SQLite file with SESSION_BACKEND=sqlite.
+# Checkpoints of evicted sessions are deleted there, so memory stays bounded.
 
 
 
@@ -53,15 +48,20 @@ class State(TypedDict):
     # loaded_memory: Stores information loaded from the long-term memory store, 
     # typically user preferences or historical context.
     loaded_memory: str
+
+    # summary: Rolling summary of the turns compacted out of `messages`.
+    summary: str
     
     # remaining_steps: Used by LangGraph to track the number of allowed steps 
     # to prevent infinite loops in cyclic graphs.
     remaining_steps: RemainingSteps 
 
 
-llm_with_user_tools = llm.bind_tools(user_tools)
+# Independent tool calls of one step run concurrently (bounded, with per-tool timeouts)
+user_tool_node = build_tool_node(user_tools)
 
-user_tool_node = ToolNode(user_tools)
+# Fast path for command-like messages, ahead of the LLM
+user_router = IntentRouter(USER_INTENTS, user_tools, "user")
 
 
 # Define a conditional edge function named `should_continue`.
@@ -87,78 +87,109 @@ def should_continue(state: State, config: RunnableConfig):
 
 from langgraph.graph import StateGraph, START, END # Core LangGraph classes and special node names
 from utils import show_graph # Utility function to visualize the graph (assumed to be in a utils.py file)
+from startup import Lazy
+from session_store import get_checkpointer, get_long_term_store
 
-# Initialize a StateGraph with our defined `State` schema.
-# This tells LangGraph how the data will flow and be managed within the graph.
-user_workflow = StateGraph(State)
-
-# Add the 'user_assistant' node to the graph.
-# This node is responsible for the LLM's reasoning and generating tool calls or final responses.
-user_workflow.add_node("user_assistant", user_assistance)
-
-
-# Add the 'user_tool_node' to the graph.
-# This node is responsible for executing the tools when requested by the LLM.
-user_workflow.add_node("user_tool_node", user_tool_node)
-
-
-# Define the starting point of the graph.
-# All queries will initially enter the 'user_assistant' node.
-user_workflow.add_edge(START, "user_assistant")
-
-# Add a conditional edge from 'user_assistant'.
-# The `should_continue` function will be called to determine the next node.
-user_workflow.add_conditional_edges(
-    "user_assistant", # Source node
-    should_continue,   # Conditional function to call
-    {
-        # If `should_continue` returns "continue", route to `user_tool_node`.
-        "continue": "user_tool_node",
-        # If `should_continue` returns "end", terminate the graph execution.
-        "end": END,
-    },
-)
-
-# Add a normal edge from 'user_tool_node' back to 'user_assistant'.
-# After a tool is executed, the result is fed back to the LLM for further reasoning
-# or to formulate a final response (ReAct loop).
-user_workflow.add_edge("user_tool_node", "user_assistant")
-
-# Compile the graph into a runnable object.
-# `name`: A unique identifier for this compiled graph (useful for debugging and logging).
-# `checkpointer`: The short-term memory mechanism (MemorySaver) for thread-specific state.
-# `store`: The long-term memory mechanism (InMemoryStore) for persistent user data.
-user_subagent = user_workflow.compile(name="user_subagent", checkpointer=checkpointer, store = in_memory_store)
-
-# Display a visualization of the compiled graph.
-show_graph(user_subagent)
-
-
-
-
-
-
-import uuid # Module for generating unique identifiers
-
-# Generate a unique thread ID for this conversation.
-# This ensures that the conversation state is isolated and can be resumed later.
-thread_id = uuid.uuid4()
-
-# Define the customer's question.
-question = "I am facing some issues regarding my camera?"
-
-# Create the configuration dictionary for invoking the graph.
-# The `thread_id` is essential for the checkpointer to manage state.
-config = {"configurable": {"thread_id": thread_id}}
-
-# Invoke the `user_subagent` with the initial human message and configuration.
-# The `invoke` method runs the graph to completion and returns the final state.
-result = user_subagent.invoke({"messages": [HumanMessage(content=question)]}, config=config)
-
-# Iterate through the messages in the final state and print them for observation.
-# `pretty_print()` provides a formatted output of the message content and role.
-for message in result["messages"]:
-   message.pretty_print()
-
-
-
+
+def build_user_subagent():
+    """Build and compile the user subagent graph (called once, on first use)."""
+    # Initialize a StateGraph with our defined `State` schema.
+    # This tells LangGraph how the data will flow and be managed within the graph.
+    user_workflow = StateGraph(State)
+
+    # Add the 'user_assistant' node to the graph.
+    # This node is responsible for the LLM's reasoning and generating tool calls or final responses.
+    user_workflow.add_node("user_assistant", RunnableLambda(user_assistance, afunc=auser_assistance, name="user_assistant"))
+
+    # Add the 'compact_context' node: at the start of every turn it folds old turns into
+    # the rolling summary and cuts bulky tool payloads, so the prompt stays bounded.
+    user_workflow.add_node("compact_context", RunnableLambda(user_context.compact, afunc=user_context.acompact, name="compact_context"))
+
+
+    # Add the 'user_tool_node' to the graph.
+    # This node is responsible for executing the tools when requested by the LLM.
+    user_workflow.add_node("user_tool_node", user_tool_node)
+
+
+    # Add the 'intent_router' node: command-like messages ("status of INC0010018",
+    # "show my tickets") are answered with one direct tool call and a templated reply.
+    user_workflow.add_node("intent_router", RunnableLambda(user_router.route, afunc=user_router.aroute, name="intent_router"))
+
+
+    # Define the starting point of the graph.
+    # Every turn is compacted first, then the router either answers it or hands it
+    # to the 'user_assistant' node.
+    user_workflow.add_edge(START, "compact_context")
+    user_workflow.add_edge("compact_context", "intent_router")
+    user_workflow.add_conditional_edges(
+        "intent_router",
+        user_router.next_step,
+        {
+            "assistant": "user_assistant",
+            "end": END,
+        },
+    )
+
+    # Add a conditional edge from 'user_assistant'.
+    # The `should_continue` function will be called to determine the next node.
+    user_workflow.add_conditional_edges(
+        "user_assistant", # Source node
+        should_continue,   # Conditional function to call
+        {
+            # If `should_continue` returns "continue", route to `user_tool_node`.
+            "continue": "user_tool_node",
+            # If `should_continue` returns "end", terminate the graph execution.
+            "end": END,
+        },
+    )
+
+    # Add a normal edge from 'user_tool_node' back to 'user_assistant'.
+    # After a tool is executed, the result is fed back to the LLM for further reasoning
+    # or to formulate a final response (ReAct loop).
+    user_workflow.add_edge("user_tool_node", "user_assistant")
+
+    # Compile the graph into a runnable object.
+    # `name`: A unique identifier for this compiled graph (useful for debugging and logging).
+    # `checkpointer`: The short-term memory mechanism for thread-specific state.
+    # `store`: The long-term memory mechanism for persistent user data.
+    user_subagent = user_workflow.compile(name="user_subagent", checkpointer=get_checkpointer(), store=get_long_term_store())
+    return user_subagent
+
+
+# Compiled on first use (or by the startup warmup) instead of at import time.
+user_subagent_resource = Lazy(build_user_subagent, "user_subagent")
+get_user_subagent = user_subagent_resource.get
+
+
+def __getattr__(name):
+    # Backwards compatible `from user.user_subagent import user_subagent` (builds on access)
+    if name == "user_subagent":
+        return get_user_subagent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    # Display a visualization of the compiled graph (on demand only).
+    show_graph(get_user_subagent())
+
+    import uuid # Module for generating unique identifiers
+
+    # Generate a unique thread ID for this conversation.
+    # This ensures that the conversation state is isolated and can be resumed later.
+    thread_id = str(uuid.uuid4())
+
+    # Define the customer's question.
+    question = "I am facing some issues regarding my camera?"
+
+    # Create the configuration dictionary for invoking the graph.
+    # The `thread_id` is essential for the checkpointer to manage state.
+    config = {"configurable": {"thread_id": thread_id}}
+
+    # Invoke the `user_subagent` with the initial human message and configuration.
+    # The `invoke` method runs the graph to completion and returns the final state.
+    result = get_user_subagent().invoke({"messages": [HumanMessage(content=question)]}, config=config)
+
+    # Iterate through the messages in the final state and print them for observation.
+    # `pretty_print()` provides a formatted output of the message content and role.
+    for message in result["messages"]:
+       message.pretty_print()
@@ -17,7 +17,15 @@ from openai import OpenAI
 from data_pipeline.ingest import get_answer
 
 
-from .user_solution_tool import generate_solution, retrieve_solution, get_ticket_answer # OpenAI SDK v1
+import asyncio
+from .user_solution_tool import generate_solution, agenerate_solution, retrieve_solution, get_ticket_answer, aget_ticket_answer # OpenAI SDK v1
+from .semantic_cache import get_answer_cache, format_cached_answer
+from servicenow_client import snow_get, snow_post, snow_patch, SnowRequestError
+from utils import async_tool
+from startup import get_chat_model
+from .ticket_classifier import classify_ticket, ticket_classifier
+from identity_cache import resolve_user, remember_user
+from incident_mirror import get_incident_mirror, WRITE_PARAMS
 #from bot import llm  # Import the llm instance from bot.py
 
 # ServiceNow credentials
@@ -45,7 +53,7 @@ api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_API_KEY"] = api_key
 
 
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
+# Chat models are shared and created on first use (startup.get_chat_model)
 
 # -----------------------------
 # -----------------------------
@@ -55,43 +63,24 @@ import requests
 from requests.auth import HTTPBasicAuth
 import json
 
-def register_user(email, full_name):
+async def register_user(email, full_name):
     """
-    Lookup the user in ServiceNow by email.
+    Lookup the user in ServiceNow by email (through the shared identity cache).
     If user does not exist, create them.
     Return the valid sys_id for 'caller_id'.
     """
-    lookup_url = f"{SNOW_INSTANCE}/api/now/table/sys_user?sysparm_query=email={email}"
-    
     try:
-        # Lookup user
-        response = requests.get(
-            lookup_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Accept": "application/json"},
-            timeout=500
-        )
-        response.raise_for_status()  # Raises HTTPError if not 2xx
-        
-        # Parse JSON safely
-        try:
-            result = response.json().get('result', [])
-        except ValueError:
-            print(f"Lookup response not valid JSON: {response.text}")
-            result = []
-
-        if result:
+        # Lookup user (cached: repeat submissions skip the sys_user round trip)
+        user = await resolve_user(email)
+        if user:
             # User exists
-            return {"sys_id": result[0]['sys_id'], "email": email, "name": full_name}
+            return {"sys_id": user['sys_id'], "email": email, "name": full_name}
 
         # User does not exist → create
         create_payload = {"name": full_name, "email": email, "user_name": email}
-        create_resp = requests.post(
+        create_resp = await snow_post(
             f"{SNOW_INSTANCE}/api/now/table/sys_user",
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(create_payload),
-            timeout=500
+            json=create_payload
         )
         create_resp.raise_for_status()
         
@@ -101,13 +90,14 @@ def register_user(email, full_name):
             print(f"Create response not valid JSON: {create_resp.text}")
             create_result = {}
 
+        remember_user({**create_payload, **create_result})
         return {
             "sys_id": create_result.get('sys_id'),
             "email": email,
             "name": full_name
         }
 
-    except requests.exceptions.RequestException as e:
+    except (SnowRequestError, ValueError) as e:
         print(f"ServiceNow API request failed: {e}")
         return {"sys_id": None, "email": email, "name": full_name}
 
@@ -131,7 +121,8 @@ def assign_resource(ticket_sys_id: str, role: str) -> str:
 
 def infer_priority_and_role(issue_text: str) -> tuple[int, str]:
     """
-    Use the LLM to infer ticket priority and assignment role based on the issue description.
+    Infer ticket priority and assignment role from the issue description with the
+    local ticket classifier (no LLM call).
 
     Parameters:
     - issue_text (str): The user’s issue description.
@@ -141,44 +132,22 @@ def infer_priority_and_role(issue_text: str) -> tuple[int, str]:
     - priority (int): 1=High, 2=Medium, 3=Low
     - role (str): Assignment group/role in ServiceNow
     """
-    prompt = f"""
-    You are an IT support assistant.
-    Given this user issue, decide:
-    1. Priority (1=High, 2=Medium, 3=Low)
-    2. Role/assignment group to handle it (e.g., Network, IT Support, Security)
-
-    Issue: {issue_text}
-
-    Respond ONLY in JSON format like:
-    {{
-        "priority": <1|2|3>,
-        "role": "<role_name>"
-    }}
-    """
-    try:
-        response = llm([HumanMessage(content=prompt)])
-        content = response.content.strip()
-        content = content.replace("'", '"')  # Ensure valid JSON
-        result = json.loads(content)
-        priority = int(result.get("priority", 3))
-        role = result.get("role", "IT Support")
-        return priority, role
-    except Exception as e:
-        print(f"⚠️ LLM parse error: {e}")
-        return 3, "IT Support"
+    result = ticket_classifier.get().classify(issue_text)
+    priority = {"Critical": 1, "High": 1, "Medium": 2, "Low": 3}[result.priority]
+    return priority, result.group
     
 
 # -----------------------------
 # Main Tool
 # -----------------------------
 
-@tool
-def submit_ticket(issue: str, email: str, full_name: str) -> str:
+@async_tool
+async def submit_ticket(issue: str, email: str, full_name: str) -> str:
     """
     Submit a new ServiceNow incident ticket.
 
     The ticket's priority and assignment group/role are automatically determined 
-    by the LLM based on the issue description.
+    from the issue description (local classifier, LLM fallback when unsure).
 
     Parameters:
     - issue (str): User's problem description.
@@ -189,41 +158,13 @@ def submit_ticket(issue: str, email: str, full_name: str) -> str:
     str: Confirmation message including ticket sys_id and assigned group.
     """
     # 1. Get or register user
-    user = register_user(email, full_name)
+    user = await register_user(email, full_name)
     if not user:
         return f"❌ Failed to register/find user {email}"
 
-    # 2. Use LLM to infer priority & group
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-
-    prompt = f"""
-    You are a ServiceNow ticket classifier.
-    Analyze the issue and decide two things:
-    1. The ticket PRIORITY (choose one: Low, Medium, High, Critical)
-    2. The ASSIGNMENT GROUP (choose one: Software, Hardware, IT Support, Networking, Machine Learning, or Others)
-
-    Return your answer strictly in JSON format:
-    {{
-        "priority": "Medium",
-        "group": "Software"
-    }}
-
-    Issue description:
-    {issue}
-    """
-
-
-    try:
-        response = llm.invoke(prompt)
-        content = response.content.strip()
-
-        # Extract JSON safely
-        parsed = json.loads(content)
-        priority = parsed.get("priority", "Medium")
-        role = parsed.get("group", "Others")
-    except Exception as e:
-        priority, role = "Medium", "Others"
-        print(f"⚠️ LLM classification failed: {e}")
+    # 2. Infer priority & group locally (the LLM is only asked when the classifier is unsure)
+    classification = await classify_ticket(issue)
+    priority, role = classification.priority, classification.group
 
     # 3. Prepare ServiceNow payload
     payload = {
@@ -242,26 +183,19 @@ def submit_ticket(issue: str, email: str, full_name: str) -> str:
 
     # 4. Submit ticket to ServiceNow
     try:
-        response = requests.post(
-            SNOW_API,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers={"Content-Type": "application/json", "Accept": "application/json"},
-            data=json.dumps(payload),
-            verify=False,
-            timeout=500
-        )
+        response = await snow_post(SNOW_API, json=payload, params=WRITE_PARAMS)
         response.raise_for_status()
-        ticket = response.json().get('result', {})
+        ticket = await get_incident_mirror().write_through(response)  # Readable at once (no sync wait)
 
         # 5. Return confirmation
         return (
             f"✅ Ticket created successfully!\n"
-            f"🧠 LLM assigned group: **{role}** | Priority: **{priority}**\n"
+            f"🧠 Assigned group: **{role}** | Priority: **{priority}**\n"
             f"🎫 Ticket Number: {ticket.get('number', 'UNKNOWN')}"
         )
 
 
-    except requests.exceptions.RequestException as e:
+    except SnowRequestError as e:
         return f"❌ Failed to create ticket: {e}"
 
 
@@ -381,8 +315,8 @@ def submit_ticket(issue: str, email: str, full_name: str) -> str:
 # ------------------------------
 
 
-@tool
-def check_status(user_input: str):
+@async_tool
+async def check_status(user_input: str):
     """
     Check the status of a ServiceNow incident ticket.
     Input may include a ticket number like INC0010004.
@@ -392,39 +326,27 @@ def check_status(user_input: str):
         return "⚠️ Please provide a valid ServiceNow incident number (e.g. INC0010004)."
 
     ticket_id = match.group(1)
-    url = f"{SNOW_INSTANCE}/api/now/table/incident?sysparm_query=number={ticket_id}&sysparm_fields=number,state,short_description"
-    headers = {"Accept": "application/json"}
 
     try:
-        response = requests.get(
-            url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            verify=False,
-            timeout=500
-        )
-    
-        if response.status_code == 200:
-            result = response.json()
-            if result["result"]:
-                ticket = result["result"][0]
-                state = ticket.get("state", "Unknown")
-                desc = ticket.get("short_description", "No description")
-                return f"✅ Ticket **{ticket_id}** is currently in state: **{state}**\n📝 Description: {desc}"
-            else:
-                return f"⚠️ No ticket found with ID: {ticket_id}"
+        # Local incident mirror (within its staleness bound; unknown numbers are looked up live)
+        ticket = await get_incident_mirror().get(ticket_id, fields=("number", "state", "short_description"))
+
+        if ticket:
+            state = ticket.get("state") or "Unknown"
+            desc = ticket.get("short_description") or "No description"
+            return f"✅ Ticket **{ticket_id}** is currently in state: **{state}**\n📝 Description: {desc}"
         else:
-            return f"❌ Failed to fetch status. HTTP {response.status_code}: {response.text}"
+            return f"⚠️ No ticket found with ID: {ticket_id}"
 
-    except requests.exceptions.RequestException as e:
+    except SnowRequestError as e:
         return f"❌ Error while checking ticket status: {str(e)}"
 
 
 # ------------------------------
 # 💬 Add Comment to Ticket
 # ------------------------------
-@tool
-def add_comments(user_input: str):
+@async_tool
+async def add_comments(user_input: str):
     """
     Add a comment to a ServiceNow ticket.
     Example: 'INC0010006: updated by agent'
@@ -442,17 +364,10 @@ def add_comments(user_input: str):
     if not comment:
         return "❌ Comment text is empty. Please provide a comment."
 
-    headers = {"Content-Type": "application/json", "Accept": "application/json"}
     query_url = f"{SNOW_INSTANCE}/api/now/table/incident?sysparm_query=number={ticket_id}"
 
     try:
-        response = requests.get(
-            query_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            verify=False,
-            timeout=600
-        )
+        response = await snow_get(query_url)
 
         if response.status_code != 200:
             return f"⚠️ Failed to fetch ticket details (HTTP {response.status_code})"
@@ -465,21 +380,15 @@ def add_comments(user_input: str):
         update_url = f"{SNOW_INSTANCE}/api/now/table/incident/{sys_id}"
         update_data = {"work_notes": comment}
 
-        update_response = requests.patch(
-            update_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            data=json.dumps(update_data),
-            verify=False,
-            timeout=500
-        )
+        update_response = await snow_patch(update_url, json=update_data, params=WRITE_PARAMS)
+        await get_incident_mirror().write_through(update_response)
 
         if update_response.status_code in [200, 204]:
             return f"💬 Successfully added comment to '{ticket_id}': '{comment}'"
         else:
             return f"⚠️ Failed to update ticket (HTTP {update_response.status_code})"
 
-    except requests.exceptions.RequestException as e:
+    except SnowRequestError as e:
         return f"❌ Error while adding comment: {e}"
 
 
@@ -514,8 +423,8 @@ def reopen_ticket(ticket_id: str):
 
 
 # -----------------------------
-@tool
-def show_my_tickets(user_email: str):
+@async_tool
+async def show_my_tickets(user_email: str):
     """
     Fetch and return all ServiceNow tickets for a given user email.
 
@@ -525,64 +434,25 @@ def show_my_tickets(user_email: str):
     Returns:
         str: A formatted list of tickets or an error message.
     """
-    headers = {"Accept": "application/json"}
-
-    # Step 1: Get user sys_id from email
-    user_url = f"{SNOW_INSTANCE}/api/now/table/sys_user"
-    user_params = {
-        "sysparm_query": f"email={user_email}",
-        "sysparm_fields": "sys_id,name,email"
-    }
-
     try:
-        user_resp = requests.get(
-            user_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            params=user_params,
-            verify=False,
-            timeout=600
-        )
-        user_resp.raise_for_status()
-        users = user_resp.json().get("result", [])
-
-        if not users:
+        # Step 1: Get user sys_id from email (shared identity cache)
+        user = await resolve_user(user_email)
+        if not user:
             return f"⚠️ No user found with email '{user_email}'. Please check the email."
 
-        user_id = users[0]["sys_id"]
+        user_id = user["sys_id"]
 
-        # Step 2: Fetch tickets for the user
-        tickets_url = f"{SNOW_INSTANCE}/api/now/table/incident"
+        # Step 2: The user's tickets from the local incident mirror, newest first (display values)
         ticket_fields = ["number", "state", "short_description", "sys_id", "priority", "sys_created_on"]
-        ticket_params = {
-            "sysparm_query": f"caller_id={user_id}",
-            "sysparm_fields": ",".join(ticket_fields),
-            "sysparm_limit": 100,
-            "sysparm_display_value": "true"
-        }
-
-        ticket_resp = requests.get(
-            tickets_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            params=ticket_params,
-            verify=False,
-            timeout=600
+        tickets = await get_incident_mirror().query(
+            "caller_id = ?", (user_id,), order_by="sys_created_on DESC", limit=100,
+            fields=ticket_fields, display=True,
         )
-        ticket_resp.raise_for_status()
-        tickets = ticket_resp.json().get("result", [])
 
         if not tickets:
             return f"⚠️ No tickets found for user '{user_email}'."
 
-        # Step 3: Sort tickets by creation date descending
-        from dateutil import parser
-        tickets.sort(
-            key=lambda x: parser.parse(x.get("sys_created_on", "1970-01-01T00:00:00Z")),
-            reverse=True
-        )
-
-        # Step 4: Format ticket info
+        # Step 3: Format ticket info
         ticket_list = [
             f"🎫 {t['number']} | State: {t.get('state', 'Unknown')} | "
             f"Priority: {t.get('priority', 'N/A')} | Desc: {t.get('short_description', 'No description')}"
@@ -591,12 +461,12 @@ def show_my_tickets(user_email: str):
 
         return "\n".join(ticket_list)
 
-    except requests.exceptions.RequestException as e:
+    except SnowRequestError as e:
         return f"❌ Error fetching tickets for user '{user_email}': {e}"
 
 
-@tool
-def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and ticket closed."):
+@async_tool
+async def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and ticket closed."):
     """
     Close a ServiceNow incident ticket by number or sys_id, with smart error handling.
 
@@ -607,20 +477,11 @@ def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and
     Returns:
         str: Success or detailed error message.
     """
-    headers = {"Accept": "application/json", "Content-Type": "application/json"}
-
     try:
         # Step 1: Find the ticket by number
         lookup_url = f"{SNOW_INSTANCE}/api/now/table/incident"
         lookup_params = {"sysparm_query": f"number={ticket_identifier}", "sysparm_fields": "sys_id,number,state"}
-        lookup_resp = requests.get(
-            lookup_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            params=lookup_params,
-            verify=False,
-            timeout=600
-        )
+        lookup_resp = await snow_get(lookup_url, params=lookup_params)
         lookup_resp.raise_for_status()
         result = lookup_resp.json().get("result", [])
 
@@ -640,14 +501,8 @@ def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and
             "close_code": "Solved (Permanently)"
         }
 
-        update_resp = requests.patch(
-            update_url,
-            auth=HTTPBasicAuth(SNOW_USER, SNOW_PASS),
-            headers=headers,
-            data=json.dumps(payload),
-            verify=False,
-            timeout=600
-        )
+        update_resp = await snow_patch(update_url, json=payload, params=WRITE_PARAMS)
+        await get_incident_mirror().write_through(update_resp)
 
         # Handle common status codes gracefully
         if update_resp.status_code == 403:
@@ -666,7 +521,7 @@ def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and
                 f"⚠️ Ticket '{ticket_number}' not found. Please verify the ticket number or sys_id."
             )
 
-        elif not update_resp.ok:
+        elif not update_resp.is_success:
             return (
                 f"❌ Failed to close ticket '{ticket_number}'.\n"
                 f"ServiceNow returned error code {update_resp.status_code}: {update_resp.text}"
@@ -675,7 +530,7 @@ def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and
         # Step 3: Success
         return f"✅ Ticket '{ticket_number}' has been successfully closed."
 
-    except requests.exceptions.RequestException as e:
+    except SnowRequestError as e:
         return f"❌ Network or API error while closing ticket '{ticket_identifier}': {e}"
 
     except Exception as ex:
@@ -748,18 +603,30 @@ def close_ticket(ticket_identifier: str, close_notes: str = "Issue resolved and
 #     "show_my_tickets": show_my_tickets
 # }
 
-@tool
-def retrieve_or_generate_solution(query: str, memory: str = "None") -> str:
+@async_tool
+async def retrieve_or_generate_solution(query: str, memory: str = "None") -> str:
     """
-    First try to retrieve from KB, else generate new solution.
+    First try the semantic answer cache, then the KB, else generate new solution.
     """
-    kb_solution = get_ticket_answer(query)
+    answer_cache = get_answer_cache()
+    cached = await asyncio.to_thread(answer_cache.lookup, query)
+    if cached:
+        print(f"Reused cached answer (similarity {cached['similarity']:.2f}).")
+        return format_cached_answer(cached)
+
+    kb_solution = await aget_ticket_answer(query)
     if kb_solution:
         print("Retrieved solution from KB.")
+        await asyncio.to_thread(answer_cache.store, query, kb_solution, "knowledge_base")
         return kb_solution
     else:
         print("No KB solution found, generating new solution.")
-        return generate_solution(query, memory)
+        solution = await agenerate_solution(query, memory)
+        # The cache is shared by all users: an answer built on this caller's
+        # saved preferences must not be served to anyone else
+        if not memory or memory.strip() == "None":
+            await asyncio.to_thread(answer_cache.store, query, solution, "generated")
+        return solution
 
 user_tools = [submit_ticket, check_status, add_comments, submit_feedback, ask_question, reopen_ticket, show_my_tickets, close_ticket, retrieve_or_generate_solution]
 
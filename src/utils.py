@@ -26,3 +26,56 @@ def show_graph(graph, filename="graph.png"):
             print(f"(ASCII fallback failed too): {ascii_err}")
 
 
+
+
+# ---------------------------------------------------
+# Async helpers shared by the subagent tool sets
+# ---------------------------------------------------
+import asyncio
+import functools
+import threading
+from langchain_core.tools import tool
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """Event loop running forever on a daemon thread; sync code submits coroutines to it."""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-tools", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code (CLI sessions, graph.invoke).
+    The persistent background loop keeps pooled async connections alive between calls.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
+
+
+def async_tool(*tool_args, **tool_kwargs):
+    """
+    Same as @tool, for async implementations. The coroutine serves graph.ainvoke;
+    a sync wrapper running it on the background loop serves graph.invoke.
+    Usage: @async_tool, @async_tool("name") or @async_tool("name", return_direct=True).
+    """
+    def decorator(coroutine):
+        structured = tool(*tool_args, **tool_kwargs)(coroutine) if tool_args or tool_kwargs else tool(coroutine)
+
+        @functools.wraps(coroutine)
+        def func(*args, **kwargs):
+            return run_sync(coroutine(*args, **kwargs))
+
+        return structured.model_copy(update={"func": func})
+
+    if len(tool_args) == 1 and callable(tool_args[0]) and not tool_kwargs:
+        coroutine, tool_args = tool_args[0], ()
+        return decorator(coroutine)
+    return decorator